@@ -7,11 +7,11 @@ from chiptunesak import constants, key
 
 
 # Named tuple types for several lists throughout
-TimeSignatureEvent = collections.namedtuple('TimeSignature', ['start_time', 'num', 'denom'])
-KeySignatureEvent = collections.namedtuple('KeySignature', ['start_time', 'key'])
-TempoEvent = collections.namedtuple('Tempo', ['start_time', 'qpm'])
-OtherMidiEvent = collections.namedtuple('OtherMidi', ['start_time', 'msg'])
-ProgramEvent = collections.namedtuple('Program', ['start_time', 'program'])
+TimeSignatureEvent = collections.namedtuple('TimeSignatureEvent', ['start_time', 'num', 'denom'])
+KeySignatureEvent = collections.namedtuple('KeySignatureEvent', ['start_time', 'key'])
+TempoEvent = collections.namedtuple('TempoEvent', ['start_time', 'qpm'])
+OtherMidiEvent = collections.namedtuple('OtherMidiEvent', ['start_time', 'msg'])
+ProgramEvent = collections.namedtuple('ProgramEvent', ['start_time', 'program'])
 Beat = collections.namedtuple('Beat', ['start_time', 'measure', 'beat'])
 Rest = collections.namedtuple('Rest', ['start_time', 'duration'])
 MeasureMarker = collections.namedtuple('MeasureMarker', ['start_time', 'measure_number'])
@@ -0,0 +1,223 @@
+# Basic-block translation cache for the 6502 emulator
+#
+# A play routine runs the same few hundred instructions thousands of times during a SID
+# capture, and runcpu() fetches and dispatches every one of them each time.  This module
+# turns straight-line runs of 6502 instructions (basic blocks) into Python functions that
+# call the already-bound opcode handlers in sequence, with the PC and base cycle counts
+# baked in as constants.  Blocks are cached by entry PC (and memory bank configuration).
+#
+# A basic block ends on (and includes) the first branch, JMP, JSR, RTS, RTI, BRK, HALT or
+# unimplemented opcode, or ends just before an address flagged as a boundary (so callers
+# that watch the PC between blocks, e.g. for the KERNAL IRQ exit range, still see it).
+#
+# Handlers read their operand bytes from memory at run time, so self-modifying code that
+# rewrites operands needs no special handling.  Writes to a location holding an opcode of
+# a cached block invalidate that block.  If a block rewrites itself (or changes the memory
+# banking) while running, it stops after the writing instruction so the rest of the block
+# gets recompiled from the updated memory.
+#
+# Note: cached blocks do not mark opcode fetches in the memory usage map.  The runcpu()
+# interpreter remains the reference path.
+
+from collections import namedtuple
+
+MAX_BLOCK_INSTRUCTIONS = 64
+
+BlockCacheStats = namedtuple('BlockCacheStats', ['hits', 'misses', 'invalidations', 'blocks'])
+
+# Instruction sizes by handler name suffix (addressing mode)
+MODE_SIZES = {
+    'imm': 2, 'zp': 2, 'zpx': 2, 'zpy': 2, 'indx': 2, 'indy': 2,
+    'abs': 3, 'absx': 3, 'absy': 3, 'ind': 3, 'acc': 1,
+}
+SPECIAL_SIZES = {'op_nop_skip_byte': 2, 'op_nop_abs': 3, 'op_nop_implied': 1}
+
+# Handlers that always end a block (they change the PC, stop execution, or raise)
+BLOCK_ENDING_HANDLERS = frozenset([
+    'op_bcc', 'op_bcs', 'op_beq', 'op_bmi', 'op_bne', 'op_bpl', 'op_bvc', 'op_bvs',
+    'op_jmp_abs', 'op_jmp_ind', 'op_jsr_abs', 'op_rts', 'op_rti', 'op_brk',
+    'op_halt', 'op_unimplemented'])
+
+# Opcodes that write to memory (STA, STX, STY, read-modify-write on memory, PHA, PHP)
+MEMORY_WRITING_OPCODES = frozenset([
+    0x85, 0x95, 0x8d, 0x9d, 0x99, 0x81, 0x91,  # STA
+    0x86, 0x96, 0x8e,  # STX
+    0x84, 0x94, 0x8c,  # STY
+    0x06, 0x16, 0x0e, 0x1e,  # ASL
+    0x46, 0x56, 0x4e, 0x5e,  # LSR
+    0x26, 0x36, 0x2e, 0x3e,  # ROL
+    0x66, 0x76, 0x6e, 0x7e,  # ROR
+    0xc6, 0xd6, 0xce, 0xde,  # DEC
+    0xe6, 0xf6, 0xee, 0xfe,  # INC
+    0x48, 0x08])  # PHA, PHP
+
+
+def instruction_size(handler_name):
+    """
+    Get an instruction's size in bytes from the name of its opcode handler
+
+    :param handler_name: opcode handler method name, e.g. 'op_lda_absx'
+    :type handler_name: str
+    :return: instruction size (1 to 3)
+    :rtype: int
+    """
+    if handler_name in SPECIAL_SIZES:
+        return SPECIAL_SIZES[handler_name]
+    mode = handler_name.rsplit('_', 1)[-1]
+    return MODE_SIZES.get(mode, 1)
+
+
+class BlockCache:
+    def __init__(self, cpu, cycles_table):
+        """
+        Cache of compiled basic blocks for one emulator instance
+
+        Normally created with Cpu6502Emulator.enable_block_cache()
+
+        :param cpu: the emulator whose code will be compiled
+        :type cpu: Cpu6502Emulator
+        :param cycles_table: base cycle counts for opcodes 0 through 255
+        :type cycles_table: list
+        """
+        self.cpu = cpu
+        self.cycles_table = cycles_table
+        self.blocks = {}                       # key -> compiled block function
+        self.block_locs = {}                   # key -> opcode locations in the block
+        self.owners = {}                       # opcode location -> set of keys
+        self.code_marks = bytearray(0x10000)   # 1 = location holds an opcode of a cached block
+        self.boundaries = bytearray(0x10000)   # 1 = a block must start at this location
+        self.generation = 0                    # bumped on invalidation or bank change
+        self.instructions = 0                  # count of instructions executed by blocks
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def add_boundaries(self, start, end):
+        """
+        Force blocks to start at every location in a range, so a caller checking the PC
+        between blocks sees any arrival in that range
+
+        :param start: first location in the range
+        :type start: int
+        :param end: last location in the range (inclusive)
+        :type end: int
+        """
+        self.boundaries[start:end + 1] = b'\x01' * (end + 1 - start)
+        self.clear()  # existing blocks may run through the new boundaries
+
+    def stats(self):
+        """
+        Get the cache's hit, miss, and invalidation counts
+
+        :return: cache statistics
+        :rtype: BlockCacheStats
+        """
+        return BlockCacheStats(self.hits, self.misses, self.invalidations, len(self.blocks))
+
+    def reset_stats(self):
+        self.hits = self.misses = self.invalidations = 0
+
+    def clear(self):
+        """
+        Drop all compiled blocks (e.g., after ROM contents change)
+        """
+        self.blocks.clear()
+        self.block_locs.clear()
+        self.owners.clear()
+        self.code_marks[:] = bytes(0x10000)
+        self.generation += 1
+
+    def invalidate(self, loc):
+        """
+        Drop every cached block that has an opcode at loc
+
+        :param loc: memory location that was written
+        :type loc: int
+        """
+        for key in self.owners.pop(loc, ()):
+            if key not in self.blocks:
+                continue
+            del self.blocks[key]
+            self.invalidations += 1
+            for block_loc in self.block_locs.pop(key):
+                keys = self.owners.get(block_loc)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.owners[block_loc]
+                        self.code_marks[block_loc] = 0
+        self.code_marks[loc] = 0
+        self.generation += 1
+
+    def invalidate_range(self, start, end):
+        """
+        Drop cached blocks with opcodes in locations start to end - 1
+
+        :param start: first location written
+        :type start: int
+        :param end: location after the last one written
+        :type end: int
+        """
+        if any(self.code_marks[start:end]):
+            for loc in range(start, end):
+                if self.code_marks[loc]:
+                    self.invalidate(loc)
+
+    def compile_block(self, key):
+        """
+        Compile and cache the basic block starting at the PC in key
+
+        :param key: (bank_key << 16) | pc
+        :type key: int
+        :return: the compiled block, which returns 0 or 1 like runcpu()
+        :rtype: function
+        """
+        cpu = self.cpu
+        cycles_table = self.cycles_table
+        pc = key & 0xffff
+        namespace = {'cpu': cpu, 'cache': self}
+        body = []
+        locs = []
+        for i in range(MAX_BLOCK_INSTRUCTIONS):
+            op = cpu.get_mem(pc)
+            handler = cpu.dispatch_table[op]
+            name = handler.__name__
+            namespace['h%d' % i] = handler
+            locs.append(pc)
+            size = instruction_size(name)
+            next_pc = pc + size
+            ends_block = (name in BLOCK_ENDING_HANDLERS or next_pc > 0xffff or self.boundaries[next_pc]
+                          or i == MAX_BLOCK_INSTRUCTIONS - 1)
+            writes_memory = op in MEMORY_WRITING_OPCODES
+
+            # Single-byte instructions don't look at the PC, so it only needs to be exact
+            # where the block can be left
+            if size > 1 or ends_block or writes_memory:
+                body.append('    cpu.pc = %d' % ((pc + 1) & 0xffff))
+            if cycles_table[op]:
+                body.append('    cpu.cpucycles += %d' % cycles_table[op])
+
+            if ends_block:
+                body.append('    cpu.last_instruction = %d' % op)
+                body.append('    cache.instructions += %d' % (i + 1))
+                body.append('    return h%d()' % i)
+                break
+
+            body.append('    h%d()' % i)
+            if writes_memory:
+                body.append('    if cache.generation != gen:')
+                body.append('        cache.instructions += %d' % (i + 1))
+                body.append('        return 1')
+            pc = next_pc
+
+        source = 'def block():\n    gen = cache.generation\n' + '\n'.join(body) + '\n'
+        exec(compile(source, '<6502 block $%04x>' % (key & 0xffff), 'exec'), namespace)
+        block = namespace['block']
+
+        self.blocks[key] = block
+        self.block_locs[key] = locs
+        for loc in locs:
+            self.owners.setdefault(loc, set()).add(key)
+            self.code_marks[loc] = 1
+        self.misses += 1
+        return block
@@ -23,8 +23,12 @@
 # TODOs:
 # - throw an exception if the break flag ever appears on flags
 
+from array import array
+from collections import namedtuple
+import numpy as np
 from chiptunesak.errors import ChiptuneSAKNotImplemented, ChiptuneSAKValueError
 from chiptunesak.byte_util import hexdump
+from chiptunesak.block_cache import BlockCache
 
 # 6502 vector locations
 NMI = 0xfffa  # on C64, vector points to NMI routine at $FE43/65091
@@ -66,31 +70,473 @@ STACK_WRAP_AREA = 0x0f
 MEM_USAGE_READ  = 0b00000001  # noqa:E221
 MEM_USAGE_WRITE = 0b00000010
 
+# Used to clear a 64K memory map in place (no reallocation)
+ZEROED_64K = bytes(0x10000)
+
+# run_until() exit reasons
+EXIT_RETURN = 'return'                        # RTS/RTI on an empty stack (if exit_on_empty_stack)
+EXIT_BRK = 'brk'                              # BRK instruction
+EXIT_STOP_ADDRESS = 'stop_address'            # PC arrived in one of the stop ranges
+EXIT_INSTRUCTION_LIMIT = 'instruction_limit'  # max_instructions executed
+EXIT_CYCLE_LIMIT = 'cycle_limit'              # max_cycles used
+
+# Why run_until() stopped, the PC at that point, and the instructions and cycles it executed
+RunResult = namedtuple('RunResult', ['reason', 'pc', 'instructions', 'cycles'])
+
+NO_LIMIT = float('inf')
+
+
+def nz_for_flags(n, z):
+    """
+    Get a stand-in last result (see Cpu6502Emulator.flags) that gives these N and Z flags
+
+    Bit 8 gives N when the low byte is zero, for N and Z both set (e.g. by BIT)
+
+    :param n: nonzero for N set
+    :type n: int
+    :param z: nonzero for Z set
+    :type z: int
+    :return: last result value
+    :rtype: int
+    """
+    if z:
+        return 0x100 if n else 0
+    return 0x80 if n else 1
+
+
+# ADC and SBC lookup tables, indexed by
+#     (decimal << 17) | (carry << 16) | (accumulator << 8) | operand
+# Each entry packs result | (C and V flags << 8) | (last result for N and Z << 16), see flags
+# Built by load_alu_tables() when the first emulator is created
+adc_table = sbc_table = None
+
+# The (decimal << 17) | (carry << 16) part of the table index, for each status byte
+alu_index_base = [((p & FD) << 14) | ((p & FC) << 16) for p in range(256)]
+
+
+def alu_operands():
+    """
+    Get the inputs for every ADC and SBC table entry, in table index order
+
+    :return: decimal flag, carry, accumulator, and operand columns
+    :rtype: (numpy array, numpy array, numpy array, numpy array)
+    """
+    index = np.arange(0x40000, dtype=np.int64)
+    return (index >> 17, (index >> 16) & 1, (index >> 8) & 0xff, index & 0xff)
+
+
+def alu_table(temp, cv, nz):
+    # pack the result and flags columns into a table of plain ints, for fast indexing
+    return array('I', ((temp & 0xff) | (cv << 8) | (nz << 16)).astype(np.uint32).tobytes())
+
+
+def build_adc_table():
+    """
+    Compute ADC's result and flags for every decimal flag, carry, accumulator, and operand
+
+    :return: ADC lookup table
+    :rtype: array
+    """
+    (decimal, carry, a, data) = alu_operands()
+    same_signs = ((a ^ data) & 0x80) == 0  # operands have the same sign
+
+    # binary mode
+    temp = data + a + carry
+    nz = temp & 0xff
+    cv = np.where(same_signs & (((a ^ temp) & 0x80) != 0), FV, 0) | np.where(temp > 0xff, FC, 0)
+
+    # decimal mode
+    temp_d = (a & 0xf) + (data & 0xf) + carry  # not a byte
+    temp_d = np.where(temp_d > 0x9, temp_d + 0x6, temp_d)
+    temp_d = (temp_d & 0xf) + (a & 0xf0) + (data & 0xf0) + np.where(temp_d <= 0x0f, 0, 0x10)
+    # Z comes from the binary sum, N from the decimal adjusted one
+    nz_d = np.where((a + data + carry) & 0xff, (temp_d & FN) | 1, (temp_d & FN) << 1)
+    cv_d = np.where(same_signs & (((a ^ temp_d) & 0x80) != 0), FV, 0)
+    temp_d = np.where((temp_d & 0x1f0) > 0x90, temp_d + 0x60, temp_d)
+    cv_d |= np.where((temp_d & 0xff0) > 0xf0, FC, 0)
+
+    is_decimal = decimal == 1
+    return alu_table(np.where(is_decimal, temp_d, temp), np.where(is_decimal, cv_d, cv),
+                     np.where(is_decimal, nz_d, nz))
+
+
+def build_sbc_table():
+    """
+    Compute SBC's result and flags for every decimal flag, carry, accumulator, and operand
+
+    :return: SBC lookup table
+    :rtype: array
+    """
+    (decimal, carry, a, data) = alu_operands()
+    borrow = carry ^ 1
+
+    temp = (a - data - borrow) & 0xffff  # not a byte
+    nz = temp & 0xff  # N and Z come from the binary difference, in decimal mode too
+    cv = np.where(temp < 0x100, FC, 0) | np.where((((a ^ temp) & 0x80) != 0) & (((a ^ data) & 0x80) != 0), FV, 0)
+
+    # decimal mode
+    temp_d = ((a & 0xf) - (data & 0xf) - borrow) & 0xffff  # not a byte
+    temp_d = np.where(temp_d & 0x10,
+                      (((temp_d - 6) & 0xf) | ((a & 0xf0) - (data & 0xf0) - 0x10)) & 0xffff,
+                      ((temp_d & 0xf) | ((a & 0xf0) - (data & 0xf0))) & 0xffff)
+    temp_d = np.where(temp_d & 0x100, (temp_d - 0x60) & 0xffff, temp_d)
+
+    return alu_table(np.where(decimal == 1, temp_d, temp), cv, nz)
+
+
+def load_alu_tables():
+    """
+    Build the ADC and SBC tables, if not already built
+    """
+    global adc_table, sbc_table
+    if adc_table is None:
+        adc_table = build_adc_table()
+        sbc_table = build_sbc_table()
+
+
+# Register state before an instruction, as sent to a trace sink (see trace_to())
+TraceRecord = namedtuple('TraceRecord', ['cycles', 'pc', 'a', 'x', 'y', 'sp', 'flags'])
+
+
+def format_trace_record(record):
+    return "{:08d},PC=${:04x},A=${:02x},X=${:02x},Y=${:02x},SP=${:02x},P=%{:08b}".format(*record)
+
+
+def print_trace_record(record):
+    print(format_trace_record(record))
+
+
+# Machine state captured by snapshot(): attribute name -> value, and attribute name ->
+# bytes copy of a buffer (restored in place, so existing references to buffers stay valid)
+MachineSnapshot = namedtuple('MachineSnapshot', ['values', 'buffers'])
+
+
+class ExecutionProfile:
+    def __init__(self):
+        """
+        Instruction execution counts and cycles per program counter and per opcode,
+        gathered while installed on an emulator (see Cpu6502Emulator.set_profile())
+
+        Each instruction is attributed to the address it started at.
+        """
+        self.opcode_names = ['${:02x}'.format(op) for op in range(256)]  # set by set_profile()
+        self.reset()
+
+    def reset(self):
+        self.pc_counts = array('Q', bytes(8 * 0x10000))
+        self.pc_cycles = array('Q', bytes(8 * 0x10000))
+        self.opcode_counts = array('Q', bytes(8 * 256))
+        self.opcode_cycles = array('Q', bytes(8 * 256))
+
+    @property
+    def instructions(self):
+        return sum(self.opcode_counts)
+
+    @property
+    def cycles(self):
+        return sum(self.opcode_cycles)
+
+    def pc_rows(self):
+        """
+        Get (pc, count, cycles) for each address that started an instruction, in address order
+
+        :return: list of (pc, count, cycles)
+        :rtype: list
+        """
+        return [(pc, count, self.pc_cycles[pc]) for pc, count in enumerate(self.pc_counts) if count]
+
+    def opcode_rows(self):
+        """
+        Get (opcode, count, cycles) for each executed opcode, in opcode order
+
+        :return: list of (opcode, count, cycles)
+        :rtype: list
+        """
+        return [(op, count, self.opcode_cycles[op]) for op, count in enumerate(self.opcode_counts) if count]
+
+    def report(self, limit=20):
+        """
+        Create a readable report of the addresses and opcodes that used the most cycles
+
+        :param limit: max number of addresses and opcodes to list, defaults to 20
+        :type limit: int, optional
+        :return: report text
+        :rtype: str
+        """
+        total_cycles = self.cycles or 1
+        lines = ['%d instructions, %d cycles' % (self.instructions, self.cycles), '',
+                 'address      count       cycles      %']
+        for pc, count, cycles in sorted(self.pc_rows(), key=lambda row: (-row[2], row[0]))[:limit]:
+            lines.append('${:04x} {:>12d} {:>12d} {:>6.2f}'.format(pc, count, cycles, 100 * cycles / total_cycles))
+        lines += ['', 'opcode             count       cycles      %']
+        for op, count, cycles in sorted(self.opcode_rows(), key=lambda row: (-row[2], row[0]))[:limit]:
+            lines.append('${:02x} {:<10s} {:>12d} {:>12d} {:>6.2f}'.format(
+                op, self.opcode_names[op], count, cycles, 100 * cycles / total_cycles))
+        return '\n'.join(lines)
+
+    def dump(self):
+        """
+        Create a flat dump of all nonzero counters, one per line in address/opcode order,
+        for diffing the profiles of different tunes
+
+        :return: dump text
+        :rtype: str
+        """
+        lines = ['pc ${:04x} {:d} {:d}'.format(*row) for row in self.pc_rows()]
+        lines += ['op ${:02x} {:d} {:d}'.format(*row) for row in self.opcode_rows()]
+        return '\n'.join(lines) + '\n'
+
+    def write_dump(self, filename):
+        with open(filename, 'w') as f:
+            f.write(self.dump())
+
+
+# class -> (opcode, handler method name) pairs, found once per class by build_dispatch_table()
+opcode_handler_names = {}
+
+
+def opcode(*opcodes):
+    """
+    Decorator that registers a Cpu6502Emulator method as the handler for one or more opcodes
+
+    :param opcodes: the opcode(s) the decorated method executes
+    :type opcodes: int
+    """
+    def decorator(method):
+        method.opcodes = opcodes
+        return method
+    return decorator
+
 
 class Cpu6502Emulator:
+    # State captured by snapshot() (subclasses extend these)
+    snapshot_values = ('a', 'x', 'y', 'sp', 'pc', 'p', 'nz', 'cpucycles', 'last_instruction',
+                       'exit_on_empty_stack', 'bank_key')
+    snapshot_buffers = ('memory', 'mem_usage')
+
     def __init__(self):
-        self.memory = 0x10000 * [0x00]     # 64K memory as integers
-        self.mem_usage = 0x10000 * [0x00]  # monitor a program's memory r/w usage
+        self.memory = bytearray(0x10000)     # 64K memory
+        self.mem_usage = bytearray(0x10000)  # monitor a program's memory r/w usage
         self.a = 0                         # accumulator (byte)
         self.x = 0                         # x register (byte)
         self.y = 0                         # y register (byte)
-        self.flags = FU                    # processor flags (byte)
+        self.p = FU                        # processor flags, except N and Z (byte)
+        self.nz = 1                        # last result, N and Z evaluated from it (see flags)
         self.sp = 0                        # stack pointer (byte)
         self.pc = 0                        # program counter (16-bit)
         self.cpucycles = 0                 # count of cpu cycles processed
         self.last_instruction = None       # last instruction processed
         self.exit_on_empty_stack = False   # True = RTI/RTS exists on empty stack
-        self.debug = False
-        self.invocationCount = -1
+        self.instruction_hook = None       # optional hook(cpu) before each instruction
+        self.memory_write_hook = None      # optional hook(loc, val) before each memory write
+        self.trace_sink = None             # optional sink(TraceRecord), see trace_to()
+        self.profile = None                # optional ExecutionProfile, see set_profile()
+        self.dispatch_table = self.build_dispatch_table()
+        load_alu_tables()
+        self.bank_key = 0                  # identifies the memory banking config (if any)
+        self.block_cache = None            # optional BlockCache, see enable_block_cache()
+        self.stop_sets = {}                # run_until() stop ranges -> set of stop addresses
+
+    def build_dispatch_table(self):
+        """
+        Create the 256-entry table of bound opcode handler methods used by runcpu()
+
+        Handlers are looked up by name on the instance, so a subclass can override any
+        op_* method and have its version dispatched.
+
+        :return: list of bound methods, indexed by opcode
+        :rtype: list
+        """
+        cls = type(self)
+        handler_names = opcode_handler_names.get(cls)
+        if handler_names is None:
+            handler_names = []
+            for name in dir(cls):
+                for op in getattr(getattr(cls, name), 'opcodes', ()):
+                    handler_names.append((op, name))
+            opcode_handler_names[cls] = handler_names
+
+        table = 256 * [self.op_unimplemented]
+        for op, name in handler_names:
+            table[op] = getattr(self, name)
+        return table
+
+    def enable_block_cache(self):
+        """
+        Turn on the basic-block translation cache used by run_block()
+
+        set_mem() is wrapped on this instance so that writes to cached code invalidate it.
+
+        :return: the new block cache (for its stats)
+        :rtype: BlockCache
+        """
+        if self.block_cache is None:
+            self.block_cache = BlockCache(self, cpucycles_table)
+            self.update_set_mem()
+        return self.block_cache
+
+    def disable_block_cache(self):
+        """
+        Turn off the basic-block translation cache
+        """
+        if self.block_cache is not None:
+            self.block_cache = None
+            self.update_set_mem()
+
+    def set_instruction_hook(self, hook):
+        """
+        Install (or with None, remove) a hook called with this emulator before each
+        instruction that runcpu() executes
+
+        With no hook installed, runcpu() pays nothing for tracing.  While a hook is
+        installed, run_until() executes instruction by instruction, even if the block
+        cache is enabled.
+
+        :param hook: function taking the emulator, or None
+        :type hook: function
+        """
+        self.instruction_hook = hook
+        self.update_runcpu()
+
+    def set_profile(self, profile):
+        """
+        Install (or with None, remove) an ExecutionProfile that counts the instructions
+        and cycles runcpu() executes per address and per opcode
+
+        With no profile installed, runcpu() pays nothing for profiling.  While a profile
+        is installed, run_until() executes instruction by instruction, even if the block
+        cache is enabled.
+
+        :param profile: profile to accumulate into, or None
+        :type profile: ExecutionProfile
+        """
+        if profile is not None:
+            profile.opcode_names = [handler.__name__[3:] for handler in self.dispatch_table]
+        self.profile = profile
+        self.update_runcpu()
+
+    def update_runcpu(self):
+        """
+        Rebuild this instance's runcpu() wrapper for the instruction hook and profile, or
+        remove it (exposing the class method) if neither is in use
+        """
+        self.__dict__.pop('runcpu', None)
+        runcpu = self.runcpu
+
+        profile = self.profile
+        if profile is not None:
+            pc_counts, pc_cycles = profile.pc_counts, profile.pc_cycles
+            opcode_counts, opcode_cycles = profile.opcode_counts, profile.opcode_cycles
+            runcpu_unprofiled = runcpu
+
+            def runcpu_profiled():
+                pc = self.pc
+                start_cycles = self.cpucycles
+                running = runcpu_unprofiled()
+                cycles = self.cpucycles - start_cycles
+                op = self.last_instruction
+                pc_counts[pc] += 1
+                pc_cycles[pc] += cycles
+                opcode_counts[op] += 1
+                opcode_cycles[op] += cycles
+                return running
+
+            runcpu = runcpu_profiled
+
+        hook = self.instruction_hook
+        if hook is not None:
+            runcpu_unhooked = runcpu
+
+            def runcpu_hooked():
+                hook(self)
+                return runcpu_unhooked()
+
+            runcpu = runcpu_hooked
+
+        if profile is not None or hook is not None:
+            self.runcpu = runcpu
+
+    def set_memory_write_hook(self, hook):
+        """
+        Install (or with None, remove) a hook called with the location and value before
+        each set_mem() write
+
+        :param hook: function taking (loc, val), or None
+        :type hook: function
+        """
+        self.memory_write_hook = hook
+        self.update_set_mem()
+
+    def trace_to(self, sink):
+        """
+        Send a TraceRecord of the registers to sink before each instruction runcpu()
+        executes (None stops tracing)
+
+        :param sink: function taking a TraceRecord (e.g., list.append or print_trace_record), or None
+        :type sink: function
+        """
+        self.trace_sink = sink
+        if sink is None:
+            self.set_instruction_hook(None)
+            return
+
+        def trace_instruction(cpu):
+            sink(TraceRecord(cpu.cpucycles, cpu.pc, cpu.a, cpu.x, cpu.y, cpu.sp, cpu.flags))
+
+        self.set_instruction_hook(trace_instruction)
+
+    @property
+    def debug(self):
+        """
+        True if instructions are being traced to stdout
+        """
+        return self.trace_sink is print_trace_record
+
+    @debug.setter
+    def debug(self, value):
+        if value:
+            self.trace_to(print_trace_record)
+        elif self.debug:
+            self.trace_to(None)
+
+    def update_set_mem(self):
+        """
+        Rebuild this instance's set_mem() wrapper for the memory write hook and block cache
+        invalidation, or remove it (exposing the class method) if neither is in use
+        """
+        self.__dict__.pop('set_mem', None)
+        set_mem = self.set_mem
+
+        hook = self.memory_write_hook
+        if hook is not None:
+            write = set_mem
+
+            def set_mem_hooked(loc, val):
+                hook(loc, val)
+                write(loc, val)
+
+            set_mem = set_mem_hooked
+
+        if self.block_cache is not None:
+            code_marks = self.block_cache.code_marks
+            invalidate = self.block_cache.invalidate
+            write_and_hook = set_mem
+
+            def set_mem_invalidating(loc, val):
+                write_and_hook(loc, val)
+                if code_marks[loc]:
+                    invalidate(loc)
+
+            set_mem = set_mem_invalidating
+
+        if hook is not None or self.block_cache is not None:
+            self.set_mem = set_mem
 
     def get_mem(self, loc):
         return self.memory[loc]
 
     def set_mem(self, loc, val):
-        if not (0 <= val <= 255):
-            exit("Error: POKE(%d),%d out of range" % (loc, val))
-
-        self.memory[loc] = val
+        self.memory[loc] = val  # a bytearray, so raises ValueError if val isn't a byte
 
     # define LO() (MEM(pc))
     def lo(self):
@@ -215,15 +661,30 @@ class Cpu6502Emulator:
     #     flags = (flags & ~(FN|FZ)) |        \
     #     ((data) & FN);                      \
     # }
+    #
+    # N and Z are evaluated lazily: the result byte is kept in self.nz, and the flags are
+    # only worked out from it when read (branches, PHP, BRK, the flags property).  Handlers
+    # assign self.nz directly; this is for callers outside the core.
     # a_byte from a register value (i.e., a,x,y)
     def set_flags(self, a_byte):
-        assert 0 <= a_byte <= 255, "Error: can't set flags using non-byte value"
-        if a_byte == 0:
-            self.flags = (self.flags & ~FN & 0xff) | FZ
-        else:
-            # turn off flag's N and Z, then add in a_byte's N
-            self.flags = (self.flags & ~(FN | FZ) & 0xff) | (a_byte & FN)
-        self.flags |= FU  # might not need this here, but being safe
+        self.nz = a_byte
+
+    @property
+    def flags(self):
+        """
+        Processor status byte, with N and Z worked out from the last result
+        """
+        flags = self.p
+        if not (self.nz & 0xff):
+            flags |= FZ
+        if self.nz & 0x180:
+            flags |= FN
+        return flags
+
+    @flags.setter
+    def flags(self, value):
+        self.p = (value & ~(FN | FZ) & 0xff) | FU  # U always reads as 1 (Wolfgang Lorenz tests)
+        self.nz = nz_for_flags(value & FN, value & FZ)
 
     # #define ASSIGNSETFLAGS(dest, data)      \
     # {                                       \
@@ -234,15 +695,9 @@ class Cpu6502Emulator:
     #     flags = (flags & ~(FN|FZ)) |        \
     #     (dest & FN);                        \
     # }
-    def assign_then_set_flags(self, dest_operand_ref, src_operand_ref):
-        src_byte = src_operand_ref.get_byte(self)
-        dest_operand_ref.set_byte(src_byte, self)
-        self.set_flags(src_byte)
-
-    # this is needed for the TXS command:
-    def assign_no_flag_changes(self, dest_operand_ref, src_operand_ref):
-        src_byte = src_operand_ref.get_byte(self)
-        dest_operand_ref.set_byte(src_byte, self)
+    #
+    # ASSIGNSETFLAGS is inlined by the callers: the destination (register or memory) and
+    # self.nz are assigned the result directly.
 
     # #define ADC(data)                                                        \
     # {                                                                        \
@@ -291,46 +746,13 @@ class Cpu6502Emulator:
     #     a = temp;                                                            \
     # }
     # I like the bit logic from here better https://github.com/eteran/pretendo/blob/master/doc/cpu/6502.txt
-    def ADC(self, operand_ref):
-        data = operand_ref.get_byte(self)
-        if (self.flags & FD):
-            temp = (self.a & 0xf) + (data & 0xf) + (self.flags & FC)  # not a byte
-            if (temp > 0x9):
-                temp += 0x6
-            if (temp <= 0x0f):
-                temp = (temp & 0xf) + (self.a & 0xf0) + (data & 0xf0)
-            else:
-                temp = (temp & 0xf) + (self.a & 0xf0) + (data & 0xf0) + 0x10
-            if not ((self.a + data + (self.flags & FC)) & 0xff):
-                self.flags |= FZ
-            else:
-                self.flags &= (~FZ & 0xff)
-            if (temp & 0x80):
-                self.flags |= FN
-            else:
-                self.flags &= (~FN & 0xff)
-            if ((self.a ^ temp) & 0x80) and not ((self.a ^ data) & 0x80):
-                self.flags |= FV
-            else:
-                self.flags &= (~FV & 0xff)
-            if (temp & 0x1f0) > 0x90:
-                temp += 0x60
-            if (temp & 0xff0) > 0xf0:
-                self.flags |= FC
-            else:
-                self.flags &= (~FC & 0xff)
-        else:
-            temp = data + self.a + (self.flags & FC)
-            self.set_flags(temp & 0xff)
-            if not ((self.a ^ data) & 0x80) and ((self.a ^ temp) & 0x80):
-                self.flags |= FV
-            else:
-                self.flags &= (~FV & 0xff)
-            if (temp > 0xff):
-                self.flags |= FC
-            else:
-                self.flags &= (~FC & 0xff)
-        self.a = temp & 0xff
+    # The arithmetic above is done once for every input by build_adc_table()
+    def ADC(self, data):
+        p = self.p
+        entry = adc_table[alu_index_base[p] | (self.a << 8) | data]
+        self.a = entry & 0xff
+        self.p = (p & ~(FC | FV) & 0xff) | ((entry >> 8) & 0xff)
+        self.nz = entry >> 16
 
     # #define SBC(data)                                                        \
     # {                                                                        \
@@ -374,40 +796,13 @@ class Cpu6502Emulator:
     #         a = temp;                                                        \
     #     }                                                                    \
     # }
-    def SBC(self, operand_ref):
-        tempval = operand_ref.get_byte(self)
-        temp = (self.a - tempval - ((self.flags & FC) ^ FC)) & 0xffff  # not a byte
-
-        if (self.flags & FD):
-            tempval2 = ((self.a & 0xf) - (tempval & 0xf) - ((self.flags & FC) ^ FC)) & 0xffff  # not a byte
-            if (tempval2 & 0x10):
-                tempval2 = (((tempval2 - 6) & 0xf) | ((self.a & 0xf0) - (tempval & 0xf0) - 0x10)) & 0xffff
-            else:
-                tempval2 = ((tempval2 & 0xf) | ((self.a & 0xf0) - (tempval & 0xf0))) & 0xffff
-            if (tempval2 & 0x100):
-                tempval2 -= 0x60
-                tempval2 &= 0xffff
-            if (temp < 0x100):
-                self.flags |= FC
-            else:
-                self.flags &= (~FC & 0xff)
-            self.set_flags(temp & 0xff)
-            if ((self.a ^ temp) & 0x80) and ((self.a ^ tempval) & 0x80):
-                self.flags |= FV
-            else:
-                self.flags &= (~FV & 0xff)
-            self.a = tempval2 & 0xff
-        else:
-            self.set_flags(temp & 0xff)
-            if (temp < 0x100):
-                self.flags |= FC
-            else:
-                self.flags &= (~FC & 0xff)
-            if ((self.a ^ temp) & 0x80) and ((self.a ^ tempval) & 0x80):
-                self.flags |= FV
-            else:
-                self.flags &= (~FV & 0xff)
-            self.a = temp & 0xff
+    # The arithmetic above is done once for every input by build_sbc_table()
+    def SBC(self, data):
+        p = self.p
+        entry = sbc_table[alu_index_base[p] | (self.a << 8) | data]
+        self.a = entry & 0xff
+        self.p = (p & ~(FC | FV) & 0xff) | ((entry >> 8) & 0xff)
+        self.nz = entry >> 16
 
     # #define CMP(src, data)                  \
     # {                                       \
@@ -421,15 +816,16 @@ class Cpu6502Emulator:
     # }
 
     # handles CMP, CPX, and CPY
-    def CMP(self, reg_operand_ref, operand_ref):
-        src = reg_operand_ref.get_byte(self)  # byte from a, x, or y
-        data = operand_ref.get_byte(self)  # byte from immediate or memory lookup
-        temp = (src - data) & 0xff
-        self.flags = (self.flags & ~(FC | FN | FZ) & 0xff) | (temp & FN)
-        if not temp:
-            self.flags |= FZ
+    # src is the byte from a, x, or y, data is the byte from immediate or memory lookup
+    def CMP(self, src, data):
+        self.nz = (src - data) & 0xff
         if src >= data:
-            self.flags |= FC
+            self.p |= FC
+        else:
+            self.p &= (~FC & 0xff)
+
+    # The read-modify-write helpers (ASL, LSR, ROL, ROR, DEC, INC) take the operand's value and
+    # return the result, which the caller stores back to the accumulator or memory location.
 
     # #define ASL(data)                       \
     # {                                       \
@@ -439,15 +835,15 @@ class Cpu6502Emulator:
     #   else flags &= ~FC;                    \
     #   ASSIGNSETFLAGS(data, temp);           \
     # }
-    def ASL(self, operand_ref):
-        temp = operand_ref.get_byte(self)
+    def ASL(self, temp):
         temp <<= 1
         if (temp & 0x100):
-            self.flags |= FC
+            self.p |= FC
         else:
-            self.flags &= (~FC & 0xff)
+            self.p &= (~FC & 0xff)
         temp &= 0xff
-        self.assign_then_set_flags(operand_ref, OperandRef(BYTE_VAL, temp))
+        self.nz = temp
+        return temp
 
     # #define LSR(data)                       \
     # {                                       \
@@ -457,14 +853,14 @@ class Cpu6502Emulator:
     #   temp >>= 1;                           \
     #   ASSIGNSETFLAGS(data, temp);           \
     # }
-    def LSR(self, operand_ref):
-        temp = operand_ref.get_byte(self)
+    def LSR(self, temp):
         if (temp & 1):
-            self.flags |= FC
+            self.p |= FC
         else:
-            self.flags &= (~FC & 0xff)
+            self.p &= (~FC & 0xff)
         temp >>= 1
-        self.assign_then_set_flags(operand_ref, OperandRef(BYTE_VAL, temp))
+        self.nz = temp
+        return temp
 
     # #define ROL(data)                       \
     # {                                       \
@@ -475,17 +871,17 @@ class Cpu6502Emulator:
     #   else flags &= ~FC;                    \
     #   ASSIGNSETFLAGS(data, temp);           \
     # }
-    def ROL(self, operand_ref):
-        temp = operand_ref.get_byte(self)
+    def ROL(self, temp):
         temp <<= 1
-        if (self.flags & FC):
+        if (self.p & FC):
             temp |= 1  # aka FC
         if (temp & 0x100):
-            self.flags |= FC
+            self.p |= FC
         else:
-            self.flags &= (~FC & 0xff)
+            self.p &= (~FC & 0xff)
         temp &= 0xff
-        self.assign_then_set_flags(operand_ref, OperandRef(BYTE_VAL, temp))
+        self.nz = temp
+        return temp
 
     # #define ROR(data)                       \
     # {                                       \
@@ -496,63 +892,63 @@ class Cpu6502Emulator:
     #   temp >>= 1;                           \
     #   ASSIGNSETFLAGS(data, temp);           \
     # }
-    def ROR(self, operand_ref):
-        temp = operand_ref.get_byte(self)
-        if (self.flags & FC):
+    def ROR(self, temp):
+        if (self.p & FC):
             temp |= 0x100
         if (temp & 1):
-            self.flags |= FC
+            self.p |= FC
         else:
-            self.flags &= (~FC & 0xff)
+            self.p &= (~FC & 0xff)
         temp >>= 1
-        self.assign_then_set_flags(operand_ref, OperandRef(BYTE_VAL, temp))
+        self.nz = temp
+        return temp
 
     # #define DEC(data)                       \
     # {                                       \
     #   temp = data - 1;                      \
     #   ASSIGNSETFLAGS(data, temp);           \
     # }
-    def DEC(self, operand_ref):
-        temp = operand_ref.get_byte(self) - 1
-        temp &= 0xff
-        self.assign_then_set_flags(operand_ref, OperandRef(BYTE_VAL, temp))
+    def DEC(self, data):
+        temp = (data - 1) & 0xff
+        self.nz = temp
+        return temp
 
     # #define INC(data)                       \
     # {                                       \
     #   temp = data + 1;                      \
     #   ASSIGNSETFLAGS(data, temp);           \
     # }
-    def INC(self, operand_ref):
-        temp = operand_ref.get_byte(self) + 1
-        temp &= 0xff
-        self.assign_then_set_flags(operand_ref, OperandRef(BYTE_VAL, temp))
+    def INC(self, data):
+        temp = (data + 1) & 0xff
+        self.nz = temp
+        return temp
 
     # #define EOR(data)                       \
     # {                                       \
     #   a ^= data;                            \
     #   SETFLAGS(a);                          \
     # }
-    def EOR(self, operand_ref):
-        self.a ^= operand_ref.get_byte(self)
-        self.set_flags(self.a)
+    def EOR(self, data):
+        self.a ^= data
+        self.nz = self.a
 
     # #define ORA(data)                       \
     # {                                       \
     #   a |= data;                            \
     #   SETFLAGS(a);                          \
     # }
-    def ORA(self, operand_ref):
-        self.a |= operand_ref.get_byte(self)
-        self.set_flags(self.a)
+    def ORA(self, data):
+        self.a |= data
+        self.nz = self.a
 
     # #define AND(data)                       \
     # {                                       \
     #   a &= data;                            \
     #   SETFLAGS(a)                           \
     # }
-    def AND(self, operand_ref):
-        self.a &= operand_ref.get_byte(self)
-        self.set_flags(self.a)
+    def AND(self, data):
+        self.a &= data
+        self.nz = self.a
 
     # #define BIT(data)                       \
     # {                                       \
@@ -561,13 +957,13 @@ class Cpu6502Emulator:
     #   if (!(data & a)) flags |= FZ;         \
     #   else flags &= ~FZ;                    \
     # }
-    def BIT(self, operand_ref):
-        temp = operand_ref.get_byte(self)
-        self.flags = (self.flags & ~(FN | FV) & 0xff) | (temp & (FN | FV))
-        if not (temp & self.a):
-            self.flags |= FZ
+    def BIT(self, temp):
+        self.p = (self.p & ~FV & 0xff) | (temp & FV)
+        # N from the operand, Z from the operand AND the accumulator
+        if temp & self.a:
+            self.nz = (temp & FN) | 1
         else:
-            self.flags &= (~FZ & 0xff)
+            self.nz = (temp & FN) << 1
 
     # void initcpu(unsigned short newpc, unsigned char newa, unsigned char newx, unsigned char newy)
     # {
@@ -587,7 +983,6 @@ class Cpu6502Emulator:
         self.flags = flags
         self.sp = 0xff
         self.cpucycles = 0
-        self.invocationCount = -1
 
     # ---------------------------------------------------------------------------
 
@@ -604,1930 +999,2188 @@ class Cpu6502Emulator:
         # execute instruction.
         # If RTS/RTI (when stack empty) or BRK, return 0, else return 1
         # Throw exception on the not-yet-implemented pseduo-op codes
-        if self.debug:
-            self.invocationCount += 1
-            output_str = "{:08d},PC=${:04x},A=${:02x},X=${:02x},Y=${:02x},SP=${:02x},P=%{:08b}" \
-                .format(self.cpucycles, self.pc, self.a, self.x, self.y, self.sp, self.flags)
-
-            print(output_str)
-
-            # Useful for some of the Wolfgang Lorenz tests:
-            """
-            print("data     b a r ${:02x} ${:02x} ${:02x}".format(self.memory[0x08ec], self.memory[0x08f2], self.memory[0x08f8]))
-            print("accum    b a r ${:02x} ${:02x} ${:02x}".format(self.memory[0x08ed], self.memory[0x08f3], self.memory[0x08f9]))
-            print("x        b a r ${:02x} ${:02x} ${:02x}".format(self.memory[0x08ee], self.memory[0x08f4], self.memory[0x08fa]))
-            print("y        b a r ${:02x} ${:02x} ${:02x}".format(self.memory[0x08ef], self.memory[0x08f5], self.memory[0x08fb]))
-            print("flags    b a r ${:08b} ${:08b} ${:08b}".format(self.memory[0x08f0], self.memory[0x08f6], self.memory[0x08fc]))
-            print("stackptr b a r ${:08b} ${:08b} ${:08b}".format(self.memory[0x08f1], self.memory[0x08f7], self.memory[0x08fd]))
-            """
-
+        # (Tracing is done with hooks, see set_instruction_hook() and trace_to())
         instruction = self.fetch()
         self.last_instruction = instruction
         self.cpucycles += cpucycles_table[instruction]
 
-        # Had converted the C case statement to a bunch of elif statements.  However, pylint can't handle
-        # that many ("Maximum recursion depth exceeded"), so converted all to if statements with a return
-        # after each one.
-
-        # case 0x69:
-        # ADC(IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0x65:
-        # ADC(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0x75:
-        # ADC(MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0x6d:
-        # ADC(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x7d:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # ADC(MEM(ABSOLUTEX()));
-        #  pc += 2;
-        # break;
-        #
-        # case 0x79:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # ADC(MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x61:
-        # ADC(MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0x71:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # ADC(MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # ADC instructions
-        if instruction == 0x69:  # $69/105 ADC #n
-            self.ADC(OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x65:  # $65/101 ADC zp
-            self.ADC(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x75:  # $75/117 ADC zp,X
-            self.ADC(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x6d:  # $6D/109 ADC abs
-            self.ADC(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x7d:  # $7D/125 ADC abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.ADC(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x79:  # $79/121 ADC abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.ADC(OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x61:  # $61/97 ADC (zp,X)
-            self.ADC(OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
+        return self.dispatch_table[instruction]()
 
-        if instruction == 0x71:  # $71/113 ADC (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.ADC(OperandRef(LOC_VAL, self.indirect_y()))
-            self.pc += 1
-            return 1
+    def run_block(self):
+        """
+        Execute the basic block at the PC through the block cache (compiling it on a miss)
 
-        # case 0x29:
-        # AND(IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0x25:
-        # AND(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0x35:
-        # AND(MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0x2d:
-        # AND(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x3d:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # AND(MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x39:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # AND(MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x21:
-        # AND(MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0x31:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # AND(MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # AND instructions
-        if instruction == 0x29:  # $29/41 AND #n
-            self.AND(OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
+        Like runcpu(), but executes up to a whole basic block per call, so the caller only
+        sees the machine state between blocks.  Requires enable_block_cache().
 
-        if instruction == 0x25:  # $25/37 AND zp
-            self.AND(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
+        :return: 0 if the block ended with a BRK, or an RTS/RTI on an empty stack, else 1
+        :rtype: int
+        """
+        cache = self.block_cache
+        key = (self.bank_key << 16) | (self.pc & 0xffff)
+        block = cache.blocks.get(key)
+        if block is None:
+            block = cache.compile_block(key)
+        else:
+            cache.hits += 1
+        return block()
 
-        if instruction == 0x35:  # $35/53 AND zp,X
-            self.AND(OperandRef(LOC_VAL, self.zeropage_x()))
+    def run_until(self, stop_ranges=(), max_instructions=None, max_cycles=None):
+        """
+        Run until a BRK, an RTS/RTI on an empty stack (if exit_on_empty_stack), the PC arriving
+        in a stop range, or an instruction or cycle budget running out
+
+        Stop ranges and budgets are checked after each instruction, or after each basic block
+        if the block cache is enabled (blocks are made to start at stop range addresses, but
+        budgets can be overshot by up to one block).
+
+        :param stop_ranges: (first, last) inclusive address ranges that stop execution
+        :type stop_ranges: tuple of tuples
+        :param max_instructions: instruction budget, defaults to None (no limit)
+        :type max_instructions: int, optional
+        :param max_cycles: cycle budget, defaults to None (no limit)
+        :type max_cycles: int, optional
+        :return: exit reason, PC, and instructions and cycles executed
+        :rtype: RunResult
+        """
+        stops = self.stop_sets.get(stop_ranges)
+        if stops is None:
+            stops = frozenset(loc for (first, last) in stop_ranges for loc in range(first, last + 1))
+            self.stop_sets[stop_ranges] = stops
+        instruction_limit = NO_LIMIT if max_instructions is None else max_instructions
+        start_cycles = self.cpucycles
+        cycle_limit = NO_LIMIT if max_cycles is None else start_cycles + max_cycles
+
+        cache = self.block_cache
+        if cache is None or self.instruction_hook is not None or self.profile is not None:
+            runcpu = self.runcpu
+            instructions = 0
+            while True:
+                running = runcpu()
+                instructions += 1
+                if not running:
+                    reason = EXIT_BRK if self.last_instruction == 0x00 else EXIT_RETURN
+                    break
+                if self.pc in stops:
+                    reason = EXIT_STOP_ADDRESS
+                    break
+                if instructions >= instruction_limit:
+                    reason = EXIT_INSTRUCTION_LIMIT
+                    break
+                if self.cpucycles >= cycle_limit:
+                    reason = EXIT_CYCLE_LIMIT
+                    break
+        else:
+            for (first, last) in stop_ranges:
+                if not all(cache.boundaries[first:last + 1]):
+                    cache.add_boundaries(first, last)
+            run_block = self.run_block
+            start_instructions = cache.instructions
+            instruction_limit += start_instructions
+            while True:
+                running = run_block()
+                if not running:
+                    reason = EXIT_BRK if self.last_instruction == 0x00 else EXIT_RETURN
+                    break
+                if self.pc in stops:
+                    reason = EXIT_STOP_ADDRESS
+                    break
+                if cache.instructions >= instruction_limit:
+                    reason = EXIT_INSTRUCTION_LIMIT
+                    break
+                if self.cpucycles >= cycle_limit:
+                    reason = EXIT_CYCLE_LIMIT
+                    break
+            instructions = cache.instructions - start_instructions
+
+        return RunResult(reason, self.pc, instructions, self.cpucycles - start_cycles)
+
+    # Opcode handlers.  Each returns 1 to continue, or 0 on BRK or (if exit_on_empty_stack)
+    # an RTS/RTI against an empty stack.
+
+    # case 0x69:
+    # ADC(IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0x65:
+    # ADC(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0x75:
+    # ADC(MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0x6d:
+    # ADC(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x7d:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # ADC(MEM(ABSOLUTEX()));
+    #  pc += 2;
+    # break;
+    #
+    # case 0x79:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # ADC(MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x61:
+    # ADC(MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0x71:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # ADC(MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # ADC instructions
+    @opcode(0x69)
+    def op_adc_imm(self):  # $69/105 ADC #n
+        self.ADC(self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0x65)
+    def op_adc_zp(self):  # $65/101 ADC zp
+        self.ADC(self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x75)
+    def op_adc_zpx(self):  # $75/117 ADC zp,X
+        self.ADC(self.get_mem(self.zeropage_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x6d)
+    def op_adc_abs(self):  # $6D/109 ADC abs
+        self.ADC(self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x7d)
+    def op_adc_absx(self):  # $7D/125 ADC abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.ADC(self.get_mem(self.absolute_x()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x79)
+    def op_adc_absy(self):  # $79/121 ADC abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.ADC(self.get_mem(self.absolute_y()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x61)
+    def op_adc_indx(self):  # $61/97 ADC (zp,X)
+        self.ADC(self.get_mem(self.indirect_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x71)
+    def op_adc_indy(self):  # $71/113 ADC (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.ADC(self.get_mem(self.indirect_y()))
+        self.pc += 1
+        return 1
+
+    # case 0x29:
+    # AND(IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0x25:
+    # AND(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0x35:
+    # AND(MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0x2d:
+    # AND(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x3d:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # AND(MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x39:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # AND(MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x21:
+    # AND(MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0x31:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # AND(MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # AND instructions
+    @opcode(0x29)
+    def op_and_imm(self):  # $29/41 AND #n
+        self.AND(self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0x25)
+    def op_and_zp(self):  # $25/37 AND zp
+        self.AND(self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x35)
+    def op_and_zpx(self):  # $35/53 AND zp,X
+        self.AND(self.get_mem(self.zeropage_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x2d)
+    def op_and_abs(self):  # $2D/45 AND abs
+        self.AND(self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x3d)
+    def op_and_absx(self):  # $3D/61 AND abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.AND(self.get_mem(self.absolute_x()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x39)
+    def op_and_absy(self):  # $39/57 AND abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.AND(self.get_mem(self.absolute_y()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x21)
+    def op_and_indx(self):  # $21/33 AND (zp,X)
+        self.AND(self.get_mem(self.indirect_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x31)
+    def op_and_indy(self):  # $31/49 AND (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.AND(self.get_mem(self.indirect_y()))
+        self.pc += 1
+        return 1
+
+    # case 0x0a:
+    # ASL(a);
+    # break;
+    #
+    # case 0x06:
+    # ASL(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0x16:
+    # ASL(MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0x0e:
+    # ASL(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x1e:
+    # ASL(MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+
+    # ASL instructions
+    @opcode(0x0a)
+    def op_asl_acc(self):  # $0A/10 ASL A
+        self.a = self.ASL(self.a)
+        return 1
+
+    @opcode(0x06)
+    def op_asl_zp(self):  # $06/6 ASL zp
+        adr = self.zeropage()
+        self.set_mem(adr, self.ASL(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x16)
+    def op_asl_zpx(self):  # $16/22 ASL zp,X
+        adr = self.zeropage_x()
+        self.set_mem(adr, self.ASL(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x0e)
+    def op_asl_abs(self):  # $0E/14 ASL abs
+        adr = self.absolute()
+        self.set_mem(adr, self.ASL(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    @opcode(0x1e)
+    def op_asl_absx(self):  # $1E/30 ASL abs,X
+        adr = self.absolute_x()
+        self.set_mem(adr, self.ASL(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    # case 0x90:
+    # if (!(flags & FC)) BRANCH()
+    # else pc++;
+    # break;
+
+    # BCC instruction
+    @opcode(0x90)
+    def op_bcc(self):  # $90/144 BCC rel
+        if not (self.p & FC):
+            self.branch()
+        else:
             self.pc += 1
-            return 1
-
-        if instruction == 0x2d:  # $2D/45 AND abs
-            self.AND(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x3d:  # $3D/61 AND abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.AND(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x39:  # $39/57 AND abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.AND(OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
+        return 1
 
-        if instruction == 0x21:  # $21/33 AND (zp,X)
-            self.AND(OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
+    # case 0xb0:
+    # if (flags & FC) BRANCH()
+    # else pc++;
+    # break;
 
-        if instruction == 0x31:  # $31/49 AND (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.AND(OperandRef(LOC_VAL, self.indirect_y()))
+    # BCS instruction
+    @opcode(0xb0)
+    def op_bcs(self):  # $B0/176 BCS rel
+        if (self.p & FC):
+            self.branch()
+        else:
             self.pc += 1
-            return 1
-
-        # case 0x0a:
-        # ASL(a);
-        # break;
-        #
-        # case 0x06:
-        # ASL(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0x16:
-        # ASL(MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0x0e:
-        # ASL(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x1e:
-        # ASL(MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-
-        # ASL instructions
-        if instruction == 0x0a:  # $0A/10 ASL A
-            self.ASL(A_OPREF)
-            return 1
+        return 1
 
-        if instruction == 0x06:  # $06/6 ASL zp
-            self.ASL(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
+    # case 0xf0:
+    # if (flags & FZ) BRANCH()
+    # else pc++;
+    # break;
 
-        if instruction == 0x16:  # $16/22 ASL zp,X
-            self.ASL(OperandRef(LOC_VAL, self.zeropage_x()))
+    # BEQ instruction
+    @opcode(0xf0)
+    def op_beq(self):  # $F0/240 BEQ rel
+        if not (self.nz & 0xff):
+            self.branch()
+        else:
             self.pc += 1
-            return 1
-
-        if instruction == 0x0e:  # $0E/14 ASL abs
-            self.ASL(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x1e:  # $1E/30 ASL abs,X
-            self.ASL(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0x90:
-        # if (!(flags & FC)) BRANCH()
-        # else pc++;
-        # break;
-
-        # BCC instruction
-        if instruction == 0x90:  # $90/144 BCC rel
-            if not (self.flags & FC):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0xb0:
-        # if (flags & FC) BRANCH()
-        # else pc++;
-        # break;
-
-        # BCS instruction
-        if instruction == 0xb0:  # $B0/176 BCS rel
-            if (self.flags & FC):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0xf0:
-        # if (flags & FZ) BRANCH()
-        # else pc++;
-        # break;
-
-        # BEQ instruction
-        if instruction == 0xf0:  # $F0/240 BEQ rel
-            if (self.flags & FZ):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
+        return 1
 
-        # case 0x24:
-        # BIT(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0x2c:
-        # BIT(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-
-        # BIT instructions
-        if instruction == 0x24:  # $24/36 BIT zp
-            self.BIT(OperandRef(LOC_VAL, self.zeropage()))
+    # case 0x24:
+    # BIT(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0x2c:
+    # BIT(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+
+    # BIT instructions
+    @opcode(0x24)
+    def op_bit_zp(self):  # $24/36 BIT zp
+        self.BIT(self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x2c)
+    def op_bit_abs(self):  # $2C/44 BIT abs
+        self.BIT(self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    # case 0x30:
+    # if (flags & FN) BRANCH()
+    # else pc++;
+    # break;
+
+    # BMI instruction
+    @opcode(0x30)
+    def op_bmi(self):  # $30/48 BMI rel
+        if self.nz & 0x180:
+            self.branch()
+        else:
             self.pc += 1
-            return 1
-
-        if instruction == 0x2c:  # $2C/44 BIT abs
-            self.BIT(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        # case 0x30:
-        # if (flags & FN) BRANCH()
-        # else pc++;
-        # break;
-
-        # BMI instruction
-        if instruction == 0x30:  # $30/48 BMI rel
-            if (self.flags & FN):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0xd0:
-        # if (!(flags & FZ)) BRANCH()
-        # else pc++;
-        # break;
-
-        # BNE instruction
-        if instruction == 0xd0:  # $D0/208 BNE rel
-            if not (self.flags & FZ):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0x10:
-        # if (!(flags & FN)) BRANCH()
-        # else pc++;
-        # break;
-
-        # BPL instruction
-        if instruction == 0x10:  # $10/16 BPL rel
-            if not (self.flags & FN):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0x50:
-        # if (!(flags & FV)) BRANCH()
-        # else pc++;
-        # break;
-
-        # BVC instruction
-        if instruction == 0x50:  # $50/80 BVC rel
-            if not (self.flags & FV):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0x70:
-        # if (flags & FV) BRANCH()
-        # else pc++;
-        # break;
-
-        # BVS instruction
-        if instruction == 0x70:  # $70/112 BVS rel
-            if (self.flags & FV):
-                self.branch()
-            else:
-                self.pc += 1
-            return 1
-
-        # case 0x18:
-        # flags &= ~FC;
-        # break;
-
-        # CLC instruction
-        if instruction == 0x18:  # $18/24 CLC
-            self.flags &= (~FC & 0xff)
-            return 1
-
-        # case 0xd8:
-        # flags &= ~FD;
-        # break;
-
-        # CLD instruction
-        if instruction == 0xd8:  # $D8/216 CLD
-            self.flags &= (~FD & 0xff)
-            return 1
-
-        # case 0x58:
-        # flags &= ~FI;
-        # break;
-
-        # CLI instruction
-        if instruction == 0x58:  # $58/88 CLI
-            self.flags &= (~FI & 0xff)
-            return 1
-
-        # case 0xb8:
-        # flags &= ~FV;
-        # break;
+        return 1
 
-        # CLV instruction
-        if instruction == 0xb8:  # $B8/184 CLV
-            self.flags &= (~FV & 0xff)
-            return 1
+    # case 0xd0:
+    # if (!(flags & FZ)) BRANCH()
+    # else pc++;
+    # break;
 
-        # case 0xc9:
-        # CMP(a, IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xc5:
-        # CMP(a, MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xd5:
-        # CMP(a, MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0xcd:
-        # CMP(a, MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xdd:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # CMP(a, MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xd9:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # CMP(a, MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xc1:
-        # CMP(a, MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0xd1:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # CMP(a, MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # CMP instructions
-        if instruction == 0xc9:  # $C9/201 CMP #n
-            self.CMP(A_OPREF, OperandRef(BYTE_VAL, self.immediate()))
+    # BNE instruction
+    @opcode(0xd0)
+    def op_bne(self):  # $D0/208 BNE rel
+        if self.nz & 0xff:
+            self.branch()
+        else:
             self.pc += 1
-            return 1
+        return 1
 
-        if instruction == 0xc5:  # $C5/197 CMP zp
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
+    # case 0x10:
+    # if (!(flags & FN)) BRANCH()
+    # else pc++;
+    # break;
 
-        if instruction == 0xd5:  # $D5/213 CMP zp,X
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.zeropage_x()))
+    # BPL instruction
+    @opcode(0x10)
+    def op_bpl(self):  # $10/16 BPL rel
+        if not (self.nz & 0x180):
+            self.branch()
+        else:
             self.pc += 1
-            return 1
-
-        if instruction == 0xcd:  # $CD/205 CMP abs
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xdd:  # $DD/221 CMP abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xd9:  # $D9/217 CMP abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
+        return 1
 
-        if instruction == 0xc1:  # $C1/193 CMP (zp,X)
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
+    # case 0x50:
+    # if (!(flags & FV)) BRANCH()
+    # else pc++;
+    # break;
 
-        if instruction == 0xd1:  # $D1/209 CMP (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.CMP(A_OPREF, OperandRef(LOC_VAL, self.indirect_y()))
+    # BVC instruction
+    @opcode(0x50)
+    def op_bvc(self):  # $50/80 BVC rel
+        if not (self.p & FV):
+            self.branch()
+        else:
             self.pc += 1
-            return 1
+        return 1
 
-        # case 0xe0:
-        # CMP(x, IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xe4:
-        # CMP(x, MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xec:
-        # CMP(x, MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-
-        # CPX instructions
-        if instruction == 0xe0:  # $E0/224 CPX #n
-            self.CMP(X_OPREF, OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
+    # case 0x70:
+    # if (flags & FV) BRANCH()
+    # else pc++;
+    # break;
 
-        if instruction == 0xe4:  # $E4/228 CPX zp
-            self.CMP(X_OPREF, OperandRef(LOC_VAL, self.zeropage()))
+    # BVS instruction
+    @opcode(0x70)
+    def op_bvs(self):  # $70/112 BVS rel
+        if (self.p & FV):
+            self.branch()
+        else:
             self.pc += 1
-            return 1
-
-        if instruction == 0xec:  # $EC/236 CPX abs
-            self.CMP(X_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        # case 0xc0:
-        # CMP(y, IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xc4:
-        # CMP(y, MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xcc:
-        # CMP(y, MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-
-        # CPY instructions
-        if instruction == 0xc0:  # $C0/192 CPY #n
-            self.CMP(Y_OPREF, OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xc4:  # $C4/196 CPY zp
-            self.CMP(Y_OPREF, OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xcc:  # $CC/204 CPY abs
-            self.CMP(Y_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        # case 0xc6:
-        # DEC(MEM(ZEROPAGE()));
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0xd6:
-        # DEC(MEM(ZEROPAGEX()));
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0xce:
-        # DEC(MEM(ABSOLUTE()));
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-        #
-        # case 0xde:
-        # DEC(MEM(ABSOLUTEX()));
-        # WRITE(ABSOLUTEX());
-        # pc += 2;
-        # break;
-
-        # DEC instructions
-        if instruction == 0xc6:  # $C6/198 DEC zp
-            self.DEC(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xd6:  # $D6/214 DEC zp,X
-            self.DEC(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xce:  # $CE/206 DEC abs
-            self.DEC(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xde:  # $DE/222 DEC abs,X
-            self.DEC(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0xca:
-        # x--;
-        # SETFLAGS(x);
-        # break;
-
-        # DEX instruction
-        if instruction == 0xca:  # $CA/202 DEX
-            self.x -= 1
-            self.x &= 0xff
-            self.set_flags(self.x)
-            return 1
-
-        # case 0x88:
-        # y--;
-        # SETFLAGS(y);
-        # break;
-
-        # DEY instruction
-        if instruction == 0x88:  # $88/136 DEY
-            self.y -= 1
-            self.y &= 0xff
-            self.set_flags(self.y)
-            return 1
-
-        # case 0x49:
-        # EOR(IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0x45:
-        # EOR(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0x55:
-        # EOR(MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0x4d:
-        # EOR(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x5d:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # EOR(MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x59:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # EOR(MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x41:
-        # EOR(MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0x51:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # EOR(MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # EOR instructions
-        if instruction == 0x49:  # $49/73 EOR #n
-            self.EOR(OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x45:  # $45/69 EOR zp
-            self.EOR(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x55:  # $55/85 EOR zp,X
-            self.EOR(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x4d:  # $4D/77 EOR abs
-            self.EOR(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x5d:  # $5D/93 EOR abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.EOR(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x59:  # $59/89 EOR abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.EOR(OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x41:  # $41/65 EOR (zp,X)
-            self.EOR(OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x51:  # $51/81 EOR (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.EOR(OperandRef(LOC_VAL, self.indirect_y()))
-            self.pc += 1
-            return 1
-
-        # case 0xe6:
-        # INC(MEM(ZEROPAGE()));
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0xf6:
-        # INC(MEM(ZEROPAGEX()));
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0xee:
-        # INC(MEM(ABSOLUTE()));
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-        #
-        # case 0xfe:
-        # INC(MEM(ABSOLUTEX()));
-        # WRITE(ABSOLUTEX());
-        # pc += 2;
-        # break;
-
-        # INC instructions
-        if instruction == 0xe6:  # $E6/230 INC zp
-            self.INC(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xf6:  # $F6/246 INC zp,X
-            self.INC(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xee:  # $EE/238 INC abs
-            self.INC(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xfe:  # $FE/254 INC abs,X
-            self.INC(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0xe8:
-        # x++;
-        # SETFLAGS(x);
-        # break;
-
-        # INX instruction
-        if instruction == 0xe8:  # $E8/232 INX
-            self.x += 1
-            self.x &= 0xff
-            self.set_flags(self.x)
-            return 1
-
-        # case 0xc8:
-        # y++;
-        # SETFLAGS(y);
-        # break;
-
-        # INY instruction
-        if instruction == 0xc8:  # $C8/200 INY
-            self.y += 1
-            self.y &= 0xff
-            self.set_flags(self.y)
-            return 1
-
-        # case 0x20:
-        # PUSH((pc+1) >> 8);
-        # PUSH((pc+1) & 0xff);
-        # pc = ABSOLUTE();
-        # break;
-
-        # JSR instruction
-        if instruction == 0x20:  # $20/32 JSR abs
-            self.push((self.pc + 1) >> 8)
-            self.push((self.pc + 1) & 0xff)
-            self.pc = self.absolute()
-            return 1
-
-        # case 0x4c:
-        # pc = ABSOLUTE();
-        # break;
-        #
-        # case 0x6c:
-        # {
-        #   unsigned short adr = ABSOLUTE();
-        #   pc = (MEM(adr) | (MEM(((adr + 1) & 0xff) | (adr & 0xff00)) << 8));
-        # }
-        # break;
-
-        # JMP instructions
-        if instruction == 0x4c:  # $4C/76 JMP abs
-            self.pc = self.absolute()
-            return 1
-
-        if instruction == 0x6c:  # $6C/108 JMP (abs)
-            adr = self.absolute()
-            # Yup, indirect JMP is bug compatible
-            self.pc = (self.get_mem(adr) | (self.get_mem(((adr + 1) & 0xff) | (adr & 0xff00)) << 8))
-            return 1
-
-        # case 0xa9:
-        # ASSIGNSETFLAGS(a, IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xa5:
-        # ASSIGNSETFLAGS(a, MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xb5:
-        # ASSIGNSETFLAGS(a, MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0xad:
-        # ASSIGNSETFLAGS(a, MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xbd:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # ASSIGNSETFLAGS(a, MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xb9:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # ASSIGNSETFLAGS(a, MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xa1:
-        # ASSIGNSETFLAGS(a, MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0xb1:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # ASSIGNSETFLAGS(a, MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # LDA instructions
-        if instruction == 0xa9:  # $A9/169 LDA #n
-            self.assign_then_set_flags(A_OPREF, OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xa5:  # $A5/165 LDA zp
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xb5:  # $B5/181 LDA zp,X
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xad:  # $AD/173 LDA abs
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xbd:  # $BD/189 LDA abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xb9:  # $B9/185 LDA abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xa1:  # $A1/161 LDA (zp,X)
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xb1:  # $B1/177 LDA (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.indirect_y()))
-            self.pc += 1
-            return 1
-
-        # case 0xa2:
-        # ASSIGNSETFLAGS(x, IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xa6:
-        # ASSIGNSETFLAGS(x, MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xb6:
-        # ASSIGNSETFLAGS(x, MEM(ZEROPAGEY()));
-        # pc++;
-        # break;
-        #
-        # case 0xae:
-        # ASSIGNSETFLAGS(x, MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xbe:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # ASSIGNSETFLAGS(x, MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-
-        # LDX instructions
-        if instruction == 0xa2:  # $A2/162 LDX #n
-            self.assign_then_set_flags(X_OPREF, OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xa6:  # $A6/166 LDX zp
-            self.assign_then_set_flags(X_OPREF, OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xb6:  # $B6/182 LDX zp,Y
-            self.assign_then_set_flags(X_OPREF, OperandRef(LOC_VAL, self.zeropage_y()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xae:  # $AE/174 LDX abs
-            self.assign_then_set_flags(X_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xbe:  # $BE/190 LDX abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.assign_then_set_flags(X_OPREF, OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
-
-        # case 0xa0:
-        # ASSIGNSETFLAGS(y, IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xa4:
-        # ASSIGNSETFLAGS(y, MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xb4:
-        # ASSIGNSETFLAGS(y, MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0xac:
-        # ASSIGNSETFLAGS(y, MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xbc:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # ASSIGNSETFLAGS(y, MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-
-        # LDY instructions
-        if instruction == 0xa0:  # $A0/160 LDY #n
-            self.assign_then_set_flags(Y_OPREF, OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xa4:  # $A4/164 LDY zp
-            self.assign_then_set_flags(Y_OPREF, OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xb4:  # $B4/180 LDY zp,X
-            self.assign_then_set_flags(Y_OPREF, OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xac:  # $AC/172 LDY abs
-            self.assign_then_set_flags(Y_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xbc:  # $BC/188 LDY abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.assign_then_set_flags(Y_OPREF, OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0x4a:
-        # LSR(a);
-        # break;
-        #
-        # case 0x46:
-        # LSR(MEM(ZEROPAGE()));
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0x56:
-        # LSR(MEM(ZEROPAGEX()));
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0x4e:
-        # LSR(MEM(ABSOLUTE()));
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-        #
-        # case 0x5e:
-        # LSR(MEM(ABSOLUTEX()));
-        # WRITE(ABSOLUTEX());
-        # pc += 2;
-        # break;
-
-        # LSR instructions
-        if instruction == 0x4a:  # $4A/74 LSR A
-            self.LSR(A_OPREF)
-            return 1
-
-        if instruction == 0x46:  # $46/70 LSR zp
-            self.LSR(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x56:  # $56/86 LSR zp,X
-            self.LSR(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x4e:  # $4E/78 LSR abs
-            self.LSR(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x5e:  # $5E/94 LSR abs,X
-            self.LSR(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0xea:
-        # break;
-
-        # NOP instruction
-        if instruction == 0xea:  # $EA/234 NOP
-            return 1
-
-        # case 0x09:
-        # ORA(IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0x05:
-        # ORA(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0x15:
-        # ORA(MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0x0d:
-        # ORA(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x1d:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # ORA(MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x19:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # ORA(MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0x01:
-        # ORA(MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0x11:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # ORA(MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # ORA instructions
-        if instruction == 0x09:  # $09/9 ORA #n
-            self.ORA(OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x05:  # $05/5 ORA zp
-            self.ORA(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x15:  # $15/21 ORA zp,X
-            self.ORA(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x0d:  # $0D/13 ORA abs
-            self.ORA(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x1d:  # $1D/29 ORA abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.ORA(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x19:  # $19/25 ORA abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.ORA(OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x01:  # $01/1 ORA (zp,X)
-            self.ORA(OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x11:  # $11/17 ORA (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.ORA(OperandRef(LOC_VAL, self.indirect_y()))
-            self.pc += 1
-            return 1
-
-        # case 0x48:
-        # PUSH(a);
-        # break;
-
-        # PHA instruction
-        if instruction == 0x48:  # $48/72 PHA
-            self.push(self.a)
-            return 1
-
-        # case == 0x08:
-        # PUSH(flags);
-        # break;
-
-        # PHP instruction
-        if instruction == 0x08:  # $08/8 PHP
-            # add in the B flag: https://github.com/eteran/pretendo/blob/master/doc/cpu/6502.txt
-            self.push(self.flags | FB)
-            return 1
-
-        # case 0x68:
-        # ASSIGNSETFLAGS(a, POP());
-        # break;
-
-        # PLA instruction
-        if instruction == 0x68:  # $68/104 PLA
-            self.assign_then_set_flags(A_OPREF, OperandRef(BYTE_VAL, self.pop()))
-            return 1
-
-        # case 0x28:
-        # flags = POP();
-        # break;
-
-        # PLP instruction
-        if instruction == 0x28:  # $28/40 PLP
-            self.flags = self.pop()
-
-            # https://en.wikipedia.org/wiki/MOS_Technology_6502
-            # The "Break" flag of the processor is very different from the other
-            # flag bits. It has no flag setting, resetting, or testing instructions
-            # of its own, and is not affected by the PHP and PLP instructions. It
-            # exists only on the stack, where BRK and PHP always write a 1, while
-            # IRQ and NMI always write a 0.
-            self.flags &= (~FB & 0xff)  # not done in siddump.c
-
-            self.flags |= FU  # needed for Wolfgang Lorenz tests
-            return 1
-
-        # case 0x2a:
-        # ROL(a);
-        # break;
-        #
-        # case 0x26:
-        # ROL(MEM(ZEROPAGE()));
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0x36:
-        # ROL(MEM(ZEROPAGEX()));
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0x2e:
-        # ROL(MEM(ABSOLUTE()));
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-        #
-        # case 0x3e:
-        # ROL(MEM(ABSOLUTEX()));
-        # WRITE(ABSOLUTEX());
-        # pc += 2;
-        # break;
-
-        # ROL instructions
-        if instruction == 0x2a:  # $2A/42 ROL A
-            self.ROL(A_OPREF)
-            return 1
-
-        if instruction == 0x26:  # $26/38 ROL zp
-            self.ROL(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x36:  # $36/54 ROL zp,X
-            self.ROL(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x2e:  # $2E/46 ROL abs
-            self.ROL(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x3e:  # $3E/62 ROL abs,X
-            self.ROL(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0x6a:
-        # ROR(a);
-        # break;
-        #
-        # case 0x66:
-        # ROR(MEM(ZEROPAGE()));
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0x76:
-        # ROR(MEM(ZEROPAGEX()));
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0x6e:
-        # ROR(MEM(ABSOLUTE()));
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-        #
-        # case 0x7e:
-        # ROR(MEM(ABSOLUTEX()));
-        # WRITE(ABSOLUTEX());
-        # pc += 2;
-        # break;
-
-        # ROR instructions
-        if instruction == 0x6a:  # $6A/106 ROR A
-            self.ROR(A_OPREF)
-            return 1
-
-        if instruction == 0x66:  # $66/102 ROR zp
-            self.ROR(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x76:  # $76/118 ROR zp,X
-            self.ROR(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0x6e:  # $6E/110 ROR abs
-            self.ROR(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0x7e:  # $7E/126 ROR abs,X
-            self.ROR(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        # case 0x40:
-        # if (sp == 0xff) return 0;
-        # flags = POP();
-        # pc = POP();
-        # pc |= POP() << 8;
-        # break;
-
-        # RTI instruction
-        if instruction == 0x40:  # $40/64 RTI
-            if (self.exit_on_empty_stack
-                    and (self.sp >= 0xfd or 0x00 <= self.sp <= STACK_WRAP_AREA)):
-                # If there's not enough stack left for the return or
-                # if the stack has already wrapped, then exit.
-                return 0
-            self.flags = self.pop()  # TODO: clear B flag like we did with PLP?
-            self.flags |= FU  # needed for Wolfgang Lorenz tests
-            # Note that unlike RTS, the return address on the stack is the actual address
-            self.pc = self.pop()
-            self.pc |= (self.pop() << 8)
-            return 1
-
-        # case 0x60:
-        # if (sp == 0xff) return 0;
-        # pc = POP();
-        # pc |= POP() << 8;
-        # pc++;
-        # break;
-
-        # RTS instruction
-        if instruction == 0x60:  # $60/96 RTS
-            if (self.exit_on_empty_stack
-                    and (self.sp >= 0xfe or 0x00 <= self.sp <= STACK_WRAP_AREA)):
-                # If there's not enough stack left for the return or
-                # if the stack has already wrapped, then exit.
-                return 0
-            self.pc = self.pop()
-            self.pc |= (self.pop() << 8)
-            self.pc += 1
-            return 1
-
-        # case 0xe9:
-        # SBC(IMMEDIATE());
-        # pc++;
-        # break;
-        #
-        # case 0xe5:
-        # SBC(MEM(ZEROPAGE()));
-        # pc++;
-        # break;
-        #
-        # case 0xf5:
-        # SBC(MEM(ZEROPAGEX()));
-        # pc++;
-        # break;
-        #
-        # case 0xed:
-        # SBC(MEM(ABSOLUTE()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xfd:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # SBC(MEM(ABSOLUTEX()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xf9:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
-        # SBC(MEM(ABSOLUTEY()));
-        # pc += 2;
-        # break;
-        #
-        # case 0xe1:
-        # SBC(MEM(INDIRECTX()));
-        # pc++;
-        # break;
-        #
-        # case 0xf1:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # SBC(MEM(INDIRECTY()));
-        # pc++;
-        # break;
-
-        # SBC instructions
-        # $E9 or (equivalent pseudo op) $EB will work here, see:
-        #    https://wiki.nesdev.com/w/index.php/Programming_with_unofficial_opcodes#Duplicated_instructions
-        if instruction == 0xe9 or instruction == 0xeb:  # $E9/233 (or $EB/235) SBC #n
-            self.SBC(OperandRef(BYTE_VAL, self.immediate()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xe5:  # $E5/229 SBC zp
-            self.SBC(OperandRef(LOC_VAL, self.zeropage()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xf5:  # $F5/245 SBC zp,X
-            self.SBC(OperandRef(LOC_VAL, self.zeropage_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xed:  # $ED/237 SBC abs
-            self.SBC(OperandRef(LOC_VAL, self.absolute()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xfd:  # $FD/253 SBC abs,X
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.SBC(OperandRef(LOC_VAL, self.absolute_x()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xf9:  # $F9/249 SBC abs,Y
-            self.cpucycles += self.eval_page_crossing_absolute_y()
-            self.SBC(OperandRef(LOC_VAL, self.absolute_y()))
-            self.pc += 2
-            return 1
-
-        if instruction == 0xe1:  # $E1/225 SBC (zp,X)
-            self.SBC(OperandRef(LOC_VAL, self.indirect_x()))
-            self.pc += 1
-            return 1
-
-        if instruction == 0xf1:  # $F1/241 SBC (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.SBC(OperandRef(LOC_VAL, self.indirect_y()))
-            self.pc += 1
-            return 1
-
-        # case 0x38:
-        # flags |= FC;
-        # break;
-
-        # SEC instruction
-        if instruction == 0x38:  # $38/56 SEC
-            self.flags |= FC
-            return 1
-
-        # case 0xf8:
-        # flags |= FD;
-        # break;
-
-        # SED instruction
-        if instruction == 0xf8:  # $F8/248 SED
-            self.flags |= FD
-            return 1
-
-        # case 0x78:
-        # flags |= FI;
-        # break;
-
-        # SEI instruction
-        if instruction == 0x78:  # $78/120 SEI
-            self.flags |= FI
-            return 1
-
-        # case 0x85:
-        # MEM(ZEROPAGE()) = a;
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0x95:
-        # MEM(ZEROPAGEX()) = a;
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0x8d:
-        # MEM(ABSOLUTE()) = a;
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-        #
-        # case 0x9d:
-        # MEM(ABSOLUTEX()) = a;
-        # WRITE(ABSOLUTEX());
-        # pc += 2;
-        # break;
-        #
-        # case 0x99:
-        # MEM(ABSOLUTEY()) = a;
-        # WRITE(ABSOLUTEY());
-        # pc += 2;
-        # break;
-        #
-        # case 0x81:
-        # MEM(INDIRECTX()) = a;
-        # WRITE(INDIRECTX());
-        # pc++;
-        # break;
-        #
-        # case 0x91:
-        # MEM(INDIRECTY()) = a;
-        # WRITE(INDIRECTY());
-        # pc++;
-        # break;
-
-        # STA instructions
-        # Note: STA/X/Y doesn't affect flags
-        if instruction == 0x85:  # $85/133 STA zp
-            self.set_mem(self.zeropage(), self.a)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x95:  # $95/149 STA zp,X
-            self.set_mem(self.zeropage_x(), self.a)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x8d:  # $8D/141 STA abs
-            self.set_mem(self.absolute(), self.a)
-            self.pc += 2
-            return 1
-
-        if instruction == 0x9d:  # $9D/157 STA abs,X
-            self.set_mem(self.absolute_x(), self.a)
-            self.pc += 2
-            return 1
-
-        if instruction == 0x99:  # $99/153 STA abs,Y
-            self.set_mem(self.absolute_y(), self.a)
-            self.pc += 2
-            return 1
-
-        if instruction == 0x81:  # $81/129 STA (zp,X)
-            self.set_mem(self.indirect_x(), self.a)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x91:  # $91/145 STA (zp),Y
-            self.set_mem(self.indirect_y(), self.a)
-            self.pc += 1
-            return 1
-
-        # case 0x86:
-        # MEM(ZEROPAGE()) = x;
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0x96:
-        # MEM(ZEROPAGEY()) = x;
-        # WRITE(ZEROPAGEY());
-        # pc++;
-        # break;
-        #
-        # case 0x8e:
-        # MEM(ABSOLUTE()) = x;
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-
-        # STX instructions
-        if instruction == 0x86:  # $86/134 STX zp
-            self.set_mem(self.zeropage(), self.x)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x96:  # $96/150 STX zp,Y
-            self.set_mem(self.zeropage_y(), self.x)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x8e:  # $8E/142 STX abs
-            self.set_mem(self.absolute(), self.x)
-            self.pc += 2
-            return 1
-
-        # case 0x84:
-        # MEM(ZEROPAGE()) = y;
-        # WRITE(ZEROPAGE());
-        # pc++;
-        # break;
-        #
-        # case 0x94:
-        # MEM(ZEROPAGEX()) = y;
-        # WRITE(ZEROPAGEX());
-        # pc++;
-        # break;
-        #
-        # case 0x8c:
-        # MEM(ABSOLUTE()) = y;
-        # WRITE(ABSOLUTE());
-        # pc += 2;
-        # break;
-
-        # STY instructions
-        if instruction == 0x84:  # $84/132 STY zp
-            self.set_mem(self.zeropage(), self.y)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x94:  # $94/148 STY zp,X
-            self.set_mem(self.zeropage_x(), self.y)
-            self.pc += 1
-            return 1
-
-        if instruction == 0x8c:  # $8C/140 STY abs
-            self.set_mem(self.absolute(), self.y)
-            self.pc += 2
-            return 1
-
-        # case 0xaa:
-        # ASSIGNSETFLAGS(x, a);
-        # break;
-
-        # TAX instruction
-        if instruction == 0xaa:  # $AA/170 TAX
-            self.assign_then_set_flags(X_OPREF, A_OPREF)
-            return 1
-
-        # case 0xba:
-        # ASSIGNSETFLAGS(x, sp);
-        # break;
-
-        # TSX instruction
-        if instruction == 0xba:  # $BA/186 TSX
-            self.assign_then_set_flags(X_OPREF, SP_OPREF)
-            return 1
-
-        # case 0x8a:
-        # ASSIGNSETFLAGS(a, x);
-        # break;
-
-        # TXA instruction
-        if instruction == 0x8a:  # $8A/138 TXA
-            self.assign_then_set_flags(A_OPREF, X_OPREF)
-            return 1
-
-        # case 0x9a:
-        # ASSIGNSETFLAGS(sp, x);
-        # break;
-
-        # TXS instruction
-        if instruction == 0x9a:  # $9A/154 TXS
-            # Bug in siddump.c < v1.08, TXS does NOT set flags
-            self.assign_no_flag_changes(SP_OPREF, X_OPREF)
-            return 1
-
-        # case 0x98:
-        # ASSIGNSETFLAGS(a, y);
-        # break;
-
-        # TYA instruction
-        if instruction == 0x98:  # $98/152 TYA
-            self.assign_then_set_flags(A_OPREF, Y_OPREF)
-            return 1
-
-        # case 0xa8:
-        # ASSIGNSETFLAGS(y, a);
-        # break;
-
-        # TAY instruction
-        if instruction == 0xa8:  # $A8/168 TAY
-            self.assign_then_set_flags(Y_OPREF, A_OPREF)
-            return 1
-
-        # case 0x00:
-        # return 0;
-
-        # BRK instruction
-        # http://www.6502.org/tutorials/register_preservation.html
-        # https://wiki.nesdev.com/w/index.php/Status_flags
-        # Articles say there is no B flag in the processor status register,
-        # the bit is unused.  PHP and BRK pushes the P register onto the stack with break
-        # bit set, and IRQ/NMI pushes P register with break bit clear.  The "actual" B flag
-        # doesn't exist.  I did a BRK in VICE, and sure enough, the B flag wasn't set.
-
-        if instruction == 0x00:  # $00/0 BRK
-            # This is unnecessary to implement from a SID playback perspective
-            # so siddump.c ignored it
-            self.pc += 1  # BRK is a 2-byte opcode (2nd byte is padding)
-            self.pc &= 0xffff
-            self.push((self.pc) >> 8)
-            self.push((self.pc) & 0xff)
-            self.push(self.flags | FB)
-            self.flags |= FI
-            self.pc = self.get_le_word(IRQ)
+        return 1
+
+    # case 0x18:
+    # flags &= ~FC;
+    # break;
+
+    # CLC instruction
+    @opcode(0x18)
+    def op_clc(self):  # $18/24 CLC
+        self.p &= (~FC & 0xff)
+        return 1
+
+    # case 0xd8:
+    # flags &= ~FD;
+    # break;
+
+    # CLD instruction
+    @opcode(0xd8)
+    def op_cld(self):  # $D8/216 CLD
+        self.p &= (~FD & 0xff)
+        return 1
+
+    # case 0x58:
+    # flags &= ~FI;
+    # break;
+
+    # CLI instruction
+    @opcode(0x58)
+    def op_cli(self):  # $58/88 CLI
+        self.p &= (~FI & 0xff)
+        return 1
+
+    # case 0xb8:
+    # flags &= ~FV;
+    # break;
+
+    # CLV instruction
+    @opcode(0xb8)
+    def op_clv(self):  # $B8/184 CLV
+        self.p &= (~FV & 0xff)
+        return 1
+
+    # case 0xc9:
+    # CMP(a, IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xc5:
+    # CMP(a, MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xd5:
+    # CMP(a, MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0xcd:
+    # CMP(a, MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xdd:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # CMP(a, MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xd9:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # CMP(a, MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xc1:
+    # CMP(a, MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0xd1:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # CMP(a, MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # CMP instructions
+    @opcode(0xc9)
+    def op_cmp_imm(self):  # $C9/201 CMP #n
+        self.CMP(self.a, self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0xc5)
+    def op_cmp_zp(self):  # $C5/197 CMP zp
+        self.CMP(self.a, self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xd5)
+    def op_cmp_zpx(self):  # $D5/213 CMP zp,X
+        self.CMP(self.a, self.get_mem(self.zeropage_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xcd)
+    def op_cmp_abs(self):  # $CD/205 CMP abs
+        self.CMP(self.a, self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    @opcode(0xdd)
+    def op_cmp_absx(self):  # $DD/221 CMP abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.CMP(self.a, self.get_mem(self.absolute_x()))
+        self.pc += 2
+        return 1
+
+    @opcode(0xd9)
+    def op_cmp_absy(self):  # $D9/217 CMP abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.CMP(self.a, self.get_mem(self.absolute_y()))
+        self.pc += 2
+        return 1
+
+    @opcode(0xc1)
+    def op_cmp_indx(self):  # $C1/193 CMP (zp,X)
+        self.CMP(self.a, self.get_mem(self.indirect_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xd1)
+    def op_cmp_indy(self):  # $D1/209 CMP (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.CMP(self.a, self.get_mem(self.indirect_y()))
+        self.pc += 1
+        return 1
+
+    # case 0xe0:
+    # CMP(x, IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xe4:
+    # CMP(x, MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xec:
+    # CMP(x, MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+
+    # CPX instructions
+    @opcode(0xe0)
+    def op_cpx_imm(self):  # $E0/224 CPX #n
+        self.CMP(self.x, self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0xe4)
+    def op_cpx_zp(self):  # $E4/228 CPX zp
+        self.CMP(self.x, self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xec)
+    def op_cpx_abs(self):  # $EC/236 CPX abs
+        self.CMP(self.x, self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    # case 0xc0:
+    # CMP(y, IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xc4:
+    # CMP(y, MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xcc:
+    # CMP(y, MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+
+    # CPY instructions
+    @opcode(0xc0)
+    def op_cpy_imm(self):  # $C0/192 CPY #n
+        self.CMP(self.y, self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0xc4)
+    def op_cpy_zp(self):  # $C4/196 CPY zp
+        self.CMP(self.y, self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xcc)
+    def op_cpy_abs(self):  # $CC/204 CPY abs
+        self.CMP(self.y, self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    # case 0xc6:
+    # DEC(MEM(ZEROPAGE()));
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0xd6:
+    # DEC(MEM(ZEROPAGEX()));
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0xce:
+    # DEC(MEM(ABSOLUTE()));
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+    #
+    # case 0xde:
+    # DEC(MEM(ABSOLUTEX()));
+    # WRITE(ABSOLUTEX());
+    # pc += 2;
+    # break;
+
+    # DEC instructions
+    @opcode(0xc6)
+    def op_dec_zp(self):  # $C6/198 DEC zp
+        adr = self.zeropage()
+        self.set_mem(adr, self.DEC(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0xd6)
+    def op_dec_zpx(self):  # $D6/214 DEC zp,X
+        adr = self.zeropage_x()
+        self.set_mem(adr, self.DEC(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0xce)
+    def op_dec_abs(self):  # $CE/206 DEC abs
+        adr = self.absolute()
+        self.set_mem(adr, self.DEC(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    @opcode(0xde)
+    def op_dec_absx(self):  # $DE/222 DEC abs,X
+        adr = self.absolute_x()
+        self.set_mem(adr, self.DEC(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    # case 0xca:
+    # x--;
+    # SETFLAGS(x);
+    # break;
+
+    # DEX instruction
+    @opcode(0xca)
+    def op_dex(self):  # $CA/202 DEX
+        self.x -= 1
+        self.x &= 0xff
+        self.nz = self.x
+        return 1
+
+    # case 0x88:
+    # y--;
+    # SETFLAGS(y);
+    # break;
+
+    # DEY instruction
+    @opcode(0x88)
+    def op_dey(self):  # $88/136 DEY
+        self.y -= 1
+        self.y &= 0xff
+        self.nz = self.y
+        return 1
+
+    # case 0x49:
+    # EOR(IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0x45:
+    # EOR(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0x55:
+    # EOR(MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0x4d:
+    # EOR(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x5d:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # EOR(MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x59:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # EOR(MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x41:
+    # EOR(MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0x51:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # EOR(MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # EOR instructions
+    @opcode(0x49)
+    def op_eor_imm(self):  # $49/73 EOR #n
+        self.EOR(self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0x45)
+    def op_eor_zp(self):  # $45/69 EOR zp
+        self.EOR(self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x55)
+    def op_eor_zpx(self):  # $55/85 EOR zp,X
+        self.EOR(self.get_mem(self.zeropage_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x4d)
+    def op_eor_abs(self):  # $4D/77 EOR abs
+        self.EOR(self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x5d)
+    def op_eor_absx(self):  # $5D/93 EOR abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.EOR(self.get_mem(self.absolute_x()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x59)
+    def op_eor_absy(self):  # $59/89 EOR abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.EOR(self.get_mem(self.absolute_y()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x41)
+    def op_eor_indx(self):  # $41/65 EOR (zp,X)
+        self.EOR(self.get_mem(self.indirect_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x51)
+    def op_eor_indy(self):  # $51/81 EOR (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.EOR(self.get_mem(self.indirect_y()))
+        self.pc += 1
+        return 1
+
+    # case 0xe6:
+    # INC(MEM(ZEROPAGE()));
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0xf6:
+    # INC(MEM(ZEROPAGEX()));
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0xee:
+    # INC(MEM(ABSOLUTE()));
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+    #
+    # case 0xfe:
+    # INC(MEM(ABSOLUTEX()));
+    # WRITE(ABSOLUTEX());
+    # pc += 2;
+    # break;
+
+    # INC instructions
+    @opcode(0xe6)
+    def op_inc_zp(self):  # $E6/230 INC zp
+        adr = self.zeropage()
+        self.set_mem(adr, self.INC(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0xf6)
+    def op_inc_zpx(self):  # $F6/246 INC zp,X
+        adr = self.zeropage_x()
+        self.set_mem(adr, self.INC(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0xee)
+    def op_inc_abs(self):  # $EE/238 INC abs
+        adr = self.absolute()
+        self.set_mem(adr, self.INC(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    @opcode(0xfe)
+    def op_inc_absx(self):  # $FE/254 INC abs,X
+        adr = self.absolute_x()
+        self.set_mem(adr, self.INC(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    # case 0xe8:
+    # x++;
+    # SETFLAGS(x);
+    # break;
+
+    # INX instruction
+    @opcode(0xe8)
+    def op_inx(self):  # $E8/232 INX
+        self.x += 1
+        self.x &= 0xff
+        self.nz = self.x
+        return 1
+
+    # case 0xc8:
+    # y++;
+    # SETFLAGS(y);
+    # break;
+
+    # INY instruction
+    @opcode(0xc8)
+    def op_iny(self):  # $C8/200 INY
+        self.y += 1
+        self.y &= 0xff
+        self.nz = self.y
+        return 1
+
+    # case 0x20:
+    # PUSH((pc+1) >> 8);
+    # PUSH((pc+1) & 0xff);
+    # pc = ABSOLUTE();
+    # break;
+
+    # JSR instruction
+    @opcode(0x20)
+    def op_jsr_abs(self):  # $20/32 JSR abs
+        self.push((self.pc + 1) >> 8)
+        self.push((self.pc + 1) & 0xff)
+        self.pc = self.absolute()
+        return 1
+
+    # case 0x4c:
+    # pc = ABSOLUTE();
+    # break;
+    #
+    # case 0x6c:
+    # {
+    #   unsigned short adr = ABSOLUTE();
+    #   pc = (MEM(adr) | (MEM(((adr + 1) & 0xff) | (adr & 0xff00)) << 8));
+    # }
+    # break;
+
+    # JMP instructions
+    @opcode(0x4c)
+    def op_jmp_abs(self):  # $4C/76 JMP abs
+        self.pc = self.absolute()
+        return 1
+
+    @opcode(0x6c)
+    def op_jmp_ind(self):  # $6C/108 JMP (abs)
+        adr = self.absolute()
+        # Yup, indirect JMP is bug compatible
+        self.pc = (self.get_mem(adr) | (self.get_mem(((adr + 1) & 0xff) | (adr & 0xff00)) << 8))
+        return 1
+
+    # case 0xa9:
+    # ASSIGNSETFLAGS(a, IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xa5:
+    # ASSIGNSETFLAGS(a, MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xb5:
+    # ASSIGNSETFLAGS(a, MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0xad:
+    # ASSIGNSETFLAGS(a, MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xbd:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # ASSIGNSETFLAGS(a, MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xb9:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # ASSIGNSETFLAGS(a, MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xa1:
+    # ASSIGNSETFLAGS(a, MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0xb1:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # ASSIGNSETFLAGS(a, MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # LDA instructions
+    @opcode(0xa9)
+    def op_lda_imm(self):  # $A9/169 LDA #n
+        self.a = self.nz = self.immediate()
+        self.pc += 1
+        return 1
+
+    @opcode(0xa5)
+    def op_lda_zp(self):  # $A5/165 LDA zp
+        self.a = self.nz = self.get_mem(self.zeropage())
+        self.pc += 1
+        return 1
+
+    @opcode(0xb5)
+    def op_lda_zpx(self):  # $B5/181 LDA zp,X
+        self.a = self.nz = self.get_mem(self.zeropage_x())
+        self.pc += 1
+        return 1
+
+    @opcode(0xad)
+    def op_lda_abs(self):  # $AD/173 LDA abs
+        self.a = self.nz = self.get_mem(self.absolute())
+        self.pc += 2
+        return 1
+
+    @opcode(0xbd)
+    def op_lda_absx(self):  # $BD/189 LDA abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.a = self.nz = self.get_mem(self.absolute_x())
+        self.pc += 2
+        return 1
+
+    @opcode(0xb9)
+    def op_lda_absy(self):  # $B9/185 LDA abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.a = self.nz = self.get_mem(self.absolute_y())
+        self.pc += 2
+        return 1
+
+    @opcode(0xa1)
+    def op_lda_indx(self):  # $A1/161 LDA (zp,X)
+        self.a = self.nz = self.get_mem(self.indirect_x())
+        self.pc += 1
+        return 1
+
+    @opcode(0xb1)
+    def op_lda_indy(self):  # $B1/177 LDA (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.a = self.nz = self.get_mem(self.indirect_y())
+        self.pc += 1
+        return 1
+
+    # case 0xa2:
+    # ASSIGNSETFLAGS(x, IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xa6:
+    # ASSIGNSETFLAGS(x, MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xb6:
+    # ASSIGNSETFLAGS(x, MEM(ZEROPAGEY()));
+    # pc++;
+    # break;
+    #
+    # case 0xae:
+    # ASSIGNSETFLAGS(x, MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xbe:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # ASSIGNSETFLAGS(x, MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+
+    # LDX instructions
+    @opcode(0xa2)
+    def op_ldx_imm(self):  # $A2/162 LDX #n
+        self.x = self.nz = self.immediate()
+        self.pc += 1
+        return 1
+
+    @opcode(0xa6)
+    def op_ldx_zp(self):  # $A6/166 LDX zp
+        self.x = self.nz = self.get_mem(self.zeropage())
+        self.pc += 1
+        return 1
+
+    @opcode(0xb6)
+    def op_ldx_zpy(self):  # $B6/182 LDX zp,Y
+        self.x = self.nz = self.get_mem(self.zeropage_y())
+        self.pc += 1
+        return 1
+
+    @opcode(0xae)
+    def op_ldx_abs(self):  # $AE/174 LDX abs
+        self.x = self.nz = self.get_mem(self.absolute())
+        self.pc += 2
+        return 1
+
+    @opcode(0xbe)
+    def op_ldx_absy(self):  # $BE/190 LDX abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.x = self.nz = self.get_mem(self.absolute_y())
+        self.pc += 2
+        return 1
+
+    # case 0xa0:
+    # ASSIGNSETFLAGS(y, IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xa4:
+    # ASSIGNSETFLAGS(y, MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xb4:
+    # ASSIGNSETFLAGS(y, MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0xac:
+    # ASSIGNSETFLAGS(y, MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xbc:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # ASSIGNSETFLAGS(y, MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+
+    # LDY instructions
+    @opcode(0xa0)
+    def op_ldy_imm(self):  # $A0/160 LDY #n
+        self.y = self.nz = self.immediate()
+        self.pc += 1
+        return 1
+
+    @opcode(0xa4)
+    def op_ldy_zp(self):  # $A4/164 LDY zp
+        self.y = self.nz = self.get_mem(self.zeropage())
+        self.pc += 1
+        return 1
+
+    @opcode(0xb4)
+    def op_ldy_zpx(self):  # $B4/180 LDY zp,X
+        self.y = self.nz = self.get_mem(self.zeropage_x())
+        self.pc += 1
+        return 1
+
+    @opcode(0xac)
+    def op_ldy_abs(self):  # $AC/172 LDY abs
+        self.y = self.nz = self.get_mem(self.absolute())
+        self.pc += 2
+        return 1
+
+    @opcode(0xbc)
+    def op_ldy_absx(self):  # $BC/188 LDY abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.y = self.nz = self.get_mem(self.absolute_x())
+        self.pc += 2
+        return 1
+
+    # case 0x4a:
+    # LSR(a);
+    # break;
+    #
+    # case 0x46:
+    # LSR(MEM(ZEROPAGE()));
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0x56:
+    # LSR(MEM(ZEROPAGEX()));
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0x4e:
+    # LSR(MEM(ABSOLUTE()));
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+    #
+    # case 0x5e:
+    # LSR(MEM(ABSOLUTEX()));
+    # WRITE(ABSOLUTEX());
+    # pc += 2;
+    # break;
+
+    # LSR instructions
+    @opcode(0x4a)
+    def op_lsr_acc(self):  # $4A/74 LSR A
+        self.a = self.LSR(self.a)
+        return 1
+
+    @opcode(0x46)
+    def op_lsr_zp(self):  # $46/70 LSR zp
+        adr = self.zeropage()
+        self.set_mem(adr, self.LSR(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x56)
+    def op_lsr_zpx(self):  # $56/86 LSR zp,X
+        adr = self.zeropage_x()
+        self.set_mem(adr, self.LSR(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x4e)
+    def op_lsr_abs(self):  # $4E/78 LSR abs
+        adr = self.absolute()
+        self.set_mem(adr, self.LSR(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    @opcode(0x5e)
+    def op_lsr_absx(self):  # $5E/94 LSR abs,X
+        adr = self.absolute_x()
+        self.set_mem(adr, self.LSR(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    # case 0xea:
+    # break;
+
+    # NOP instruction
+    @opcode(0xea)
+    def op_nop(self):  # $EA/234 NOP
+        return 1
+
+    # case 0x09:
+    # ORA(IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0x05:
+    # ORA(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0x15:
+    # ORA(MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0x0d:
+    # ORA(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x1d:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # ORA(MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x19:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # ORA(MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0x01:
+    # ORA(MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0x11:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # ORA(MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # ORA instructions
+    @opcode(0x09)
+    def op_ora_imm(self):  # $09/9 ORA #n
+        self.ORA(self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0x05)
+    def op_ora_zp(self):  # $05/5 ORA zp
+        self.ORA(self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x15)
+    def op_ora_zpx(self):  # $15/21 ORA zp,X
+        self.ORA(self.get_mem(self.zeropage_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x0d)
+    def op_ora_abs(self):  # $0D/13 ORA abs
+        self.ORA(self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x1d)
+    def op_ora_absx(self):  # $1D/29 ORA abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.ORA(self.get_mem(self.absolute_x()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x19)
+    def op_ora_absy(self):  # $19/25 ORA abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.ORA(self.get_mem(self.absolute_y()))
+        self.pc += 2
+        return 1
+
+    @opcode(0x01)
+    def op_ora_indx(self):  # $01/1 ORA (zp,X)
+        self.ORA(self.get_mem(self.indirect_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0x11)
+    def op_ora_indy(self):  # $11/17 ORA (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.ORA(self.get_mem(self.indirect_y()))
+        self.pc += 1
+        return 1
+
+    # case 0x48:
+    # PUSH(a);
+    # break;
+
+    # PHA instruction
+    @opcode(0x48)
+    def op_pha(self):  # $48/72 PHA
+        self.push(self.a)
+        return 1
+
+    # case == 0x08:
+    # PUSH(flags);
+    # break;
+
+    # PHP instruction
+    @opcode(0x08)
+    def op_php(self):  # $08/8 PHP
+        # add in the B flag: https://github.com/eteran/pretendo/blob/master/doc/cpu/6502.txt
+        self.push(self.flags | FB)
+        return 1
+
+    # case 0x68:
+    # ASSIGNSETFLAGS(a, POP());
+    # break;
+
+    # PLA instruction
+    @opcode(0x68)
+    def op_pla(self):  # $68/104 PLA
+        self.a = self.nz = self.pop()
+        return 1
+
+    # case 0x28:
+    # flags = POP();
+    # break;
+
+    # PLP instruction
+    @opcode(0x28)
+    def op_plp(self):  # $28/40 PLP
+        self.flags = self.pop()
+
+        # https://en.wikipedia.org/wiki/MOS_Technology_6502
+        # The "Break" flag of the processor is very different from the other
+        # flag bits. It has no flag setting, resetting, or testing instructions
+        # of its own, and is not affected by the PHP and PLP instructions. It
+        # exists only on the stack, where BRK and PHP always write a 1, while
+        # IRQ and NMI always write a 0.
+        self.p &= (~FB & 0xff)  # not done in siddump.c
+
+        # (the flags setter keeps U set, needed for Wolfgang Lorenz tests)
+        return 1
+
+    # case 0x2a:
+    # ROL(a);
+    # break;
+    #
+    # case 0x26:
+    # ROL(MEM(ZEROPAGE()));
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0x36:
+    # ROL(MEM(ZEROPAGEX()));
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0x2e:
+    # ROL(MEM(ABSOLUTE()));
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+    #
+    # case 0x3e:
+    # ROL(MEM(ABSOLUTEX()));
+    # WRITE(ABSOLUTEX());
+    # pc += 2;
+    # break;
+
+    # ROL instructions
+    @opcode(0x2a)
+    def op_rol_acc(self):  # $2A/42 ROL A
+        self.a = self.ROL(self.a)
+        return 1
+
+    @opcode(0x26)
+    def op_rol_zp(self):  # $26/38 ROL zp
+        adr = self.zeropage()
+        self.set_mem(adr, self.ROL(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x36)
+    def op_rol_zpx(self):  # $36/54 ROL zp,X
+        adr = self.zeropage_x()
+        self.set_mem(adr, self.ROL(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x2e)
+    def op_rol_abs(self):  # $2E/46 ROL abs
+        adr = self.absolute()
+        self.set_mem(adr, self.ROL(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    @opcode(0x3e)
+    def op_rol_absx(self):  # $3E/62 ROL abs,X
+        adr = self.absolute_x()
+        self.set_mem(adr, self.ROL(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    # case 0x6a:
+    # ROR(a);
+    # break;
+    #
+    # case 0x66:
+    # ROR(MEM(ZEROPAGE()));
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0x76:
+    # ROR(MEM(ZEROPAGEX()));
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0x6e:
+    # ROR(MEM(ABSOLUTE()));
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+    #
+    # case 0x7e:
+    # ROR(MEM(ABSOLUTEX()));
+    # WRITE(ABSOLUTEX());
+    # pc += 2;
+    # break;
+
+    # ROR instructions
+    @opcode(0x6a)
+    def op_ror_acc(self):  # $6A/106 ROR A
+        self.a = self.ROR(self.a)
+        return 1
+
+    @opcode(0x66)
+    def op_ror_zp(self):  # $66/102 ROR zp
+        adr = self.zeropage()
+        self.set_mem(adr, self.ROR(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x76)
+    def op_ror_zpx(self):  # $76/118 ROR zp,X
+        adr = self.zeropage_x()
+        self.set_mem(adr, self.ROR(self.get_mem(adr)))
+        self.pc += 1
+        return 1
+
+    @opcode(0x6e)
+    def op_ror_abs(self):  # $6E/110 ROR abs
+        adr = self.absolute()
+        self.set_mem(adr, self.ROR(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    @opcode(0x7e)
+    def op_ror_absx(self):  # $7E/126 ROR abs,X
+        adr = self.absolute_x()
+        self.set_mem(adr, self.ROR(self.get_mem(adr)))
+        self.pc += 2
+        return 1
+
+    # case 0x40:
+    # if (sp == 0xff) return 0;
+    # flags = POP();
+    # pc = POP();
+    # pc |= POP() << 8;
+    # break;
+
+    # RTI instruction
+    @opcode(0x40)
+    def op_rti(self):  # $40/64 RTI
+        if (self.exit_on_empty_stack
+                and (self.sp >= 0xfd or 0x00 <= self.sp <= STACK_WRAP_AREA)):
+            # If there's not enough stack left for the return or
+            # if the stack has already wrapped, then exit.
             return 0
+        self.flags = self.pop()  # TODO: clear B flag like we did with PLP?  (setter keeps U set)
+        # Note that unlike RTS, the return address on the stack is the actual address
+        self.pc = self.pop()
+        self.pc |= (self.pop() << 8)
+        return 1
+
+    # case 0x60:
+    # if (sp == 0xff) return 0;
+    # pc = POP();
+    # pc |= POP() << 8;
+    # pc++;
+    # break;
+
+    # RTS instruction
+    @opcode(0x60)
+    def op_rts(self):  # $60/96 RTS
+        if (self.exit_on_empty_stack
+                and (self.sp >= 0xfe or 0x00 <= self.sp <= STACK_WRAP_AREA)):
+            # If there's not enough stack left for the return or
+            # if the stack has already wrapped, then exit.
+            return 0
+        self.pc = self.pop()
+        self.pc |= (self.pop() << 8)
+        self.pc += 1
+        return 1
+
+    # case 0xe9:
+    # SBC(IMMEDIATE());
+    # pc++;
+    # break;
+    #
+    # case 0xe5:
+    # SBC(MEM(ZEROPAGE()));
+    # pc++;
+    # break;
+    #
+    # case 0xf5:
+    # SBC(MEM(ZEROPAGEX()));
+    # pc++;
+    # break;
+    #
+    # case 0xed:
+    # SBC(MEM(ABSOLUTE()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xfd:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # SBC(MEM(ABSOLUTEX()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xf9:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEY();
+    # SBC(MEM(ABSOLUTEY()));
+    # pc += 2;
+    # break;
+    #
+    # case 0xe1:
+    # SBC(MEM(INDIRECTX()));
+    # pc++;
+    # break;
+    #
+    # case 0xf1:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # SBC(MEM(INDIRECTY()));
+    # pc++;
+    # break;
+
+    # SBC instructions
+    # $E9 or (equivalent pseudo op) $EB will work here, see:
+    #    https://wiki.nesdev.com/w/index.php/Programming_with_unofficial_opcodes#Duplicated_instructions
+    @opcode(0xe9, 0xeb)
+    def op_sbc_imm(self):  # $E9/233 (or $EB/235) SBC #n
+        self.SBC(self.immediate())
+        self.pc += 1
+        return 1
+
+    @opcode(0xe5)
+    def op_sbc_zp(self):  # $E5/229 SBC zp
+        self.SBC(self.get_mem(self.zeropage()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xf5)
+    def op_sbc_zpx(self):  # $F5/245 SBC zp,X
+        self.SBC(self.get_mem(self.zeropage_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xed)
+    def op_sbc_abs(self):  # $ED/237 SBC abs
+        self.SBC(self.get_mem(self.absolute()))
+        self.pc += 2
+        return 1
+
+    @opcode(0xfd)
+    def op_sbc_absx(self):  # $FD/253 SBC abs,X
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.SBC(self.get_mem(self.absolute_x()))
+        self.pc += 2
+        return 1
+
+    @opcode(0xf9)
+    def op_sbc_absy(self):  # $F9/249 SBC abs,Y
+        self.cpucycles += self.eval_page_crossing_absolute_y()
+        self.SBC(self.get_mem(self.absolute_y()))
+        self.pc += 2
+        return 1
+
+    @opcode(0xe1)
+    def op_sbc_indx(self):  # $E1/225 SBC (zp,X)
+        self.SBC(self.get_mem(self.indirect_x()))
+        self.pc += 1
+        return 1
+
+    @opcode(0xf1)
+    def op_sbc_indy(self):  # $F1/241 SBC (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.SBC(self.get_mem(self.indirect_y()))
+        self.pc += 1
+        return 1
+
+    # case 0x38:
+    # flags |= FC;
+    # break;
+
+    # SEC instruction
+    @opcode(0x38)
+    def op_sec(self):  # $38/56 SEC
+        self.p |= FC
+        return 1
+
+    # case 0xf8:
+    # flags |= FD;
+    # break;
+
+    # SED instruction
+    @opcode(0xf8)
+    def op_sed(self):  # $F8/248 SED
+        self.p |= FD
+        return 1
+
+    # case 0x78:
+    # flags |= FI;
+    # break;
+
+    # SEI instruction
+    @opcode(0x78)
+    def op_sei(self):  # $78/120 SEI
+        self.p |= FI
+        return 1
+
+    # case 0x85:
+    # MEM(ZEROPAGE()) = a;
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0x95:
+    # MEM(ZEROPAGEX()) = a;
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0x8d:
+    # MEM(ABSOLUTE()) = a;
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+    #
+    # case 0x9d:
+    # MEM(ABSOLUTEX()) = a;
+    # WRITE(ABSOLUTEX());
+    # pc += 2;
+    # break;
+    #
+    # case 0x99:
+    # MEM(ABSOLUTEY()) = a;
+    # WRITE(ABSOLUTEY());
+    # pc += 2;
+    # break;
+    #
+    # case 0x81:
+    # MEM(INDIRECTX()) = a;
+    # WRITE(INDIRECTX());
+    # pc++;
+    # break;
+    #
+    # case 0x91:
+    # MEM(INDIRECTY()) = a;
+    # WRITE(INDIRECTY());
+    # pc++;
+    # break;
+
+    # STA instructions
+    # Note: STA/X/Y doesn't affect flags
+    @opcode(0x85)
+    def op_sta_zp(self):  # $85/133 STA zp
+        self.set_mem(self.zeropage(), self.a)
+        self.pc += 1
+        return 1
+
+    @opcode(0x95)
+    def op_sta_zpx(self):  # $95/149 STA zp,X
+        self.set_mem(self.zeropage_x(), self.a)
+        self.pc += 1
+        return 1
+
+    @opcode(0x8d)
+    def op_sta_abs(self):  # $8D/141 STA abs
+        self.set_mem(self.absolute(), self.a)
+        self.pc += 2
+        return 1
+
+    @opcode(0x9d)
+    def op_sta_absx(self):  # $9D/157 STA abs,X
+        self.set_mem(self.absolute_x(), self.a)
+        self.pc += 2
+        return 1
+
+    @opcode(0x99)
+    def op_sta_absy(self):  # $99/153 STA abs,Y
+        self.set_mem(self.absolute_y(), self.a)
+        self.pc += 2
+        return 1
+
+    @opcode(0x81)
+    def op_sta_indx(self):  # $81/129 STA (zp,X)
+        self.set_mem(self.indirect_x(), self.a)
+        self.pc += 1
+        return 1
+
+    @opcode(0x91)
+    def op_sta_indy(self):  # $91/145 STA (zp),Y
+        self.set_mem(self.indirect_y(), self.a)
+        self.pc += 1
+        return 1
+
+    # case 0x86:
+    # MEM(ZEROPAGE()) = x;
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0x96:
+    # MEM(ZEROPAGEY()) = x;
+    # WRITE(ZEROPAGEY());
+    # pc++;
+    # break;
+    #
+    # case 0x8e:
+    # MEM(ABSOLUTE()) = x;
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+
+    # STX instructions
+    @opcode(0x86)
+    def op_stx_zp(self):  # $86/134 STX zp
+        self.set_mem(self.zeropage(), self.x)
+        self.pc += 1
+        return 1
+
+    @opcode(0x96)
+    def op_stx_zpy(self):  # $96/150 STX zp,Y
+        self.set_mem(self.zeropage_y(), self.x)
+        self.pc += 1
+        return 1
+
+    @opcode(0x8e)
+    def op_stx_abs(self):  # $8E/142 STX abs
+        self.set_mem(self.absolute(), self.x)
+        self.pc += 2
+        return 1
+
+    # case 0x84:
+    # MEM(ZEROPAGE()) = y;
+    # WRITE(ZEROPAGE());
+    # pc++;
+    # break;
+    #
+    # case 0x94:
+    # MEM(ZEROPAGEX()) = y;
+    # WRITE(ZEROPAGEX());
+    # pc++;
+    # break;
+    #
+    # case 0x8c:
+    # MEM(ABSOLUTE()) = y;
+    # WRITE(ABSOLUTE());
+    # pc += 2;
+    # break;
+
+    # STY instructions
+    @opcode(0x84)
+    def op_sty_zp(self):  # $84/132 STY zp
+        self.set_mem(self.zeropage(), self.y)
+        self.pc += 1
+        return 1
+
+    @opcode(0x94)
+    def op_sty_zpx(self):  # $94/148 STY zp,X
+        self.set_mem(self.zeropage_x(), self.y)
+        self.pc += 1
+        return 1
+
+    @opcode(0x8c)
+    def op_sty_abs(self):  # $8C/140 STY abs
+        self.set_mem(self.absolute(), self.y)
+        self.pc += 2
+        return 1
+
+    # case 0xaa:
+    # ASSIGNSETFLAGS(x, a);
+    # break;
+
+    # TAX instruction
+    @opcode(0xaa)
+    def op_tax(self):  # $AA/170 TAX
+        self.x = self.nz = self.a
+        return 1
+
+    # case 0xba:
+    # ASSIGNSETFLAGS(x, sp);
+    # break;
+
+    # TSX instruction
+    @opcode(0xba)
+    def op_tsx(self):  # $BA/186 TSX
+        self.x = self.nz = self.sp
+        return 1
+
+    # case 0x8a:
+    # ASSIGNSETFLAGS(a, x);
+    # break;
+
+    # TXA instruction
+    @opcode(0x8a)
+    def op_txa(self):  # $8A/138 TXA
+        self.a = self.nz = self.x
+        return 1
+
+    # case 0x9a:
+    # ASSIGNSETFLAGS(sp, x);
+    # break;
+
+    # TXS instruction
+    @opcode(0x9a)
+    def op_txs(self):  # $9A/154 TXS
+        # Bug in siddump.c < v1.08, TXS does NOT set flags
+        self.sp = self.x
+        return 1
+
+    # case 0x98:
+    # ASSIGNSETFLAGS(a, y);
+    # break;
+
+    # TYA instruction
+    @opcode(0x98)
+    def op_tya(self):  # $98/152 TYA
+        self.a = self.nz = self.y
+        return 1
+
+    # case 0xa8:
+    # ASSIGNSETFLAGS(y, a);
+    # break;
+
+    # TAY instruction
+    @opcode(0xa8)
+    def op_tay(self):  # $A8/168 TAY
+        self.y = self.nz = self.a
+        return 1
+
+    # case 0x00:
+    # return 0;
+
+    # BRK instruction
+    # http://www.6502.org/tutorials/register_preservation.html
+    # https://wiki.nesdev.com/w/index.php/Status_flags
+    # Articles say there is no B flag in the processor status register,
+    # the bit is unused.  PHP and BRK pushes the P register onto the stack with break
+    # bit set, and IRQ/NMI pushes P register with break bit clear.  The "actual" B flag
+    # doesn't exist.  I did a BRK in VICE, and sure enough, the B flag wasn't set.
+
+    @opcode(0x00)
+    def op_brk(self):  # $00/0 BRK
+        # This is unnecessary to implement from a SID playback perspective
+        # so siddump.c ignored it
+        self.pc += 1  # BRK is a 2-byte opcode (2nd byte is padding)
+        self.pc &= 0xffff
+        self.push((self.pc) >> 8)
+        self.push((self.pc) & 0xff)
+        self.push(self.flags | FB)
+        self.p |= FI
+        self.pc = self.get_le_word(IRQ)
+        return 0
 
-        # case 0xa7:
-        # ASSIGNSETFLAGS(a, MEM(ZEROPAGE()));
-        # x = a;
-        # pc++;
-        # break;
-        #
-        # case 0xb7:
-        # ASSIGNSETFLAGS(a, MEM(ZEROPAGEY()));
-        # x = a;
-        # pc++;
-        # break;
-        #
-        # case 0xaf:
-        # ASSIGNSETFLAGS(a, MEM(ABSOLUTE()));
-        # x = a;
-        # pc += 2;
-        # break;
-        #
-        # case 0xa3:
-        # ASSIGNSETFLAGS(a, MEM(INDIRECTX()));
-        # x = a;
-        # pc++;
-        # break;
-        #
-        # case 0xb3:
-        # cpucycles += EVALPAGECROSSING_INDIRECTY();
-        # ASSIGNSETFLAGS(a, MEM(INDIRECTY()));
-        # x = a;
-        # pc++;
-        # break;
-
-        # "LAX" pseudo-ops
-        if instruction == 0xa7:  # $A7/167 LDA-LDX zp
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.zeropage()))
-            self.x = self.a
-            self.pc += 1
-            return 1
-
-        if instruction == 0xb7:  # $B7/183 LDA-LDX zp,Y
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.zeropage_y()))
-            self.x = self.a
-            self.pc += 1
-            return 1
-
-        if instruction == 0xaf:  # $AF/175 LDA-LDX abs
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.absolute()))
-            self.x = self.a
-            self.pc += 2
-            return 1
-
-        if instruction == 0xa3:  # $A3/163 LDA-LDX (zp,X)
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.indirect_x()))
-            self.x = self.a
-            self.pc += 1
-            return 1
-
-        if instruction == 0xb3:  # $B3/179 LDA-LDX (zp),Y
-            self.cpucycles += self.eval_page_crossing_indirect_y()
-            self.assign_then_set_flags(A_OPREF, OperandRef(LOC_VAL, self.indirect_y()))
-            self.x = self.a
-            self.pc += 1
-            return 1
-
-        # case 0x1a:
-        # case 0x3a:
-        # case 0x5a:
-        # case 0x7a:
-        # case 0xda:
-        # case 0xfa:
-        # break;
-        #
-        # case 0x80:
-        # case 0x82:
-        # case 0x89:
-        # case 0xc2:
-        # case 0xe2:
-        # case 0x04:
-        # case 0x44:
-        # case 0x64:
-        # case 0x14:
-        # case 0x34:
-        # case 0x54:
-        # case 0x74:
-        # case 0xd4:
-        # case 0xf4:
-        # pc++;
-        # break;
-        #
-        # case 0x0c:
-        # case 0x1c:
-        # case 0x3c:
-        # case 0x5c:
-        # case 0x7c:
-        # case 0xdc:
-        # case 0xfc:
-        # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
-        # pc += 2;
-        # break;
-
-        # NOP pseudo-ops:
-
-        # NOP size 1, 2 cycle
-        # $1A/26 NOP
-        # $3A/58 NOP
-        # $5A/90 NOP
-        # $7A/122 NOP
-        # $DA/218 NOP
-        # $FA/250 NOP
-        if instruction in (0x1a, 0x3a, 0x5a, 0x7a, 0xda, 0xfa):
-            return 1
-
-        # NOP (aka SKB) of size 2
-        # $80/128 NOP zp
-        # $82/130 NOP (or HALT?)
-        # $89/137 NOP zp
-        # $C2/194 NOP (or HALT?)
-        # $E2/226 NOP (or HALT?)
-        if (instruction in (0x80, 0x82, 0x89, 0xc2, 0xe2)  # 2 cycle
-                # $04/4 NOP zp
-                # $44/68 NOP zp
-                # $64/100 NOP zp
-                or instruction in (0x04, 0x44, 0x64)  # 3 cycle
-                # $14/20 NOP zp
-                # $34/52 NOP zp
-                # $54/84 NOP zp
-                # $74/116 NOP zp
-                # $D4/212 NOP zp
-                # $F4/244 NOP zp
-                or instruction in (0x14, 0x34, 0x54, 0x74, 0xd4, 0xf4)):  # 4 cycle
-            self.pc += 1
-            return 1
-
-        # NOP (aka SKB (skip next byte), does a read that's not stored) size 3, 4(+1) cycle
-        # 0x0c is abolute address, so won't trigger page cross cycle
-        # the others are absolute indexed x
-        # $0C/12 NOP abs
-        # $1C/28 NOP abs,X
-        # $3C/60 NOP abs,X
-        # $5C/92 NOP abs,X
-        # $7C/124 NOP abs,X
-        # $DC/220 NOP abs,X
-        # $FC/252 NOP abs,X
-        if instruction in (0x0c, 0x1c, 0x3c, 0x5c, 0x7c, 0xdc, 0xfc):
-            self.cpucycles += self.eval_page_crossing_absolute_x()
-            self.pc += 2
-            return 1
-
-        # case 0x02:
-        # printf("Error: CPU halt at %04X\n", pc-1);
-        # exit(1);
-        # break;
-
-        # HALT (aka JAM) pseudo-ops
-        # $02/2 HALT
-        # $12/18 HALT
-        # $22/34 HALT
-        # $32/50 HALT
-        # $42/66 HALT
-        # $52/82 HALT
-        # $62/98 HALT
-        # $72/114 HALT
-        # $92/146 HALT
-        # $B2/178 HALT
-        # $D2/210 HALT
-        # $F2/242 HALT
-        if instruction in (0x02, 0x12, 0x22, 0x32, 0x42, 0x52, 0x62, 0x72, 0x92,
-                           0xb2, 0xd2, 0xf2):
-            raise ChiptuneSAKValueError("Error: CPU halt on ${:02X} at ${:04X}\n".format(instruction, self.pc - 1))
-
-        # Pseudo-ops probably not needed for SID content extraction
-        # $03/3 ASL-ORA (zp,X)
-        # $07/7 ASL-ORA zp
-        # $0B/11 AND #n/MOV b7->Cy
-        # $0F/15 ASL-ORA abs
-        # $13/19 ASL-ORA (zp),Y
-        # $17/23 ASL-ORA abs,X
-        # $1B/27 ASL-ORA abs,Y
-        # $1F/31 ASL-ORA abs,X
-        # $23/35 ROL-AND (zp,X)
-        # $27/39 ROL-AND zp
-        # $2B/43 AND #n-MOV b7->Cy
-        # $2F/47 ROL-AND abs
-        # $33/51 ROL-AND (zp),Y
-        # $37/55 ROL-AND zp,X
-        # $3B/59 ROL-AND abs,Y
-        # $3F/63 ROL-AND abs,X
-        # $43/67 LSR-EOR (zp,X)
-        # $47/71 LSR-EOR zp
-        # $4B/75 AND #n-LSR A
-        # $4F/79 LSR-EOR abs
-        # $53/83 LSR-EOR (zp),Y
-        # $57/87 LSR-EOR abs,X
-        # $5B/91 LSR-EOR abs,Y
-        # $5F/95 LSR-EOR abs,X
-        # $63/99 ROR-ADC (zp,X)
-        # $67/103 ROR-ADC zp
-        # $6B/107 AND #n-ROR A
-        # $6F/111 ROR-ADC abs
-        # $73/115 ROR-ADC (zp),Y
-        # $77/119 ROR-ADC abs,X
-        # $7B/123 ROR-ADC abs,Y
-        # $7F/127 ROR-ADC abs,X
-        # $83/131 STA-STX (zp,X)
-        # $87/135 STA-STX zp
-        # $8B/139 TXA-AND #n
-        # $8F/143 STA-STX abs
-        # $93/147 STA-STX (zp),Y
-        # $97/151 STA-STX zp,Y
-        # $9B/155 STA-STX abs,Y
-        # $9C/156 STA-STX abs,X
-        # $9E/158 STA-STX abs,X
-        # $9F/159 STA-STX abs,X
-        # $AB/171 LDA-LDX
-        # $BB/187 LDA-LDX abs,Y
-        # $BF/191 LDA-LDX abs,Y
-        # $C3/195 DEC-CMP (zp,X)
-        # $C7/199 DEC-CMP zp
-        # $CB/203 SBX #n
-        # $CF/207 DEC-CMP abs
-        # $D3/211 DEC-CMP (zp),Y
-        # $D7/215 DEC-CMP zp,X
-        # $DB/219 DEC-CMP abs,Y
-        # $DF/223 DEC-CMP abs,X
-        # $E3/227 INC-SBC (zp,X)
-        # $E7/231 INC-SBC zp
-        # $EF/239 INC-SBC abs
-        # $F3/243 INC-SBC (zp),Y
-        # $F7/247 INC-SBC zp,X
-        # $FB/251 INC-SBC abs,Y
-        # $FF/255 INC-SBC abs,X
-
-        raise ChiptuneSAKNotImplemented("Error: unknown/unimplemented opcode %s at %s" % (hex(instruction), hex(self.pc - 1)))
+    # case 0xa7:
+    # ASSIGNSETFLAGS(a, MEM(ZEROPAGE()));
+    # x = a;
+    # pc++;
+    # break;
+    #
+    # case 0xb7:
+    # ASSIGNSETFLAGS(a, MEM(ZEROPAGEY()));
+    # x = a;
+    # pc++;
+    # break;
+    #
+    # case 0xaf:
+    # ASSIGNSETFLAGS(a, MEM(ABSOLUTE()));
+    # x = a;
+    # pc += 2;
+    # break;
+    #
+    # case 0xa3:
+    # ASSIGNSETFLAGS(a, MEM(INDIRECTX()));
+    # x = a;
+    # pc++;
+    # break;
+    #
+    # case 0xb3:
+    # cpucycles += EVALPAGECROSSING_INDIRECTY();
+    # ASSIGNSETFLAGS(a, MEM(INDIRECTY()));
+    # x = a;
+    # pc++;
+    # break;
+
+    # "LAX" pseudo-ops
+    @opcode(0xa7)
+    def op_lax_zp(self):  # $A7/167 LDA-LDX zp
+        self.a = self.nz = self.get_mem(self.zeropage())
+        self.x = self.a
+        self.pc += 1
+        return 1
+
+    @opcode(0xb7)
+    def op_lax_zpy(self):  # $B7/183 LDA-LDX zp,Y
+        self.a = self.nz = self.get_mem(self.zeropage_y())
+        self.x = self.a
+        self.pc += 1
+        return 1
+
+    @opcode(0xaf)
+    def op_lax_abs(self):  # $AF/175 LDA-LDX abs
+        self.a = self.nz = self.get_mem(self.absolute())
+        self.x = self.a
+        self.pc += 2
+        return 1
+
+    @opcode(0xa3)
+    def op_lax_indx(self):  # $A3/163 LDA-LDX (zp,X)
+        self.a = self.nz = self.get_mem(self.indirect_x())
+        self.x = self.a
+        self.pc += 1
+        return 1
+
+    @opcode(0xb3)
+    def op_lax_indy(self):  # $B3/179 LDA-LDX (zp),Y
+        self.cpucycles += self.eval_page_crossing_indirect_y()
+        self.a = self.nz = self.get_mem(self.indirect_y())
+        self.x = self.a
+        self.pc += 1
+        return 1
+
+    # case 0x1a:
+    # case 0x3a:
+    # case 0x5a:
+    # case 0x7a:
+    # case 0xda:
+    # case 0xfa:
+    # break;
+    #
+    # case 0x80:
+    # case 0x82:
+    # case 0x89:
+    # case 0xc2:
+    # case 0xe2:
+    # case 0x04:
+    # case 0x44:
+    # case 0x64:
+    # case 0x14:
+    # case 0x34:
+    # case 0x54:
+    # case 0x74:
+    # case 0xd4:
+    # case 0xf4:
+    # pc++;
+    # break;
+    #
+    # case 0x0c:
+    # case 0x1c:
+    # case 0x3c:
+    # case 0x5c:
+    # case 0x7c:
+    # case 0xdc:
+    # case 0xfc:
+    # cpucycles += EVALPAGECROSSING_ABSOLUTEX();
+    # pc += 2;
+    # break;
+
+    # NOP pseudo-ops:
+
+    # NOP size 1, 2 cycle
+    # $1A/26 NOP
+    # $3A/58 NOP
+    # $5A/90 NOP
+    # $7A/122 NOP
+    # $DA/218 NOP
+    # $FA/250 NOP
+    @opcode(0x1a, 0x3a, 0x5a, 0x7a, 0xda, 0xfa)
+    def op_nop_implied(self):
+        return 1
+
+    # NOP (aka SKB) of size 2
+    # $80/128 NOP zp
+    # $82/130 NOP (or HALT?)
+    # $89/137 NOP zp
+    # $C2/194 NOP (or HALT?)
+    # $E2/226 NOP (or HALT?)
+    # $04/4 NOP zp
+    # $44/68 NOP zp
+    # $64/100 NOP zp
+    # $14/20 NOP zp
+    # $34/52 NOP zp
+    # $54/84 NOP zp
+    # $74/116 NOP zp
+    # $D4/212 NOP zp
+    # $F4/244 NOP zp
+    @opcode(0x80, 0x82, 0x89, 0xc2, 0xe2,  # 2 cycle
+            0x04, 0x44, 0x64,  # 3 cycle
+            0x14, 0x34, 0x54, 0x74, 0xd4, 0xf4)  # 4 cycle
+    def op_nop_skip_byte(self):
+        self.pc += 1
+        return 1
+
+    # NOP (aka SKB (skip next byte), does a read that's not stored) size 3, 4(+1) cycle
+    # 0x0c is abolute address, so won't trigger page cross cycle
+    # the others are absolute indexed x
+    # $0C/12 NOP abs
+    # $1C/28 NOP abs,X
+    # $3C/60 NOP abs,X
+    # $5C/92 NOP abs,X
+    # $7C/124 NOP abs,X
+    # $DC/220 NOP abs,X
+    # $FC/252 NOP abs,X
+    @opcode(0x0c, 0x1c, 0x3c, 0x5c, 0x7c, 0xdc, 0xfc)
+    def op_nop_abs(self):
+        self.cpucycles += self.eval_page_crossing_absolute_x()
+        self.pc += 2
+        return 1
+
+    # case 0x02:
+    # printf("Error: CPU halt at %04X\n", pc-1);
+    # exit(1);
+    # break;
+
+    # HALT (aka JAM) pseudo-ops
+    # $02/2 HALT
+    # $12/18 HALT
+    # $22/34 HALT
+    # $32/50 HALT
+    # $42/66 HALT
+    # $52/82 HALT
+    # $62/98 HALT
+    # $72/114 HALT
+    # $92/146 HALT
+    # $B2/178 HALT
+    # $D2/210 HALT
+    # $F2/242 HALT
+    @opcode(0x02, 0x12, 0x22, 0x32, 0x42, 0x52, 0x62, 0x72, 0x92,
+            0xb2, 0xd2, 0xf2)
+    def op_halt(self):
+        raise ChiptuneSAKValueError("Error: CPU halt on ${:02X} at ${:04X}\n".format(self.last_instruction, self.pc - 1))
+
+    # Pseudo-ops probably not needed for SID content extraction
+    # $03/3 ASL-ORA (zp,X)
+    # $07/7 ASL-ORA zp
+    # $0B/11 AND #n/MOV b7->Cy
+    # $0F/15 ASL-ORA abs
+    # $13/19 ASL-ORA (zp),Y
+    # $17/23 ASL-ORA abs,X
+    # $1B/27 ASL-ORA abs,Y
+    # $1F/31 ASL-ORA abs,X
+    # $23/35 ROL-AND (zp,X)
+    # $27/39 ROL-AND zp
+    # $2B/43 AND #n-MOV b7->Cy
+    # $2F/47 ROL-AND abs
+    # $33/51 ROL-AND (zp),Y
+    # $37/55 ROL-AND zp,X
+    # $3B/59 ROL-AND abs,Y
+    # $3F/63 ROL-AND abs,X
+    # $43/67 LSR-EOR (zp,X)
+    # $47/71 LSR-EOR zp
+    # $4B/75 AND #n-LSR A
+    # $4F/79 LSR-EOR abs
+    # $53/83 LSR-EOR (zp),Y
+    # $57/87 LSR-EOR abs,X
+    # $5B/91 LSR-EOR abs,Y
+    # $5F/95 LSR-EOR abs,X
+    # $63/99 ROR-ADC (zp,X)
+    # $67/103 ROR-ADC zp
+    # $6B/107 AND #n-ROR A
+    # $6F/111 ROR-ADC abs
+    # $73/115 ROR-ADC (zp),Y
+    # $77/119 ROR-ADC abs,X
+    # $7B/123 ROR-ADC abs,Y
+    # $7F/127 ROR-ADC abs,X
+    # $83/131 STA-STX (zp,X)
+    # $87/135 STA-STX zp
+    # $8B/139 TXA-AND #n
+    # $8F/143 STA-STX abs
+    # $93/147 STA-STX (zp),Y
+    # $97/151 STA-STX zp,Y
+    # $9B/155 STA-STX abs,Y
+    # $9C/156 STA-STX abs,X
+    # $9E/158 STA-STX abs,X
+    # $9F/159 STA-STX abs,X
+    # $AB/171 LDA-LDX
+    # $BB/187 LDA-LDX abs,Y
+    # $BF/191 LDA-LDX abs,Y
+    # $C3/195 DEC-CMP (zp,X)
+    # $C7/199 DEC-CMP zp
+    # $CB/203 SBX #n
+    # $CF/207 DEC-CMP abs
+    # $D3/211 DEC-CMP (zp),Y
+    # $D7/215 DEC-CMP zp,X
+    # $DB/219 DEC-CMP abs,Y
+    # $DF/223 DEC-CMP abs,X
+    # $E3/227 INC-SBC (zp,X)
+    # $E7/231 INC-SBC zp
+    # $EF/239 INC-SBC abs
+    # $F3/243 INC-SBC (zp),Y
+    # $F7/247 INC-SBC zp,X
+    # $FB/251 INC-SBC abs,Y
+    # $FF/255 INC-SBC abs,X
+
+    def op_unimplemented(self):
+        raise ChiptuneSAKNotImplemented("Error: unknown/unimplemented opcode %s at %s" % (hex(self.last_instruction), hex(self.pc - 1)))
 
     def get_le_word(self, mem_loc):
         """
@@ -2563,10 +3216,56 @@ class Cpu6502Emulator:
         :param mem_loc: starting memory location
         :type mem_loc: int
         :param bytes: bytes to inject into RAM
-        :type bytes: bytes
+        :type bytes: bytes, bytearray, memoryview, or list of ints
+        """
+        end = mem_loc + len(bytes)
+        if not (0 <= mem_loc and end <= 0x10000):
+            raise ChiptuneSAKValueError("Error: injecting %d bytes at $%04X exceeds 64K" % (len(bytes), mem_loc))
+        self.memory[mem_loc:end] = bytes
+        if self.block_cache is not None:
+            self.block_cache.invalidate_range(mem_loc, end)
+
+    def snapshot(self):
         """
-        for i, a_byte in enumerate(bytes):
-            self.memory[mem_loc + i] = a_byte
+        Capture the machine state (registers, memory, and any state a subclass adds)
+
+        The snapshot can be pickled, e.g. to start worker processes from a shared state.
+
+        :return: the machine state
+        :rtype: MachineSnapshot
+        """
+        return MachineSnapshot(
+            {name: getattr(self, name) for name in self.snapshot_values},
+            {name: bytes(getattr(self, name)) for name in self.snapshot_buffers})
+
+    def restore(self, snapshot):
+        """
+        Restore machine state captured by snapshot()
+
+        Buffers are copied into place, not reallocated.  Any cached blocks are dropped.
+
+        :param snapshot: the machine state
+        :type snapshot: MachineSnapshot
+        """
+        for name, value in snapshot.values.items():
+            setattr(self, name, value)
+        for name, buffer in snapshot.buffers.items():
+            getattr(self, name)[:] = buffer
+        if self.block_cache is not None:
+            self.block_cache.clear()
+
+    def fork(self):
+        """
+        Create a new emulator of the same type with a copy of this one's machine state
+
+        Settings that aren't machine state (debug, callbacks, the block cache) are not copied.
+
+        :return: the new emulator
+        :rtype: Cpu6502Emulator
+        """
+        emulator = type(self)()
+        emulator.restore(self.snapshot())
+        return emulator
 
     def clear_memory_usage(self):
         """
@@ -2574,13 +3273,13 @@ class Cpu6502Emulator:
         Useful for removing the records of memory setup actions before a program starts
         running.
         """
-        self.mem_usage = 0x10000 * [0x00]
+        self.mem_usage[:] = ZEROED_64K
 
     def print_stack(self):
         """
         Utility for debugging:  Print the stack ($100 to $1FF)
         """
-        print(hexdump(self.memory[256:512], 256))
+        print(hexdump(memoryview(self.memory)[256:512], 256))
         print('current stack pointer ${:02x}'.format(self.sp))
 
     def print_memory_usage(self):
@@ -2607,73 +3306,6 @@ class Cpu6502Emulator:
                 a_set.add(loc)
 
 
-# The original C code used macros, which resulted in a crazy amount of polymorphism
-# Going to take the simple class approach to absorb some of that generality
-# OperandRef can be a reference to registers, byte vals (often immediates), and memory locations
-class OperandRef:
-    def __init__(self, type, val_or_loc=None):
-        assert type in (A_REG, X_REG, Y_REG, SP_REG, BYTE_VAL, LOC_VAL), \
-            "Error: invalid enum type when instantiating a new OperandRef"
-        if type in (A_REG, X_REG, Y_REG, SP_REG) and val_or_loc is not None:
-            raise ChiptuneSAKValueError("Error: value not needed for operand of type register")
-        if type in (BYTE_VAL, LOC_VAL) and val_or_loc is None:
-            raise ChiptuneSAKValueError("Error: value needed for operand")
-        if type == BYTE_VAL and not (0 <= val_or_loc <= 255):
-            raise ChiptuneSAKValueError("Error: byte value out of range")
-        if type == LOC_VAL and not (0 <= val_or_loc <= 65535):
-            raise ChiptuneSAKValueError("Error: memory location out of range")
-
-        self.type = type
-        self.val_or_loc = val_or_loc
-
-    # this sets the contents of the register or memory location to byte_val
-    def set_byte(self, byte_val, cpuInstance):
-        if self.type == A_REG:
-            cpuInstance.a = byte_val
-        elif self.type == X_REG:
-            cpuInstance.x = byte_val
-        elif self.type == Y_REG:
-            cpuInstance.y = byte_val
-        elif self.type == SP_REG:
-            cpuInstance.sp = byte_val
-        elif self.type == LOC_VAL:
-            cpuInstance.set_mem(self.val_or_loc, byte_val)
-        else:
-            raise ChiptuneSAKValueError("Error: unable to set OperandRef to a byte value")
-
-    # this returns the register value, the fixed value, or the memory location's
-    #    content value
-    def get_byte(self, cpuInstance):
-        if self.type == A_REG:
-            result = cpuInstance.a
-        elif self.type == X_REG:
-            result = cpuInstance.x
-        elif self.type == Y_REG:
-            result = cpuInstance.y
-        elif self.type == SP_REG:
-            result = cpuInstance.sp
-        elif self.type == LOC_VAL:
-            result = cpuInstance.get_mem(self.val_or_loc)
-        else:  # BYTE_VAL
-            result = self.val_or_loc
-        if not (0 <= result <= 255):
-            raise ChiptuneSAKValueError("Error: byte out of range")
-        return result
-
-
-# operand "enums" (set outside normal byte range to avoid inband errors)
-A_REG = 0x01 + 0xFF
-X_REG = 0x02 + 0xFF
-Y_REG = 0x03 + 0xFF
-SP_REG = 0x04 + 0xFF
-BYTE_VAL = 0x05 + 0xFF  # immediate values
-LOC_VAL = 0x06 + 0xFF  # memory location ($0 to $FFFF)
-
-A_OPREF = OperandRef(A_REG)
-X_OPREF = OperandRef(X_REG)
-Y_OPREF = OperandRef(Y_REG)
-SP_OPREF = OperandRef(SP_REG)
-
 # debugging main
 if __name__ == "__main__":
     print("Nothing to do")
@@ -3,7 +3,7 @@
 from chiptunesak.errors import ChiptuneSAKValueError
 import collections
 
-KeySignature = collections.namedtuple('Key', ['name', 'offset', 'type', 'sharps', 'flats'])
+KeySignature = collections.namedtuple('KeySignature', ['name', 'offset', 'type', 'sharps', 'flats'])
 
 KEYS = {
     'C':   KeySignature('C', 0,    'major', (), ()),
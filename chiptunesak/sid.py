@@ -32,15 +32,26 @@
 #   to add if the digi is, say, drums.
 
 import csv
+import hashlib
+import itertools
 import math
-from functools import reduce
+import os
+import pickle
+import zlib
+import numpy as np
+from array import array
+from functools import reduce, lru_cache
 import copy
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from typing import List
-from chiptunesak.constants import ARCH, DEFAULT_ARCH, CONCERT_A, freq_arch_to_freq, freq_arch_to_midi_num
+from chiptunesak.constants import ARCH, DEFAULT_ARCH, CONCERT_A, A4_MIDI_NUM
 from chiptunesak.byte_util import big_endian_int, little_endian_int
 from chiptunesak.base import ChiptuneSAKIO, pitch_to_note_name
 from chiptunesak import thin_c64_emulator
+from chiptunesak import emulator_6502
 from chiptunesak.errors import ChiptuneSAKValueError, ChiptuneSAKContentError
 from chiptunesak import rchirp
 
@@ -71,19 +82,26 @@ class SID(ChiptuneSAKIO):
             sid_in_filename=None,
             subtune=0,                       # subtune to extract (zero-indexed)
             vibrato_cents_margin=0,          # cents margin to control snapping to previous note
-            tuning=CONCERT_A,
-            seconds=60,                      # seconds to capture
+            tuning=CONCERT_A,                # or 'auto' (estimated from the capture)
+            seconds=60,                      # seconds to capture, or 'auto' (until the song loops or ends)
             arch=DEFAULT_ARCH,               # note: overwritten if/when SID headers get parsed
             gcf_row_reduce=True,             # reduce rows via GCF of row-activity gaps
             create_gate_off_notes=True,      # allow new note starts when gate is off
             assert_gate_on_new_note=True,    # True = gate on event in delta rows with new notes
             always_include_freq=False,       # False = freq in delta rows only with new note
+            block_cache=False,               # True = emulate through the basic-block cache
+            max_instructions=MAX_INSTR,      # per init/play call instruction budget
+            max_cycles=MAX_CYCLES,           # per init/play call cycle budget
+            profile=False,                   # True = profile execution into sid_dump.profile
+            auto_max_seconds=AUTO_MAX_SECONDS,  # cap on seconds='auto' captures
+            capture_cache=None,              # CaptureCache to reuse captures from
             verbose=True,                    # False = suppress stdout details
         )
 
         self.set_options(**self.options_with_defaults)
 
         self.sid_dump = None
+        self.importer = None  # SidImport that captured sid_dump, for deriving rows from its frames
 
     def set_options(self, **kwargs):
         """
@@ -116,9 +134,111 @@ class SID(ChiptuneSAKIO):
         :return: captured SID data as a Dump object
         :rtype: Dump
         """
-        importer = SidImport(self.get_option('arch'), self.get_option('tuning'))
+        self.importer = self.new_importer()
+        sid_dump = self.importer.import_sid(**self.import_kwargs())
+        self.sid_dump = sid_dump
+
+        return sid_dump
+
+    def capture_frames(self):
+        """
+        Like capture(), but only the compact register frames are kept (in sid_dump), and the
+        rows get derived from them each time they're converted (see iter_rows())
+
+        :return: captured SID data, without rows
+        :rtype: Dump
+        """
+        self.importer = self.new_importer()
+        self.sid_dump = self.importer.capture_frames(
+            self.get_option('sid_in_filename'), self.get_option('subtune'), self.get_option('seconds'),
+            self.get_option('verbose'))
+
+        return self.sid_dump
+
+    def iter_rows(self):
+        """
+        Iterate over sid_dump's rows, deriving them from its frames (with the current
+        options) if it has none, e.g. after capture_frames()
 
-        sid_dump = importer.import_sid(
+        :return: rows
+        :rtype: iterator of Row
+        """
+        sid_dump = self.sid_dump
+        if sid_dump.rows or not sid_dump.frames:
+            return iter(sid_dump.rows)
+
+        if self.importer is None:
+            self.importer = self.new_importer()
+        self.importer.arch = sid_dump.arch
+        return self.importer.derive_rows(
+            sid_dump, sid_dump.iter_frames(), self.get_option('vibrato_cents_margin'),
+            self.get_option('create_gate_off_notes'), self.get_option('assert_gate_on_new_note'),
+            self.get_option('always_include_freq'))
+
+    def stream(self):
+        """
+        Starts a capture whose rows are emulated as they're consumed (see SidImport.stream_sid())
+
+        Unlike capture(), the resulting Dump is not kept for later conversions.
+
+        :return: captured SID data (without rows), and an iterator of its rows
+        :rtype: (Dump, iterator of Row)
+        """
+        return self.new_importer().stream_sid(**self.import_kwargs())
+
+    def capture_subtunes(self, subtunes=None, processes=None, to_rchirp=False):
+        """
+        Captures several subtunes of the SID file (the sid_in_filename option), in parallel
+        worker processes
+
+        The SID file is loaded once, and each worker starts its captures from the resulting
+        machine image.  A subtune whose capture fails gets its exception in the results
+        instead of stopping the others.  Unlike capture(), the Dumps are not kept for later
+        conversions.
+
+        :param subtunes: subtunes to capture (zero-indexed), defaults to None (all of them)
+        :type subtunes: list of int, optional
+        :param processes: worker processes, defaults to None (one per CPU, up to the number
+                          of subtunes); 1 captures in this process
+        :type processes: int, optional
+        :param to_rchirp: if True, also convert each capture to an RChirpSong
+        :type to_rchirp: bool, optional
+        :return: one result per subtune, in the order given
+        :rtype: list of SubtuneCapture
+        """
+        loaded_sid = self.new_importer().load_sid(self.get_option('sid_in_filename'))
+        if subtunes is None:
+            subtunes = range(loaded_sid.sid_file.num_subtunes)
+        subtunes = list(subtunes)
+        if processes is None:
+            processes = max(1, min(len(subtunes), os.cpu_count() or 1))
+
+        if processes == 1:
+            worker = make_subtune_worker(self.get_options(), loaded_sid)
+            return [capture_subtune(subtune, to_rchirp, worker) for subtune in subtunes]
+
+        with ProcessPoolExecutor(processes, initializer=init_subtune_worker,
+                                 initargs=(self.get_options(), loaded_sid)) as executor:
+            futures = [executor.submit(capture_subtune, subtune, to_rchirp) for subtune in subtunes]
+            results = []
+            for subtune, future in zip(subtunes, futures):
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool as error:  # a worker died (e.g., killed) mid-capture
+                    results.append(SubtuneCapture(subtune, None, None, error))
+        return results
+
+    def new_importer(self):
+        return SidImport(self.get_option('arch'), self.get_option('tuning'),
+                         block_cache=self.get_option('block_cache'),
+                         max_instructions=self.get_option('max_instructions'),
+                         max_cycles=self.get_option('max_cycles'),
+                         profile=self.get_option('profile'),
+                         auto_max_seconds=self.get_option('auto_max_seconds'),
+                         capture_cache=self.get_option('capture_cache'))
+
+    def import_kwargs(self):
+        return dict(
             filename=self.get_option('sid_in_filename'),  # SID file to read in
             subtune=self.get_option('subtune'),
             vibrato_cents_margin=self.get_option('vibrato_cents_margin'),
@@ -128,15 +248,15 @@ class SID(ChiptuneSAKIO):
             seconds=self.get_option('seconds'),
             verbose=self.get_option('verbose')
         )
-        self.sid_dump = sid_dump
-
-        return sid_dump
 
     # def to_rchirp(self, sid_in_filename, /, **kwargs):  # 3.8...
     def to_rchirp(self, sid_in_filename, **kwargs):
         """
         Converts a SID subtune into an RChirpSong
 
+        Without a prior capture() of the file, its frames are captured (see capture_frames())
+        and kept in sid_dump, so later conversions don't emulate it again.
+
         :param sid_in_filename: SID input filename
         :type sid_in_filename: str
         :return: SID converted to RChirpSong
@@ -145,37 +265,30 @@ class SID(ChiptuneSAKIO):
         :keyword options:
             * **subtune** (int = 0) - subtune to extract (zero-indexed)
             * **vibrato_cents_margin** (int = 0) - cents margin to control snapping to previous note
-            * **tuning** (int = CONCERT_A) - tuning to use,
-            * **seconds** (float = 60) -  seconds to capture
+            * **tuning** (int = CONCERT_A) - tuning to use, or 'auto' to estimate it from the capture
+            * **seconds** (float = 60) -  seconds to capture, or 'auto' to capture until the song loops or goes silent
             * **arch** (string='NTSC-C64') - architecture. **Note:** overwritten if/when SID headers get parsed
             * **gcf_row_reduce** (bool = True) - reduce rows via GCF of row-activity gaps
             * **create_gate_off_notes** (bool = True) - allow new note starts when gate is off
             * **assert_gate_on_new_note** (bool = True)  - True => gate on event in delta rows with new notes
             * **always_include_freq** (bool = False) - False => freq in delta rows only with new note
+            * **block_cache** (bool = False) - True => emulate through the basic-block translation cache
+            * **max_instructions** (int = MAX_INSTR) - instruction budget for each init or play call
+            * **max_cycles** (int = MAX_CYCLES) - cycle budget for each init or play call
+            * **profile** (bool = False) - True => record per-address and per-opcode execution counts and cycles in the Dump's profile
+            * **auto_max_seconds** (float = AUTO_MAX_SECONDS) - most seconds to capture when seconds is 'auto'
+            * **capture_cache** (CaptureCache = None) - on-disk cache to reuse earlier captures of the same SID and settings from
             * **verbose** (bool = True) - print details to stdout
         """
 
-        # If we don't have the SID import yet (via a prior capture() call) or if
-        # the requested input filename is different than the one we used in
-        # capture(), then import the SID file
-        sid_dump = self.sid_dump
-        if sid_dump is None or self.get_option('sid_in_filename') != sid_in_filename:
+        # If we don't have the SID import yet (via a prior capture() or capture_frames() call)
+        # or if the requested input filename is different than the one we used in capture(),
+        # then capture the SID file's frames, deriving rows from them as they're converted
+        if self.sid_dump is None or self.get_option('sid_in_filename') != sid_in_filename:
             kwargs['sid_in_filename'] = sid_in_filename
             self.set_options(**kwargs)
-            sid_dump = self.capture()
-
-        # create a more summarized representation by removing empty rows while
-        # maintaining structure
-        if self.get_option('gcf_row_reduce'):
-            # determine which rows have activity that rchirp cares about
-            rows_with_activity = [[] for _ in range(sid_dump.sid_file.sid_count)]
-            for row_num, row in enumerate(sid_dump.rows):
-                for chip_num, chip in enumerate(row.chips):
-                    for chn in chip.channels:
-                        if chn.note is not None or chn.gate_on is not None:
-                            rows_with_activity[chip_num].append(row_num)
-                            break
-            self.reduce_rows(sid_dump, rows_with_activity)
+            self.capture_frames()
+        sid_dump = self.sid_dump
 
         rchirp_song = rchirp.RChirpSong()
 
@@ -188,9 +301,16 @@ class SID(ChiptuneSAKIO):
             rchirp.RChirpVoice(rchirp_song) for _ in range(sid_count * 3)]
         rchirp_song.voice_groups = [(1, 2, 3), (4, 5, 6), (7, 8, 9)][:sid_count]
 
-        for row_num, sd_row in enumerate(sid_dump.rows):
-            for chip_num, chip in enumerate(sd_row.chips):
-                for chn_num, chn in enumerate(chip.channels):
+        def active_chips(sd_row):
+            # SID chips with activity that rchirp cares about
+            return [chip_num for chip_num, chip in enumerate(sd_row.chips)
+                    if any(chn.note is not None or chn.gate_on is not None for chn in chip.channels)]
+
+        def convert(sd_row):
+            # RChirpRows for each voice
+            rc_rows = []
+            for chip in sd_row.chips:
+                for chn in chip.channels:
                     rc_row = rchirp.RChirpRow()
                     rc_row.milliframe_num = sd_row.milliframe_num
 
@@ -201,8 +321,19 @@ class SID(ChiptuneSAKIO):
                     if chn.gate_on is not None:
                         rc_row.gate = chn.gate_on
 
-                    rc_voice_num = chn_num + (chip_num * 3)
-                    rchirp_song.voices[rc_voice_num].append_row(rc_row)
+                    rc_rows.append(rc_row)
+            return rc_rows
+
+        # create a more summarized representation by removing empty rows while
+        # maintaining structure
+        if self.get_option('gcf_row_reduce'):
+            rows = gcf_reduce_rows(self.iter_rows, sid_count, active_chips)
+        else:
+            rows = self.iter_rows()
+
+        for sd_row in rows:
+            for rc_voice_num, rc_row in enumerate(convert(sd_row)):
+                rchirp_song.voices[rc_voice_num].append_row(rc_row)
 
         rchirp_song.set_row_delta_values()
         return rchirp_song
@@ -212,39 +343,19 @@ class SID(ChiptuneSAKIO):
         """
         Convert a SID subtune into a CSV file
 
-        Each row of the csv file represents one call of the play routine.
+        Each row of the csv file represents one call of the play routine.  Without a prior
+        capture(), the frames are captured and kept, as in to_rchirp().
 
         :param output_filename: output CSV filename
         :type output_filename: str
         """
-        sid_dump = self.sid_dump
-        if sid_dump is None:  # If not None, sid export already created by capture() call
+        if self.sid_dump is None:  # If not None, sid export already created by capture() call
             self.set_options(**kwargs)
-            sid_dump = self.capture()
-
-        # create a more summarized representation by removing empty rows while maintaining structure
-        if self.get_option('gcf_row_reduce'):
-            # determine which rows have activity that's important in the CSV
-            rows_with_activity = [[] for _ in range(sid_dump.sid_file.sid_count)]
-            for row_num, row in enumerate(sid_dump.rows):
-                for chip_num, chip in enumerate(row.chips):
-                    if chip.vol is not None or chip.filters is not None \
-                            or chip.cutoff is not None or chip.resonance is not None:
-                        rows_with_activity[chip_num].append(row_num)
-                    else:
-                        for chn in chip.channels:
-                            if chn.freq is not None or chn.note is not None \
-                                    or chn.gate_on is not None or chn.adsr is not None \
-                                    or chn.waveforms is not None or chn.pulse_width is not None \
-                                    or chn.filtered is not None or chn.sync_on is not None \
-                                    or chn.ring_on is not None:
-                                rows_with_activity[chip_num].append(row_num)
-                                break
-            self.reduce_rows(sid_dump, rows_with_activity)
+            self.capture_frames()
+        sid_dump = self.sid_dump
+        note_table = get_note_table(sid_dump.arch, sid_dump.tuning)
 
         # create CSV
-        csv_rows = []
-
         csv_row = ['playCall', 'Frame']
         for _ in range(sid_dump.sid_file.sid_count):
             # not going to include: no_sound_v3
@@ -258,9 +369,27 @@ class SID(ChiptuneSAKIO):
                     'v%dADSR' % i, 'v%dWFs' % i, 'v%dPWidth' % i,
                     'v%dUseFilt' % i, 'v%dSync' % i, 'v%dRing' % i
                 ])
-        csv_rows = [csv_row]
+        header = csv_row
 
-        for row in sid_dump.rows:
+        def active_chips(row):
+            # SID chips with activity that's important in the CSV
+            active_chips = []
+            for chip_num, chip in enumerate(row.chips):
+                if chip.vol is not None or chip.filters is not None \
+                        or chip.cutoff is not None or chip.resonance is not None:
+                    active_chips.append(chip_num)
+                else:
+                    for chn in chip.channels:
+                        if chn.freq is not None or chn.note is not None \
+                                or chn.gate_on is not None or chn.adsr is not None \
+                                or chn.waveforms is not None or chn.pulse_width is not None \
+                                or chn.filtered is not None or chn.sync_on is not None \
+                                or chn.ring_on is not None:
+                            active_chips.append(chip_num)
+                            break
+            return active_chips
+
+        def convert(row):
             csv_row = ['%d' % row.play_call_num]
             csv_row.append('{:.3f}'.format(row.milliframe_num / 1000))
 
@@ -282,12 +411,10 @@ class SID(ChiptuneSAKIO):
                     csv_row.append(self.get_val(chn.note))
                     if chn.freq is not None:
                         if chn.freq != 0:
-                            (_, cents) = freq_arch_to_midi_num(chn.freq, sid_dump.arch, sid_dump.tuning)
-                            csv_row.append('%d' % cents)
+                            csv_row.append('%d' % note_table.cents[chn.freq])
                         else:
                             csv_row.append('')
-                        csv_row.append('{:.3f}'.format(
-                            freq_arch_to_freq(chn.freq, sid_dump.arch)))
+                        csv_row.append('{:.3f}'.format(note_table.freqs[chn.freq]))
                     else:
                         csv_row.append('')
                         csv_row.append('')
@@ -303,11 +430,20 @@ class SID(ChiptuneSAKIO):
                     csv_row.append(
                         self.get_bool(chn.ring_on, "ring%dWith%d" % (oscil, other_oscil)))
 
-            csv_rows.append(csv_row)
+            return csv_row
 
+        # create a more summarized representation by removing empty rows while maintaining structure
+        if self.get_option('gcf_row_reduce'):
+            rows = gcf_reduce_rows(self.iter_rows, sid_dump.sid_file.sid_count, active_chips)
+        else:
+            rows = self.iter_rows()
+
+        # rows are written as they're derived
         with open(output_filename, "w", newline="") as f:
             writer = csv.writer(f)
-            writer.writerows(csv_rows)
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(convert(row))
 
     def get_val(self, val, format=None):
         """
@@ -347,68 +483,147 @@ class SID(ChiptuneSAKIO):
         else:
             return false_str
 
-    def reduce_rows(self, sid_dump, rows_with_activity):
-        """
-        The SidImport class samples SID chip state after each call to the play routine.
-        This creates 1 row per play call.  For non-multispeed, in most trackers,
-        this would require speed 1 playback (1 frame per row), which cannot be achieved
-        (again, without multispeed).  So this method attempts to reduce the number of
-        rows in the representaton.  It does so by computing the greatest common divisor
-        for the count of inactive rows between active rows, and then eliminates the
-        unnecessary rows (while preserving rhythm structure).
-
-        # TODO: A row in cvs output contains all channels at a point in time.  A row
-        # in rchirp contains only one channel.  When not making CVS output, better
-        # results could be achieved by computing the GCD for each voice
-        # independently.
-
-        :param sid_dump: Capture of SID chip state from the subtune
-        :type sid_dump: sid.Dump
-        :param rows_with_activity: a list for each SID chip with a list of "active" row numbers
-        :type rows_with_activity: list of lists
-        :return: the row granularity (the largest common factor across all periods of inactivity)
-        :rtype: int
-        """
 
-        # For each SID chip, find the min row num with activity, the max row num with
-        # activity, and the minimum row granularity
-        sid_row_gran = []
-        sid_min_a_row = []
-        sid_max_a_row = []
-        for chip_num in range(sid_dump.sid_file.sid_count):
-            a_rows = rows_with_activity[chip_num]
-            sid_min_a_row.append(min(a_rows))
-            sid_max_a_row.append(max(a_rows))
-            sid_row_gran.append(reduce(math.gcd,
-                (a_rows[i + 1] - a_rows[i] for i in range(len(a_rows) - 1))))  # noqa: E128
-
-        # FUTURE coding: The Orchestrion had different metric modulations (different
-        # minimum row granularities) on each SID, but this code is not yet
-        # generalized enough to support this.  (As a temporary work around, if you have
-        # a 2SID or 3SID and want different minimum row granularities for each
-        # SID-voice grouping, then extract each SID chip output separately.)
-        # Collapsing the stats across SIDs (if more than 1)...
-        if len(sid_row_gran) > 1:
-            row_gran = reduce(math.gcd,
-                (sid_row_gran[i + 1] - sid_row_gran[i] for i in range(len(sid_row_gran) - 1)))  # noqa: E128
-        else:
-            row_gran = sid_row_gran[0]
-        first_row = min(sid_min_a_row)
-        last_row = max(sid_max_a_row)
+def get_row_granularity(rows_with_activity):
+    """
+    Find the greatest common divisor of the gaps between active rows
+
+    The SidImport class samples SID chip state after each call to the play routine.
+    This creates 1 row per play call.  For non-multispeed, in most trackers,
+    this would require speed 1 playback (1 frame per row), which cannot be achieved
+    (again, without multispeed).  So the number of rows in the representation can be
+    reduced by computing the greatest common divisor for the count of inactive rows
+    between active rows, and then eliminating the unnecessary rows (while preserving
+    rhythm structure).  See gcf_reduce_rows().
+
+    # TODO: A row in cvs output contains all channels at a point in time.  A row
+    # in rchirp contains only one channel.  When not making CVS output, better
+    # results could be achieved by computing the GCD for each voice
+    # independently.
+
+    :param rows_with_activity: for each SID chip, its "active" row numbers
+    :type rows_with_activity: list of sequences of int
+    :return: row granularity, first active row number, and last active row number
+    :rtype: (int, int, int)
+    """
+    # For each SID chip, find the min row num with activity, the max row num with
+    # activity, and the minimum row granularity
+    sid_row_gran = []
+    sid_min_a_row = []
+    sid_max_a_row = []
+    for chip_num in range(len(rows_with_activity)):
+        a_rows = rows_with_activity[chip_num]
+        sid_min_a_row.append(min(a_rows))
+        sid_max_a_row.append(max(a_rows))
+        sid_row_gran.append(reduce(math.gcd,
+            (a_rows[i + 1] - a_rows[i] for i in range(len(a_rows) - 1))))  # noqa: E128
+
+    # FUTURE coding: The Orchestrion had different metric modulations (different
+    # minimum row granularities) on each SID, but this code is not yet
+    # generalized enough to support this.  (As a temporary work around, if you have
+    # a 2SID or 3SID and want different minimum row granularities for each
+    # SID-voice grouping, then extract each SID chip output separately.)
+    # Collapsing the stats across SIDs (if more than 1)...
+    if len(sid_row_gran) > 1:
+        row_gran = reduce(math.gcd,
+            (sid_row_gran[i + 1] - sid_row_gran[i] for i in range(len(sid_row_gran) - 1)))  # noqa: E128
+    else:
+        row_gran = sid_row_gran[0]
+    first_row = min(sid_min_a_row)
+    last_row = max(sid_max_a_row)
+
+    return (row_gran, first_row, last_row)
+
+
+def gcf_reduce_rows(get_rows, sid_count, active_chips):
+    """
+    Reduce rows to the row granularity (see get_row_granularity()), in two passes over the
+    rows, so only the active row numbers are held rather than the rows
+
+    The first pass finds which rows have activity, and the second yields every
+    row_granularity'th row from the first active row to the last.
+
+    # TODO: If the last active row contains a gate_on = True, may need to pad out with
+    # (row_gran-1) empty rows
+
+    :param get_rows: called for each pass, returns the rows
+    :type get_rows: function returning an iterator of Row
+    :param sid_count: number of SID chips
+    :type sid_count: int
+    :param active_chips: returns the SID chip numbers with activity in a row
+    :type active_chips: function
+    :return: the reduced rows
+    :rtype: iterator of Row
+    """
+    rows_with_activity = [array('L') for _ in range(sid_count)]
+    for row_num, row in enumerate(get_rows()):
+        for chip_num in active_chips(row):
+            rows_with_activity[chip_num].append(row_num)
+
+    (row_gran, first_row, last_row) = get_row_granularity(rows_with_activity)
+    return itertools.islice(get_rows(), first_row, last_row + 1, row_gran)
 
-        # reduce the rows
-        i = 0
-        reduced_rows = []
-        for row_num in range(first_row, last_row + 1):
-            if i % row_gran == 0:
-                r = sid_dump.rows[row_num]
-                reduced_rows.append(r)
-            i += 1
 
-        # TODO: If last_row contains a gate_on = True, may need to pad out with (row_gran-1) empty rows
+# Result of capturing one subtune with SID.capture_subtunes() (error is the exception if it
+# failed, with sid_dump and rchirp_song None)
+SubtuneCapture = namedtuple('SubtuneCapture', ['subtune', 'sid_dump', 'rchirp_song', 'error'])
 
-        sid_dump.rows = reduced_rows
-        return row_gran
+subtune_worker = None  # a capture_subtunes() worker process's (SID, SidImport)
+
+
+def make_subtune_worker(options, loaded_sid):
+    """
+    Make the SID and SidImport that capture subtunes for SID.capture_subtunes()
+
+    :param options: the SID options
+    :type options: dict
+    :param loaded_sid: the loaded SID file, and the machine state to start captures from
+    :type loaded_sid: LoadedSid
+    :return: SID and SidImport
+    :rtype: (SID, SidImport)
+    """
+    sid = SID()
+    sid.set_options(**options)
+    importer = sid.new_importer()
+    importer.loaded_sid = loaded_sid
+    return (sid, importer)
+
+
+def init_subtune_worker(options, loaded_sid):
+    """
+    Sets up a SID.capture_subtunes() worker process (see make_subtune_worker())
+    """
+    global subtune_worker
+    subtune_worker = make_subtune_worker(options, loaded_sid)
+
+
+def capture_subtune(subtune, to_rchirp, worker=None):
+    """
+    Captures a subtune for SID.capture_subtunes()
+
+    :param subtune: subtune to capture (zero-indexed)
+    :type subtune: int
+    :param to_rchirp: if True, also convert the capture to an RChirpSong
+    :type to_rchirp: bool
+    :param worker: SID and SidImport to capture with, defaults to None (this worker
+                   process's)
+    :type worker: (SID, SidImport), optional
+    :return: the result
+    :rtype: SubtuneCapture
+    """
+    (sid, importer) = worker or subtune_worker
+    try:
+        import_kwargs = sid.import_kwargs()
+        import_kwargs['subtune'] = subtune
+        sid_dump = importer.import_sid(**import_kwargs)
+        rchirp_song = None
+        if to_rchirp:
+            sid.sid_dump = sid_dump
+            rchirp_song = sid.to_rchirp(sid.get_option('sid_in_filename'))
+            sid.sid_dump = None
+        return SubtuneCapture(subtune, sid_dump, rchirp_song, None)
+    except Exception as error:
+        return SubtuneCapture(subtune, None, None, error)
 
 
 class SidFile:
@@ -872,7 +1087,109 @@ class SidFile:
         return little_endian_int(self.c64_payload[0:2])
 
 
-MAX_INSTR = 0x100000
+# A parsed SID file (and a hash of its contents) and the machine state just after its
+# payload was loaded
+LoadedSid = namedtuple('LoadedSid', ['filename', 'sid_file', 'digest', 'snapshot'])
+
+# CaptureCache.stats() result
+CaptureCacheStats = namedtuple('CaptureCacheStats',
+                               ['entries', 'size_bytes', 'max_bytes', 'hits', 'misses', 'stores', 'evictions'])
+
+MAX_INSTR = 0x100000    # default per-call instruction budget for init and play routines
+MAX_CYCLES = 0x800000   # default per-call cycle budget for init and play routines
+AUTO_SECONDS = 'auto'   # seconds setting to capture until the song loops or goes silent
+AUTO_MAX_SECONDS = 600  # default cap on seconds='auto' captures
+AUTO_SILENCE_SECONDS = 5  # silence after sound that ends a seconds='auto' capture
+AUTO_TUNING = 'auto'    # tuning setting to estimate the tuning from the capture itself
+CAPTURE_CACHE_MAX_BYTES = 256 * 1024 * 1024  # default CaptureCache size bound
+CAPTURE_CACHE_VERSION = 1  # bump when a change to the emulation changes what gets captured
+KERNAL_IRQ_EXIT = (0xea31, 0xea83)  # play routines can exit through the KERNAL IRQ handler's end
+
+# Each play call's SID state is captured as a frame: for each SID chip, its registers
+# $00-$18, then a byte of which voices had their gate written on (bits 0-2) or off (bits
+# 4-6) during the call, since a gate can be toggled and restored within one call
+SID_REGISTER_COUNT = 0x19
+FRAME_GATE_WRITES = 0x19  # frame offset (per chip) of the gate writes byte
+FRAME_BYTES_PER_CHIP = 0x1a
+GATE_SET_ON = 0b00000001
+GATE_SET_OFF = 0b00010000
+
+MAX_CENTS_IN_NOTE = 50
+MAX_VIBRATO_CENTS_MARGIN = 90  # nearly an entire note
+NOTE_TABLE_CACHE_SIZE = 8  # (arch, tuning) pairs
+
+# freq_arch_to_midi_num() and freq_arch_to_freq() results for every 16-bit sound chip
+# frequency (midi_nums[0] is -1, as frequency 0 has no note)
+NoteTable = namedtuple('NoteTable', ['midi_nums', 'cents', 'freqs'])
+
+
+def check_vibrato_cents_margin(vibrato_cents_margin):
+    if not 0 <= vibrato_cents_margin < MAX_VIBRATO_CENTS_MARGIN:
+        raise ChiptuneSAKValueError(
+            "ERROR: vibrato_cents_margin must be >= 0 and < %d" % MAX_VIBRATO_CENTS_MARGIN)
+
+
+@lru_cache(maxsize=NOTE_TABLE_CACHE_SIZE)
+def get_note_table(arch, tuning):
+    """
+    Get the lookup table of midi note numbers, cents offsets, and audio frequencies for all
+    sound chip frequencies, building it on first use
+
+    Uses the same floating-point operations as freq_arch_to_midi_num(), so the values are
+    identical to it
+
+    :param arch: architecture
+    :type arch: str
+    :param tuning: tuning
+    :type tuning: float
+    :return: lookup table, indexed by sound chip frequency
+    :rtype: NoteTable
+    """
+    if arch not in ('NTSC-C64', 'PAL-C64'):
+        raise ChiptuneSAKValueError("Error: arch type not supported for freq conversion")
+
+    freqs = np.arange(0x10000) * ARCH[arch].system_clock / 0x1000000
+    with np.errstate(divide='ignore'):
+        midi_nums_float = (np.log2(freqs) - math.log2(tuning)) * 12. + A4_MIDI_NUM
+    midi_nums_float[0] = -1
+    midi_nums = np.round(midi_nums_float).astype(np.int64)
+    cents = np.round((midi_nums_float - midi_nums) * 100).astype(np.int64)
+    for table in (midi_nums, cents, freqs):
+        table.flags.writeable = False  # shared by every caller
+    return NoteTable(midi_nums, cents, freqs)
+
+
+def get_midi_num_and_cents(freq_arch, arch, tuning):
+    """
+    Convert a sound chip frequency to a midi note number and cents offset, like
+    freq_arch_to_midi_num(), but giving note 0 for frequencies below ChiptuneSAK's range
+
+    :param freq_arch: A sound chip frequency
+    :type freq_arch: int
+    :param arch: architecture
+    :type arch: str
+    :param tuning: tuning
+    :type tuning: float
+    :return: midi note number, cents offset
+    :rtype: (int, int)
+    """
+    # C-1 is the lowest note ChiptuneSAK handles, and the low-end of C-1 (midi
+    #     note 0) when A4=440 is ~8.0Hz
+    # For frequencies to stay above 8.0Hz:
+    # - NTSC C64, lowest allowed oscil freq is int(8.0*0x1000000/1022727) = 131
+    # - PAL C64, lowest allowed is int(8.0*0x1000000/985248) = 136
+    note_table = get_note_table(arch, tuning)
+    midi_num = int(note_table.midi_nums[freq_arch])
+    if midi_num >= 0:
+        return (midi_num, int(note_table.cents[freq_arch]))
+    return (0, -MAX_CENTS_IN_NOTE + 1)  # for anything < 8Hz
+
+
+# Derived state of a chip and its channels after a play call (see SidImport.derive_rows())
+ChipState = namedtuple('ChipState', ['cutoff', 'filters', 'vol', 'resonance', 'no_sound_v3'])
+ChannelState = namedtuple('ChannelState', [
+    'freq', 'note', 'df', 'new_note', 'active_note', 'gate_on', 'release_milliframe', 'sync_on',
+    'ring_on', 'oscil_on', 'waveforms', 'adsr', 'pulse_width', 'filtered'])
 
 # attack, decay, and release times in ms (4-bit setting range)
 # Values should be close enough: according to https://www.c64-wiki.com/wiki/ADSR
@@ -1052,8 +1369,16 @@ class Dump:
         self.rows = []  # One row for each sample (after each call to the play routine)
         self.raw_freqs = []  # List of raw frequencies that can be used to derrive tuning
         self.arch = None  # Set by load_sid()
+        self.tuning = CONCERT_A  # tuning the notes were derived with
         self.first_row_with_note = None  # Row index for first row containing a note
         self.multispeed = 1  # 1/multispeed = num times play routine called per frame
+        self.init_cycles = None  # CPU cycles used by the init routine
+        self.play_cycles = []  # CPU cycles used by each call to the play routine
+        self.frames = bytearray()  # SID registers after each play call (see FRAME_BYTES_PER_CHIP)
+        self.profile = None  # ExecutionProfile of the init and play calls, if profiling
+        self.end_reason = None  # why the capture ended: 'seconds', 'loop', 'silence', or 'max_seconds'
+        self.loop_play_call = None  # if it ended on a loop, the play call the song loops back to
+        self.tuning_histogram = None  # TuningHistogram the tuning was estimated from, if tuning='auto'
 
     def is_multispeed(self):
         return self.multispeed != 1
@@ -1077,21 +1402,16 @@ class Dump:
         that the cents deltas can be brought closer to 0 to make better note
         assignment decisions; especially helpful when there's wide vibrato.
 
+        Importing with tuning='auto' does both in one pass (see SidImport.estimate_tuning()).
+
         :return: tuple containing tuning, minimum_cents, and maximum_cents
         :rtype: (float, int, int)
         """
-        all_cents = []
-        for freq_arch in self.raw_freqs:
-            if freq_arch == 0:
-                continue
-            if freq_arch_to_midi_num(freq_arch, self.arch, tuning_override)[0] < 0:
-                continue  # ChiptuneSAK does not support midi note numbers < 0 (< C-1)
-            (_, cents) = freq_arch_to_midi_num(freq_arch, self.arch, tuning=tuning_override)
-            all_cents.append(cents)
-
-        average_cents = sum(all_cents) / len(all_cents)
-        maximum_cents = max(all_cents)
-        minimum_cents = min(all_cents)
+        histogram = TuningHistogram(self.arch, tuning_override)
+        histogram.add_freqs(self.raw_freqs)
+
+        average_cents = histogram.mean_cents()
+        (minimum_cents, maximum_cents) = histogram.cents_range()
         assert (abs(minimum_cents) <= 50 and abs(maximum_cents) <= 50), \
             "Error: not expecting cents to deviate by more than 50 when already derrived from nearest note"
 
@@ -1100,10 +1420,84 @@ class Dump:
 
         return (tuning, minimum_cents, maximum_cents)
 
+    def iter_frames(self):
+        """
+        Iterate over the captured frames, one per play call
+
+        :return: frames
+        :rtype: iterator of bytearray
+        """
+        frame_size = FRAME_BYTES_PER_CHIP * self.sid_file.sid_count
+        return (self.frames[i:i + frame_size] for i in range(0, len(self.frames), frame_size))
+
     def trim_leading_rows(self, rows_to_remove):
         self.rows = self.rows[rows_to_remove:]
 
 
+class TuningHistogram:
+    """
+    Histogram of how many cents sound chip frequencies are from their nearest notes
+
+    Frequencies can be added a play call (or a whole capture) at a time, and the histogram's
+    size doesn't grow with the capture.  Its mean offset gives the tuning the SID's frequency
+    tables were made for.
+    """
+    def __init__(self, arch, tuning=CONCERT_A):
+        self.tuning = tuning  # the notes' tuning
+        self.note_table = get_note_table(arch, tuning)
+        self.counts = np.zeros(2 * MAX_CENTS_IN_NOTE + 1, dtype=np.int64)  # -50 to 50 cents
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def add_freqs(self, freqs):
+        """
+        Add sound chip frequencies
+
+        :param freqs: sound chip frequencies
+        :type freqs: array-like of int
+        """
+        freqs = np.asarray(freqs, dtype=np.int64).ravel()
+        # ChiptuneSAK does not support midi note numbers < 0 (< C-1), or frequency 0
+        cents = self.note_table.cents[freqs][self.note_table.midi_nums[freqs] >= 0]
+        self.counts += np.bincount(cents + MAX_CENTS_IN_NOTE, minlength=len(self.counts))
+
+    def add_frames(self, frames, sid_count):
+        """
+        Add the voices' frequencies from captured frames (see SidImport.start_capture())
+
+        :param frames: one or more frames
+        :type frames: bytes-like
+        :param sid_count: number of SID chips
+        :type sid_count: int
+        """
+        regs = np.frombuffer(bytes(frames), dtype=np.uint8).astype(np.int64) \
+            .reshape(-1, sid_count, FRAME_BYTES_PER_CHIP)
+        self.add_freqs(regs[:, :, [0x00, 0x07, 0x0e]] | (regs[:, :, [0x01, 0x08, 0x0f]] << 8))
+
+    def mean_cents(self):
+        return int((self.counts * np.arange(-MAX_CENTS_IN_NOTE, MAX_CENTS_IN_NOTE + 1)).sum()) / len(self)
+
+    def cents_range(self):
+        """
+        :return: smallest and largest cents offsets seen
+        :rtype: (int, int)
+        """
+        seen = np.nonzero(self.counts)[0]
+        return (int(seen[0]) - MAX_CENTS_IN_NOTE, int(seen[-1]) - MAX_CENTS_IN_NOTE)
+
+    def estimate_tuning(self):
+        """
+        Estimate the tuning from the mean cents offset
+
+        :return: tuning, or the notes' tuning if no notes were added
+        :rtype: float
+        """
+        if len(self) == 0:
+            return self.tuning
+        return self.tuning * 2**(self.mean_cents() / 1200)
+
+
 class timerHistograms:
     def __init__(self):
         self.timers = [{}, {}, {}, {}]
@@ -1130,19 +1524,455 @@ class timerHistograms:
                       % (labels[i], sum(self.timers[i].values()), self.timers[i]))
 
 
+class EndOfSongDetector:
+    """
+    Watches a seconds='auto' capture for the song looping or going silent
+
+    The song has looped when the player's state before a play call repeats its state
+    before an earlier play call, as the play routine will then repeat what it did from
+    there.  The state is the last value written to each address the play calls have
+    written (RAM the player doesn't write never changes), less the addresses every call
+    so far wrote before reading, such as scratch variables, the stack, and SID registers
+    rewritten on each call, since their values before a call don't matter.  The song has
+    ended when it's silent for AUTO_SILENCE_SECONDS after having made sound, or when it
+    loops without playing any notes (e.g., a player idling once the song is done).
+    """
+    def __init__(self, sid_count, ms_per_call, cpu_state):
+        self.sid_count = sid_count
+        self.ms_per_call = ms_per_call
+        self.mem_usage = cpu_state.mem_usage
+        # last value written to each address, starting from the memory (and I/O registers) after init
+        self.values = bytearray(cpu_state.memory)
+        self.values[0xd001:0xdfff] = cpu_state.registers_io[0x001:0xfff]
+        self.call_writes = {}  # address -> True if read before written, for the current play call
+        self.unwritten_values = {}  # value of each address before the play calls first wrote it
+        self.locs = []  # addresses the play calls wrote, in the order first written (history's columns)
+        self.columns = {}  # address -> its column in history
+        self.history = np.zeros((0, 0), dtype=np.uint8)  # written addresses' values before each play call
+        self.scratch = None  # addresses every play call so far wrote before reading
+        self.state_columns = None  # history columns making up the state, None to recompute
+        self.states = {}  # hash of the state -> play calls with a state having that hash
+        self.heard_sound = False
+        self.last_note_play_call = None  # last play call with a gate on in an audible voice
+        self.gates_on = [False] * (3 * sid_count)
+        self.release_starts = [None] * (3 * sid_count)  # play call num each voice's gate went off
+
+    def record_write(self, loc, val):
+        """
+        Memory write hook (see Cpu6502Emulator.set_memory_write_hook()) for the play calls
+
+        :param loc: memory location written
+        :type loc: int
+        :param val: value written
+        :type val: int
+        """
+        if loc not in self.call_writes:
+            self.call_writes[loc] = self.mem_usage[loc] & emulator_6502.MEM_USAGE_READ != 0
+            if loc not in self.columns and loc not in self.unwritten_values:
+                self.unwritten_values[loc] = self.values[loc]
+        self.values[loc] = val
+
+    def repeated_play_call(self, cpu_state, play_call_num):
+        """
+        Record the player's state before a play call
+
+        A state with the same hash as an earlier one is compared to it byte for byte
+        before it's taken as a repeat.
+
+        :param cpu_state: the emulator
+        :type cpu_state: ThinC64Emulator
+        :param play_call_num: the play call about to be made
+        :type play_call_num: int
+        :return: the earlier play call that had the same state before it, or None
+        :rtype: int
+        """
+        if play_call_num > 0:
+            self.add_call_writes(play_call_num)
+        self.call_writes = {}
+
+        if play_call_num == len(self.history):
+            grown = np.zeros((max(64, 2 * len(self.history)), len(self.locs)), dtype=np.uint8)
+            grown[:play_call_num] = self.history
+            self.history = grown
+        row = self.history[play_call_num]
+        row[:] = np.frombuffer(self.values, dtype=np.uint8)[self.locs]
+
+        if self.state_columns is None:
+            # the state is made of different addresses now, so rehash the earlier states
+            self.state_columns = np.array([column for column, loc in enumerate(self.locs)
+                                           if loc not in self.scratch], dtype=np.intp)
+            self.states = {}
+            for earlier in range(play_call_num):
+                earlier_state = self.history[earlier, self.state_columns]
+                self.states.setdefault(hash(earlier_state.tobytes()), []).append(earlier)
+
+        state = row[self.state_columns]
+        earlier_calls = self.states.setdefault(hash(state.tobytes()), [])
+        for earlier in earlier_calls:
+            if np.array_equal(self.history[earlier, self.state_columns], state):
+                return earlier
+        earlier_calls.append(play_call_num)
+        return None
+
+    def add_call_writes(self, play_call_num):
+        """
+        Add the addresses the last play call wrote to the ones that make up the state
+
+        :param play_call_num: the number of play calls made so far
+        :type play_call_num: int
+        """
+        call_writes = self.call_writes
+        scratch_count = None if self.scratch is None else len(self.scratch)
+        if self.scratch is None:
+            self.scratch = {loc for loc, read_first in call_writes.items() if not read_first}
+        else:
+            self.scratch = {loc for loc in self.scratch if call_writes.get(loc) is False}
+
+        new_locs = [loc for loc in call_writes if loc in self.unwritten_values]
+        if new_locs:
+            grown = np.zeros((len(self.history), len(self.locs) + len(new_locs)), dtype=np.uint8)
+            grown[:, :len(self.locs)] = self.history
+            for column, loc in enumerate(new_locs, len(self.locs)):
+                # unchanged before the first write
+                grown[:play_call_num, column] = self.unwritten_values.pop(loc)
+                self.columns[loc] = column
+            self.history = grown
+            self.locs.extend(new_locs)
+        if new_locs or len(self.scratch) != scratch_count:
+            self.state_columns = None
+
+    def is_audible(self, frame, play_call_num):
+        """
+        Returns True if any voice could be heard after a play call (sets heard_sound)
+
+        A voice is heard if the chip's volume is up, the voice has a waveform and isn't
+        stopped by its test bit (or, for voice 3, by the chip's voice 3 off bit), and its
+        gate is on, was written on during the call, or went off within its release time.
+
+        :param frame: the play call's frame (see FRAME_BYTES_PER_CHIP)
+        :type frame: bytearray
+        :param play_call_num: the play call
+        :type play_call_num: int
+        :return: True if audible
+        :rtype: bool
+        """
+        audible = False
+        for chip_num in range(self.sid_count):
+            regs = frame[chip_num * FRAME_BYTES_PER_CHIP:(chip_num + 1) * FRAME_BYTES_PER_CHIP]
+            for chn_num in range(3):
+                voice = 3 * chip_num + chn_num
+                vcr = regs[0x04 + 7 * chn_num]
+                gate_on = vcr & 0b00000001 != 0
+                if gate_on:
+                    self.release_starts[voice] = None
+                elif self.gates_on[voice]:
+                    self.release_starts[voice] = play_call_num
+                self.gates_on[voice] = gate_on
+
+                if regs[0x18] & 0b00001111 == 0 or vcr & 0b00001000 or vcr >> 4 == 0 \
+                        or (chn_num == 2 and regs[0x18] & 0b10000000):
+                    continue
+                if gate_on or regs[FRAME_GATE_WRITES] & (GATE_SET_ON << chn_num):
+                    audible = True
+                    self.last_note_play_call = play_call_num
+                    continue
+                release_start = self.release_starts[voice]
+                if release_start is not None and (play_call_num - release_start) * self.ms_per_call \
+                        <= decay_release_time_ms[regs[0x06 + 7 * chn_num] & 0x0f]:
+                    audible = True
+        self.heard_sound |= audible
+        return audible
+
+
+class IoWriteLog:
+    """
+    The I/O area ($D000-$DFFF) writes made during one init or play call
+
+    The writes are kept in order in compact arrays.  Which bits each register had written
+    on and off is kept per register, and the writes get indexed by register when first
+    queried, so questions about one register (e.g., was a voice's gate written on) don't
+    scan them all.
+    """
+    def __init__(self):
+        self.writes = array('L')  # (loc << 8) | val, in write order
+        self.cycles = array('Q')  # CPU cycle count at the end of each write's instruction
+        self.bits_on = bytearray(0x1000)   # per register, OR of the values written
+        self.bits_off = bytearray(0x1000)  # per register, OR of the values' complements
+        self._positions = {}      # loc -> indexes of its writes, for the first _indexed writes
+        self._indexed = 0
+
+    def __len__(self):
+        return len(self.writes)
+
+    def __iter__(self):
+        """
+        Iterate over the writes, in order
+
+        :return: (loc, val) for each write
+        :rtype: iterator of (int, int)
+        """
+        return ((write >> 8, write & 0xff) for write in self.writes)
+
+    def clear(self):
+        del self.writes[:]
+        del self.cycles[:]
+        self.bits_on[:] = self.bits_off[:] = bytes(0x1000)
+        self._positions = {}
+        self._indexed = 0
+
+    def record(self, loc, val, cycle=0):
+        """
+        Record a write
+
+        :param loc: I/O location
+        :type loc: int
+        :param val: value written
+        :type val: int
+        :param cycle: CPU cycle count of the write, defaults to 0
+        :type cycle: int, optional
+        """
+        self.writes.append((loc << 8) | val)
+        self.cycles.append(cycle)
+        self.bits_on[loc & 0x0fff] |= val
+        self.bits_off[loc & 0x0fff] |= val ^ 0xff
+
+    def positions(self, loc):
+        """
+        Get the indexes of the writes to a location
+
+        :param loc: I/O location
+        :type loc: int
+        :return: indexes into writes and cycles
+        :rtype: list of int
+        """
+        positions = self._positions
+        for i in range(self._indexed, len(self.writes)):
+            positions.setdefault(self.writes[i] >> 8, []).append(i)
+        self._indexed = len(self.writes)
+        return positions.get(loc, [])
+
+    def values_written(self, loc):
+        """
+        Get the values written to a location, in order
+
+        :param loc: I/O location
+        :type loc: int
+        :return: values
+        :rtype: list of int
+        """
+        return [self.writes[i] & 0xff for i in self.positions(loc)]
+
+    def writes_to(self, locs):
+        """
+        Get the writes to any of the given locations, in order
+
+        :param locs: I/O locations
+        :type locs: iterable of int
+        :return: (loc, val, cycle) for each write
+        :rtype: list of (int, int, int)
+        """
+        indexes = sorted(i for loc in locs for i in self.positions(loc))
+        return [(self.writes[i] >> 8, self.writes[i] & 0xff, self.cycles[i]) for i in indexes]
+
+    def bit_was_written(self, loc, mask, bit_on):
+        """
+        Returns True if any write to loc had one of the mask's bits on (bit_on True), or
+        off (bit_on False)
+
+        :param loc: I/O location
+        :type loc: int
+        :param mask: bits to check
+        :type mask: int
+        :param bit_on: True to check for the bits written on, False for written off
+        :type bit_on: bool
+        :return: True if written that way
+        :rtype: bool
+        """
+        return (self.bits_on if bit_on else self.bits_off)[loc & 0x0fff] & mask != 0
+
+
+class CaptureCache:
+    """
+    An on-disk cache of SID captures, so converting a capture again (e.g., with different
+    note or row settings) skips the emulation
+
+    Entries are keyed by a hash of the SID file's contents and the settings that change what
+    gets emulated (subtune, seconds, and the call budgets).  An entry holds the Dump without
+    its rows; the rows, which depend on tuning, vibrato margin, and gate settings, are derived
+    again from its frames.  When the entries' total size passes max_bytes, the least recently
+    used are removed.
+
+    Entries are written atomically, so several processes can share a cache directory.
+    """
+    FILE_EXT = '.capture'
+
+    def __init__(self, directory, max_bytes=CAPTURE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.stores = self.evictions = 0  # for this instance
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(digest, subtune, seconds, auto_max_seconds, max_instructions, max_cycles):
+        """
+        Make the cache key for a capture
+
+        :param digest: hash of the SID file's contents (see LoadedSid)
+        :type digest: str
+        :return: key
+        :rtype: str
+
+        See SidImport for the other parameters
+        """
+        if seconds != AUTO_SECONDS:
+            auto_max_seconds = None  # doesn't affect the capture
+        settings = (CAPTURE_CACHE_VERSION, digest, subtune, seconds, auto_max_seconds,
+                    max_instructions, max_cycles)
+        return hashlib.sha256(repr(settings).encode('ascii')).hexdigest()
+
+    def entry_filename(self, key):
+        return os.path.join(self.directory, key + self.FILE_EXT)
+
+    def get(self, key):
+        """
+        Get a cached capture, marking it recently used
+
+        :param key: key from make_key()
+        :type key: str
+        :return: the capture, without rows, or None if not cached
+        :rtype: Dump
+        """
+        filename = self.entry_filename(key)
+        try:
+            with open(filename, 'rb') as in_file:
+                sid_dump = pickle.loads(zlib.decompress(in_file.read()))
+            os.utime(filename)
+        except FileNotFoundError:
+            sid_dump = None
+        except Exception:
+            sid_dump = None  # unreadable (e.g., corrupt, or from an older ChiptuneSAK), so drop it
+            self.remove(filename)
+        if sid_dump is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return sid_dump
+
+    def put(self, key, sid_dump):
+        """
+        Cache a capture, then evict the least recently used entries past max_bytes
+
+        :param key: key from make_key()
+        :type key: str
+        :param sid_dump: the capture (its rows, raw_freqs, profile, and tuning_histogram are
+                         not cached)
+        :type sid_dump: Dump
+        """
+        entry = copy.copy(sid_dump)
+        entry.rows = []
+        entry.raw_freqs = []
+        entry.profile = None
+        entry.tuning_histogram = None
+        data = zlib.compress(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+        filename = self.entry_filename(key)
+        temp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(temp_filename, 'wb') as out_file:
+            out_file.write(data)
+        os.replace(temp_filename, filename)
+        self.stores += 1
+        self.evict()
+
+    def entries(self):
+        """
+        Get the cache entries, least recently used first
+
+        :return: (filename, size in bytes) for each entry
+        :rtype: list of (str, int)
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.FILE_EXT):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return [(filename, size) for (_, filename, size) in sorted(entries)]
+
+    def evict(self):
+        entries = self.entries()
+        size_bytes = sum(size for (_, size) in entries)
+        for (filename, size) in entries:
+            if size_bytes <= self.max_bytes:
+                break
+            self.remove(filename)
+            self.evictions += 1
+            size_bytes -= size
+
+    def remove(self, filename):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for (filename, _) in self.entries():
+            self.remove(filename)
+
+    def stats(self):
+        """
+        Get the cache's size, and this instance's hit, miss, store, and eviction counts
+
+        :return: cache stats
+        :rtype: CaptureCacheStats
+        """
+        entries = self.entries()
+        return CaptureCacheStats(len(entries), sum(size for (_, size) in entries), self.max_bytes,
+                                 self.hits, self.misses, self.stores, self.evictions)
+
+
 class SidImport:
-    def __init__(self, arch=DEFAULT_ARCH, tuning=CONCERT_A):
+    def __init__(self, arch=DEFAULT_ARCH, tuning=CONCERT_A, block_cache=False,
+                 max_instructions=MAX_INSTR, max_cycles=MAX_CYCLES, profile=False,
+                 auto_max_seconds=AUTO_MAX_SECONDS, capture_cache=None):
         self.arch = arch      # Note, overwritten when SID file loaded
-        self.tuning = tuning  # proper tuning can mean better vibrato note capture
+        # proper tuning can mean better vibrato note capture; with AUTO_TUNING, it's
+        # estimated from each capture before its notes are derived
+        self.auto_tuning = tuning == AUTO_TUNING
+        self.tuning = CONCERT_A if self.auto_tuning else tuning
+
+        # Watchdog budgets for each init or play call (None = unlimited)
+        self.max_instructions = max_instructions
+        self.max_cycles = max_cycles
+
+        # seconds='auto' captures stop here if the song hasn't looped or gone silent
+        self.auto_max_seconds = auto_max_seconds
+
+        # CaptureCache to reuse captures from, and add them to (None = always emulate)
+        self.capture_cache = capture_cache
 
         self.cpu_state = thin_c64_emulator.ThinC64Emulator()
         self.cpu_state.exit_on_empty_stack = True
+
+        self.block_cache = None
+        if block_cache:
+            self.block_cache = self.cpu_state.enable_block_cache()
+
+        # True = give each import's Dump an ExecutionProfile (slows emulation)
+        self.profile = profile
+
+        # Each import starts from this state, or from loaded_sid's state when the same
+        # SID file is imported again (e.g., for another subtune)
+        self.power_on_snapshot = self.cpu_state.snapshot()
+        self.loaded_sid = None
+
         self.play_call_num = 0
-        self.ordered_io_settings = []
+        self.io_writes = IoWriteLog()  # during the current init or play call
 
         self.cia_event_display_count = 0
 
-    def get_note(self, freq_arch, vibrato_cents_margin=0, prev_note=None):
+    def get_note(self, freq_arch, vibrato_cents_margin=0, prev_note=None, tuning=None):
         """
         For a given sound chip frequency, convert to a audio frequency
         and get the note.  If the frequency is within vibrato_cents_margin
@@ -1154,26 +1984,17 @@ class SidImport:
         :type vibrato_cents_margin: int, optional
         :param prev_note: previous midi note number, defaults to None
         :type prev_note: int, optional
+        :param tuning: tuning, defaults to None (the SidImport's tuning)
+        :type tuning: float, optional
         :return: midi note number
         :rtype: int
         """
 
-        MAX_CENTS_IN_NOTE = 50
-        max_extent = 90  # nearly an entire note
+        check_vibrato_cents_margin(vibrato_cents_margin)
 
-        if not 0 <= vibrato_cents_margin < max_extent:
-            raise ChiptuneSAKValueError(
-                "ERROR: vibrato_cents_margin must be >= 0 and < %d" % max_extent)
-
-        # C-1 is the lowest note ChiptuneSAK handles, and the low-end of C-1 (midi
-        #     note 0) when A4=440 is ~8.0Hz
-        # For frequencies to stay above 8.0Hz:
-        # - NTSC C64, lowest allowed oscil freq is int(8.0*0x1000000/1022727) = 131
-        # - PAL C64, lowest allowed is int(8.0*0x1000000/985248) = 136
-        if freq_arch != 0 and freq_arch_to_midi_num(freq_arch, self.arch, self.tuning)[0] >= 0:
-            (midi_num, cents_offset) = freq_arch_to_midi_num(freq_arch, self.arch, self.tuning)
-        else:
-            (midi_num, cents_offset) = (0, -MAX_CENTS_IN_NOTE + 1)  # for anything < 8Hz
+        if tuning is None:
+            tuning = self.tuning
+        (midi_num, cents_offset) = get_midi_num_and_cents(freq_arch, self.arch, tuning)
 
         # cents scale: note-1, -45, -40, ... -10, -5, note, +5, +10, ... +40, +45, note+1
         if prev_note is not None and abs(midi_num - prev_note) == 1 \
@@ -1199,16 +2020,20 @@ class SidImport:
         :type init_addr: int
         :param subtune: The subtune for which to initialize the playback
         :type subtune: int
+        :return: CPU cycles used by the init routine
+        :rtype: int
         """
         self.cpu_state.init_cpu(init_addr, subtune)
-        while self.cpu_state.runcpu():
-            if self.cpu_state.pc > MAX_INSTR:
-                raise Exception("CPU executed a high number of instructions in init routine")
+        result = self.cpu_state.run_until(
+            max_instructions=self.max_instructions, max_cycles=self.max_cycles)
+        self.check_budgets(result, "init")
 
         # This is often an indication of a problem
         if self.cpu_state.last_instruction == 0x00:
             print("Warning: SID init routine exited with a BRK")
 
+        return result.cycles
+
     def call_sid_play(self, play_addr):
         """
         Emulate the call to the SID's play routine
@@ -1221,14 +2046,23 @@ class SidImport:
 
         :param play_addr: The entry point for the play routine
         :type play_addr: int
+        :return: CPU cycles used by the play routine
+        :rtype: int
         """
         # This resets the stack each time
         self.cpu_state.init_cpu(play_addr)
-
-        # While loop to process play routine
-        while self.cpu_state.runcpu():
-            if self.cpu_state.pc > MAX_INSTR:
-                raise Exception("CPU executed a high number of instructions in play routine")
+        start_cycles = self.cpu_state.cpucycles
+
+        # Run the play routine until it returns or exits through the KERNAL
+        max_instructions, max_cycles = self.max_instructions, self.max_cycles
+        while True:
+            result = self.cpu_state.run_until(
+                stop_ranges=(KERNAL_IRQ_EXIT,), max_instructions=max_instructions, max_cycles=max_cycles)
+            self.check_budgets(result, "play")
+            if max_instructions is not None:
+                max_instructions -= result.instructions
+            if max_cycles is not None:
+                max_cycles -= result.cycles
 
             # siddump.c (reference code) has an interesting bug that appears to be a feature.
             # It exits emulation on RTI and RTS if called when stack is exactly $FF (empty)
@@ -1255,25 +2089,47 @@ class SidImport:
 
             # Test if exiting through KERNAL interrupt handler
             #     e.g., $EA31, $EA7E, and $EA81 exit attempts:
-            if self.cpu_state.see_kernal and (0xea31 <= self.cpu_state.pc <= 0xea83):
-                return  # done with play call
+            if result.reason == emulator_6502.EXIT_STOP_ADDRESS:
+                if self.cpu_state.see_kernal:
+                    break  # done with play call
+                continue  # RAM, not the KERNAL, is banked in at these addresses
 
-        # This is often an indication of a problem
-        if self.cpu_state.last_instruction == 0x00:
-            print("Warning: SID play routine exited with a BRK")
+            # BRK, or RTS/RTI on an empty stack
+            # This is often an indication of a problem
+            if self.cpu_state.last_instruction == 0x00:
+                print("Warning: SID play routine exited with a BRK")
+            break
+
+        return self.cpu_state.cpucycles - start_cycles
+
+    def check_budgets(self, result, routine):
+        """
+        Raise an exception if an init or play call ran out of its instruction or cycle budget
+
+        :param result: result of the emulator run
+        :type result: RunResult
+        :param routine: name of the routine for the error message, e.g. 'play'
+        :type routine: str
+        """
+        if result.reason == emulator_6502.EXIT_INSTRUCTION_LIMIT:
+            raise ChiptuneSAKContentError(
+                "Error: CPU executed more than %d instructions in %s routine" % (self.max_instructions, routine))
+        if result.reason == emulator_6502.EXIT_CYCLE_LIMIT:
+            raise ChiptuneSAKContentError(
+                "Error: CPU used more than %d cycles in %s routine" % (self.max_cycles, routine))
 
     def track_io_settings(self, loc, val):
         """
         Callback method that keeps track of each I/O address and what was
         written to it in the play routine.  Events are ordered.
 
-        :param loc: [description]
-        :type loc: [type]
-        :param val: [description]
-        :type val: [type]
+        :param loc: memory location written
+        :type loc: int
+        :param val: value written
+        :type val: int
         """
         if (0xd000 < loc < 0xdfff):
-            self.ordered_io_settings.append((loc, val))
+            self.io_writes.record(loc, val, self.cpu_state.cpucycles)
 
     def gate_was_set_for_voice(self, voice_ctrl_reg, gate_setting):
         """
@@ -1288,15 +2144,14 @@ class SidImport:
         :return: True if voice_ctrl_reg's gate was set to get_setting during play call
         :rtype: bool
         """
-        for (io_loc, io_val) in self.ordered_io_settings:
-            if io_loc == voice_ctrl_reg and (gate_setting == (io_val & 0b00000001 == 1)):
-                return True
-        return False
+        return self.io_writes.bit_was_written(voice_ctrl_reg, 0b00000001, gate_setting)
 
-    def print_call_log_for_cia_activity(self, ordered_io_settings, play_call_num=None):
+    def print_call_log_for_cia_activity(self, io_writes, play_call_num=None):
         MAX_DISPLAY_COUNT = 50
 
-        for loc, val in ordered_io_settings:
+        cia_locs = [cia_base + reg for cia_base in (0xdc00, 0xdd00)
+                    for reg in (0x04, 0x05, 0x06, 0x07, 0x0d, 0x0e, 0x0f)]
+        for loc, val, _ in io_writes.writes_to(cia_locs):
             if self.cia_event_display_count > MAX_DISPLAY_COUNT:
                 return
 
@@ -1382,6 +2237,11 @@ class SidImport:
         interacts with the virtual SID chip(s), and records these interactions
         on a call-by-call basis (on the play routine).
 
+        Importing the same file again (e.g., another subtune) reuses the parsed SID file
+        and the machine state from just after its payload was loaded.
+
+        To process long captures without holding every row in memory, use stream_sid().
+
         :param filename: The filename of the SID song to import
         :type filename: str
         :param subtune: the subtune to import, defaults to 0
@@ -1389,8 +2249,9 @@ class SidImport:
         :param vibrato_cents_margin: if new note adjacent to old but within cents margin
                                      then, snap to old
         :type vibrato_cents_margin: int, optional
-        :param seconds: seconds to capture, defaults to 60
-        :type seconds: int, optional
+        :param seconds: seconds to capture, or 'auto' to capture until the song loops or
+                        goes silent (up to auto_max_seconds), defaults to 60
+        :type seconds: float or str, optional
         :param create_gate_off_notes: If True, can create new notes when gate is off
         :type bool
         :param assert_gate_on_new_note: If True, creates gate on event on new notes in
@@ -1403,16 +2264,199 @@ class SidImport:
         :return: A SID dump instance
         :rtype: Dump
         """
+        sid_dump = self.capture_frames(filename, subtune, seconds, verbose)
+        sid_dump.rows = self.derive_all_rows(
+            sid_dump, vibrato_cents_margin, create_gate_off_notes, assert_gate_on_new_note,
+            always_include_freq, keep_raw_freqs=True)
+        return sid_dump
 
-        sid_dump = Dump()
-        sid_dump.load_sid(filename)
+    def stream_sid(self, filename, subtune=0, vibrato_cents_margin=0, seconds=60,
+                   create_gate_off_notes=True, assert_gate_on_new_note=True,
+                   always_include_freq=False, verbose=True, keep_raw_freqs=False):
+        """
+        Like import_sid(), but instead of collecting the rows, returns an iterator that
+        emulates each play call as the next row is requested, so memory use doesn't grow
+        with the length of the capture
+
+        The SID file is loaded and its init routine called before this returns.  The Dump's
+        rows list stays empty, and its play_cycles (and raw_freqs, if kept) fill in as the
+        rows are produced.  With tuning='auto', the SID is emulated to the end of the capture
+        before this returns, keeping the frames, so the tuning is known for the first note.
+        Only consume one stream at a time from a SidImport instance.
+
+        :param keep_raw_freqs: If True, record each play call's frequencies in raw_freqs
+                               (for Dump.get_tuning()), defaults to False
+        :type keep_raw_freqs: bool, optional
+        :return: A SID dump instance (without rows), and an iterator of its rows
+        :rtype: (Dump, iterator of Row)
+
+        See import_sid() for the other parameters
+        """
+        if self.auto_tuning:
+            # the notes need the whole capture's tuning, so only the rows get streamed
+            sid_dump = self.capture_frames(filename, subtune, seconds, verbose)
+            frames = sid_dump.iter_frames()
+        else:
+            sid_dump = self.get_cached_capture(filename, subtune, seconds, verbose)
+            if sid_dump is not None:
+                frames = sid_dump.iter_frames()
+            else:
+                (sid_dump, frames) = self.start_capture(filename, subtune, seconds, verbose)
+                if self.capture_key(filename, subtune, seconds) is not None:
+                    frames = self.caching_frames(filename, subtune, seconds, sid_dump, frames)
+        rows = self.derive_rows(sid_dump, frames, vibrato_cents_margin, create_gate_off_notes,
+                                assert_gate_on_new_note, always_include_freq, keep_raw_freqs)
+        return (sid_dump, rows)
+
+    def capture_frames(self, filename, subtune=0, seconds=60, verbose=True):
+        """
+        Emulates the SID song execution (or gets it from the capture cache), keeping just the
+        compact register frames, from which rows can be derived any number of times (see
+        derive_rows() and derive_all_rows())
 
-        if sid_dump.sid_file.contains_basic():
-            raise ChiptuneSAKContentError("Error: BASIC code SIDs not yet supported")
+        With tuning='auto', the Dump's tuning gets estimated from the frames.
+
+        :return: A SID dump instance (with frames, without rows)
+        :rtype: Dump
+
+        See import_sid() for the parameters
+        """
+        sid_dump = self.get_cached_capture(filename, subtune, seconds, verbose)
+        if sid_dump is None:
+            (sid_dump, frames) = self.start_capture(filename, subtune, seconds, verbose)
+            for frame in frames:
+                sid_dump.frames += frame
+            self.cache_capture(filename, subtune, seconds, sid_dump)
+        if self.auto_tuning:
+            self.estimate_tuning(sid_dump)
+        return sid_dump
+
+    def load_sid(self, filename, sid_binary=None):
+        """
+        Parses a SID file and loads its payload into memory, keeping the resulting machine
+        state (in loaded_sid) to start each import of the file from
+
+        Does nothing if the file is already loaded.
+
+        :param filename: The filename of the SID song to load
+        :type filename: str
+        :param sid_binary: the SID file's contents (e.g., from a zip file), defaults to None
+                           (read the file)
+        :type sid_binary: bytes, optional
+        :return: the loaded SID
+        :rtype: LoadedSid
+        """
+        if self.loaded_sid is None or self.loaded_sid.filename != filename:
+            if sid_binary is None:
+                with open(filename, mode='rb') as in_file:
+                    sid_binary = in_file.read()
+            sid_file = SidFile()
+            sid_file.parse_binary(sid_binary)
+
+            if sid_file.contains_basic():
+                raise ChiptuneSAKContentError("Error: BASIC code SIDs not yet supported")
+
+            if len(sid_file.c64_payload) + sid_file.load_address >= 0x10000:
+                raise ChiptuneSAKValueError("Error: SID data continues past end of C64 memory")
+
+            self.cpu_state.restore(self.power_on_snapshot)
+            self.cpu_state.inject_bytes(sid_file.load_address, sid_file.c64_payload)
+            self.loaded_sid = LoadedSid(filename, sid_file, hashlib.sha256(sid_binary).hexdigest(),
+                                        self.cpu_state.snapshot())
+        return self.loaded_sid
+
+    def estimate_tuning(self, sid_dump):
+        """
+        Estimates a capture's tuning from its frames (see TuningHistogram), and sets it on the
+        Dump for deriving the capture's notes
+
+        :param sid_dump: the capture, with frames (its tuning and tuning_histogram get set)
+        :type sid_dump: Dump
+        """
+        histogram = TuningHistogram(sid_dump.arch)
+        histogram.add_frames(sid_dump.frames, sid_dump.sid_file.sid_count)
+        sid_dump.tuning = histogram.estimate_tuning()
+        sid_dump.tuning_histogram = histogram
+
+    def capture_key(self, filename, subtune, seconds):
+        """
+        Get the capture cache key for a capture, loading the SID file
+
+        :return: key, or None if captures aren't cached (no capture_cache, or profiling)
+        :rtype: str
+        """
+        if self.capture_cache is None or self.profile:
+            return None
+        return self.capture_cache.make_key(self.load_sid(filename).digest, subtune, seconds,
+                                           self.auto_max_seconds, self.max_instructions, self.max_cycles)
+
+    def get_cached_capture(self, filename, subtune, seconds, verbose=True):
+        """
+        Get a capture (without rows) from the capture cache
+
+        :return: A SID dump instance (with frames), or None if not cached
+        :rtype: Dump
+
+        See import_sid() for the parameters
+        """
+        key = self.capture_key(filename, subtune, seconds)
+        if key is None:
+            return None
+        sid_dump = self.capture_cache.get(key)
+        if sid_dump is not None:
+            self.arch = sid_dump.arch  # as start_capture() does
+            sid_dump.tuning = self.tuning
+            if verbose:
+                print("using cached capture of subtune %d" % subtune)
+        return sid_dump
+
+    def cache_capture(self, filename, subtune, seconds, sid_dump):
+        key = self.capture_key(filename, subtune, seconds)
+        if key is not None:
+            self.capture_cache.put(key, sid_dump)
+
+    def caching_frames(self, filename, subtune, seconds, sid_dump, frames):
+        """
+        Pass frames through from a stream, caching the capture once the stream is used up
+        """
+        captured = bytearray()
+        for frame in frames:
+            captured += frame
+            yield frame
+        cached_dump = copy.copy(sid_dump)
+        cached_dump.frames = captured
+        self.cache_capture(filename, subtune, seconds, cached_dump)
+
+    def start_capture(self, filename, subtune=0, seconds=60, verbose=True):
+        """
+        Loads the SID file and calls its init routine, returning a generator that calls
+        the play routine and yields a frame of the SID register state after each call
+
+        Each frame holds, for each SID chip, its registers $00-$18 and then a byte of the
+        gate writes seen during the play call (see FRAME_BYTES_PER_CHIP).  A frame's play
+        call number is its index.
+
+        :return: A SID dump instance (without rows), and an iterator of frames
+        :rtype: (Dump, iterator of bytearray)
+
+        See import_sid() for the parameters
+        """
+        self.play_call_num = 0
+        self.cia_event_display_count = 0
+
+        loaded_sid = self.load_sid(filename)
+        sid_dump = Dump()
+        sid_dump.sid_file = copy.copy(loaded_sid.sid_file)
+        sid_dump.arch = sid_dump.sid_file.get_arch_from_headers()
+        self.cpu_state.restore(loaded_sid.snapshot)
 
         self.arch = sid_dump.arch  # override SidImport arch param to what's in the SID headers
         sid_dump.tuning = self.tuning
 
+        if self.profile:
+            sid_dump.profile = emulator_6502.ExecutionProfile()
+            self.cpu_state.set_profile(sid_dump.profile)
+
         sid_dump.rows = []
 
         # If 2SID or 3SID, note where the chips are memory mapped
@@ -1422,11 +2466,7 @@ class SidImport:
         if sid_dump.sid_file.sid_count > 2:
             sid_dump.sid_base_addrs.append(sid_dump.sid_file.sid3_address)
 
-        if len(sid_dump.sid_file.c64_payload) + sid_dump.sid_file.load_address >= 0x10000:
-            raise ChiptuneSAKValueError("Error: SID data continues past end of C64 memory")
-
-        self.cpu_state.inject_bytes(sid_dump.sid_file.load_address, sid_dump.sid_file.c64_payload)
-        self.cpu_state.set_mem_callback = self.track_io_settings
+        self.cpu_state.set_memory_write_hook(self.track_io_settings)
 
         if sid_dump.sid_file.is_rsid:
             # RSIDs only have the initial bank setup
@@ -1452,20 +2492,19 @@ class SidImport:
                       + "all other off timers disabled and loaded with 0xFFFF")
 
         timer_hists = timerHistograms()
-        self.cpu_state.debug = False
 
         # useful for seeing how init and play routines touch the SID
         self.cpu_state.clear_memory_usage()  # records if there was R or W activity per loc
-        self.ordered_io_settings = []  # records multiple accesses to same loc
+        self.io_writes.clear()  # records multiple accesses to same loc
         zero_page_usage = set()  # across all init and play calls
 
         # Initialize the SID subtune
-        self.call_sid_init(sid_dump.sid_file.init_address, subtune)
+        sid_dump.init_cycles = self.call_sid_init(sid_dump.sid_file.init_address, subtune)
 
         # self.cpu_state.print_memory_usage()  # See what init touched
         self.cpu_state.update_zp_usage(zero_page_usage)
         if verbose:
-            self.print_call_log_for_cia_activity(self.ordered_io_settings)
+            self.print_call_log_for_cia_activity(self.io_writes)
 
         # See if we're multispeed:
         # Note: this can't determine all RSID multispeed approaches, but should cover
@@ -1514,21 +2553,33 @@ class SidImport:
             else:
                 raise ChiptuneSAKContentError("Error: unable to determine play address")
 
-        max_play_calls = int(seconds * ARCH[self.arch].frame_rate * (1 / sid_dump.multispeed))
-
-        row = Row(sid_dump.sid_file.sid_count)
-        row.play_call_num = 0
-        row.milliframe_num = 0
+        return (sid_dump, self.generate_frames(sid_dump, seconds, verbose, timer_hists, zero_page_usage))
 
-        prev_row = Row(sid_dump.sid_file.sid_count)
-        prev_row.null_all()  # makes the initial delta_row work
-        prev_row.play_call_num = 0
-        prev_row.milliframe_num = -1  # Just as long as it's < 0
+    def generate_frames(self, sid_dump, seconds, verbose, timer_hists, zero_page_usage):
+        """
+        Generator for start_capture(): calls the play routine and yields the SID register frame
 
-        delta_row = Row(sid_dump.sid_file.sid_count)
-        delta_row.null_all()
-        delta_row.play_call_num = 0
-        delta_row.milliframe_num = 0
+        :return: frames
+        :rtype: iterator of bytearray
+        """
+        end_detector = None
+        silent_frames = []  # with seconds='auto', held back until it's known the song goes on
+        if seconds == AUTO_SECONDS:
+            end_detector = EndOfSongDetector(sid_dump.sid_file.sid_count,
+                                             ARCH[self.arch].ms_per_frame * sid_dump.multispeed,
+                                             self.cpu_state)
+
+            def track_play_writes(loc, val):
+                self.track_io_settings(loc, val)
+                end_detector.record_write(loc, val)
+
+            self.cpu_state.set_memory_write_hook(track_play_writes)
+            seconds = self.auto_max_seconds
+        max_play_calls = int(seconds * ARCH[self.arch].frame_rate * (1 / sid_dump.multispeed))
+        silence_play_calls = int(AUTO_SILENCE_SECONDS * ARCH[self.arch].frame_rate * (1 / sid_dump.multispeed))
+        sid_dump.end_reason = 'seconds' if end_detector is None else 'max_seconds'
+        # machine clock cycles from the start of one play call to the start of the next
+        play_call_period = round(ARCH[self.arch].cycles_per_frame * sid_dump.multispeed)
 
         # Note: We could set a reasonable stack pointer here if we wanted, but our
         # exit_on_empty_stack setting hopefully means we don't have to.
@@ -1543,16 +2594,31 @@ class SidImport:
         # will take over that responsibility.  This means we could set the stack pointer
         # to $F9 when calling the play routine.
 
-        self.cpu_state.debug = False
-
         while self.play_call_num < max_play_calls:
+            if end_detector is not None:
+                loop_play_call = end_detector.repeated_play_call(self.cpu_state, self.play_call_num)
+                if loop_play_call is not None:
+                    last_note_play_call = end_detector.last_note_play_call
+                    if last_note_play_call is None or last_note_play_call < loop_play_call:
+                        # the song ended, and the player keeps repeating silence or release tails
+                        sid_dump.end_reason = 'silence'
+                        del sid_dump.play_cycles[len(sid_dump.play_cycles) - len(silent_frames):]
+                        silent_frames = []
+                    else:
+                        sid_dump.end_reason = 'loop'
+                        sid_dump.loop_play_call = loop_play_call
+                    break
+
             if not sid_dump.sid_file.is_rsid:
                 self.set_banks_before_psid_call(sid_dump.sid_file.play_address)
 
             self.cpu_state.clear_memory_usage()
-            self.ordered_io_settings = []
+            self.io_writes.clear()
 
-            self.call_sid_play(sid_dump.sid_file.play_address)
+            play_cycles = self.call_sid_play(sid_dump.sid_file.play_address)
+            sid_dump.play_cycles.append(play_cycles)
+            # let the rest of the call period pass, so the CIA timers stay in step
+            self.cpu_state.advance_clock(max(0, play_call_period - play_cycles))
 
             # self.cpu_state.print_memory_usage()  # See what play touched
             self.cpu_state.update_zp_usage(zero_page_usage)
@@ -1560,7 +2626,7 @@ class SidImport:
             post_call_bank_settings = self.cpu_state.get_mem(0x0001)
 
             if verbose:
-                self.print_call_log_for_cia_activity(self.ordered_io_settings, self.play_call_num)
+                self.print_call_log_for_cia_activity(self.io_writes, self.play_call_num)
 
             # FUTURE: Currently this code doesn't honor speed changes from the play routine
             # (e.g., accelerandos, ritardandos, etc., or digi), only the init routine.
@@ -1580,16 +2646,102 @@ class SidImport:
                 self.cpu_state.bank_in_IO()
 
             # record the SID(s) state
+            frame = bytearray()
+            for sid_addr in sid_dump.sid_base_addrs:
+                frame += bytes([self.cpu_state.get_mem(sid_addr + reg) for reg in range(SID_REGISTER_COUNT)])
+
+                # Normally, we sample the state of the SID chip after a play call.
+                # However, a gate can get briefly (microseconds) changed then restored
+                # in the play call, so record which way each voice's gate was written
+                gate_writes = 0
+                for chn_num in range(3):
+                    ctrl_reg = sid_addr + 0x04 + 7 * chn_num
+                    if self.gate_was_set_for_voice(ctrl_reg, True):
+                        gate_writes |= GATE_SET_ON << chn_num
+                    if self.gate_was_set_for_voice(ctrl_reg, False):
+                        gate_writes |= GATE_SET_OFF << chn_num
+                frame.append(gate_writes)
+
+            play_call_num = self.play_call_num
+            self.play_call_num += 1
+            self.cpu_state.set_mem(0x0001, post_call_bank_settings)  # possibly swap I/O back out
+
+            if end_detector is None:
+                yield frame
+            elif end_detector.is_audible(frame, play_call_num) or not end_detector.heard_sound:
+                yield from silent_frames
+                silent_frames = []
+                yield frame
+            else:
+                silent_frames.append(frame)
+                if len(silent_frames) >= silence_play_calls:
+                    sid_dump.end_reason = 'silence'
+                    del sid_dump.play_cycles[len(sid_dump.play_cycles) - len(silent_frames):]
+                    silent_frames = []
+                    break
+
+        yield from silent_frames  # not followed by enough silence to end the song
+        if end_detector is not None:
+            self.cpu_state.set_memory_write_hook(self.track_io_settings)  # let go of the detector
+
+        if verbose:
+            if sid_dump.end_reason == 'loop':
+                print("song loops back to play call %d after play call %d"
+                      % (sid_dump.loop_play_call, len(sid_dump.play_cycles) - 1))
+            elif sid_dump.end_reason == 'silence':
+                print("song goes silent after play call %d" % (len(sid_dump.play_cycles) - 1))
+            timer_hists.print_results()
+            if len(zero_page_usage) == 0:
+                print("no zero page usage!")
+            else:
+                print("zero page usage: %s" %
+                      ', '.join(str(loc) for loc in sorted(zero_page_usage)))
+
+    def derive_rows(self, sid_dump, frames, vibrato_cents_margin=0, create_gate_off_notes=True,
+                    assert_gate_on_new_note=True, always_include_freq=False, keep_raw_freqs=False):
+        """
+        Derives notes and delta rows from SID register frames (see start_capture()), skipping
+        rows before the first new note
+
+        Only the previous play call's state is kept between frames, so frames can come from
+        a stream.
+
+        :param sid_dump: the Dump the frames were captured for (its tuning is used, and its
+                         first_row_with_note and, if keep_raw_freqs, raw_freqs get set)
+        :type sid_dump: Dump
+        :param frames: one frame per play call, starting with the first
+        :type frames: iterator of bytes-like
+        :return: delta rows
+        :rtype: iterator of Row
+
+        See stream_sid() for the other parameters
+        """
+        sid_count = sid_dump.sid_file.sid_count
+        millframes_per_call = int(sid_dump.multispeed * 1000)
+        ms_per_frame = ARCH[self.arch].ms_per_frame
+
+        # previous play call's state (all None before the first call)
+        prev_chips = [ChipState(*[None] * len(ChipState._fields)) for _ in range(sid_count)]
+        prev_chns = [[ChannelState(*[None] * len(ChannelState._fields)) for _ in range(3)]
+                     for _ in range(sid_count)]
+
+        first_row_with_note = None
+        for play_call_num, frame in enumerate(frames):
+            milliframe_num = play_call_num * millframes_per_call
+            chips = []
+            chns = []
+            row_has_new_note = False
+
+            for chip_num in range(sid_count):
+                regs = frame[chip_num * FRAME_BYTES_PER_CHIP:(chip_num + 1) * FRAME_BYTES_PER_CHIP]
+
+                # first, capture values that apply to all three channels
 
-            # first, capture values that apply to all three channels
-            for chip_num, sid_addr in enumerate(sid_dump.sid_base_addrs):
                 # 11-bit filter
                 # According to Leemon's Mapping the Commodore 64
                 #     The range of cutoff frequencies stretches form 30Hz to ~12,000Hz
                 #     frequency = (register value * 5.8) + 30Hz
-                row.chips[chip_num].cutoff = (
-                    (self.cpu_state.get_mem(sid_addr + 0x16) << 3)
-                    | (self.cpu_state.get_mem(sid_addr + 0x15) & 0b00000111))
+                cutoff = (regs[0x16] << 3) | (regs[0x15] & 0b00000111)
 
                 # Filter Resonance Control Register
                 #     Note: bits 0-2 parsed out later, bit 3 ignored
@@ -1598,8 +2750,7 @@ class SidImport:
                 # Bit 2: Filter the output of voice 3? 1=yes
                 # Bit 3: Filter the output from the external input? 1=yes
                 # Bit 4-7: Select filter resonance 0-15
-                filt_ctrl = self.cpu_state.get_mem(sid_addr + 0x17)
-                row.chips[chip_num].resonance = filt_ctrl >> 4
+                filt_ctrl = regs[0x17]
 
                 # Volume and Filter Select Register
                 # Bits 0-3: Select output volume (0-15)
@@ -1607,24 +2758,31 @@ class SidImport:
                 # Bit 5: Select band-pass filter, 1=band-pass on
                 # Bit 6: Select high-pass filter, 1=high-pass on
                 # Bit 7: Disconnect output of voice 3, 1=voice 3 off
-                vol_filt_reg = self.cpu_state.get_mem(sid_addr + 0x18)
-                row.chips[chip_num].vol = vol_filt_reg & 0b00001111
-                row.chips[chip_num].filters = (vol_filt_reg >> 4) & 0b00000111
-                row.chips[chip_num].no_sound_v3 = (vol_filt_reg & 0b10000000) != 0
+                vol_filt_reg = regs[0x18]
+                chip = ChipState(
+                    cutoff=cutoff,
+                    filters=(vol_filt_reg >> 4) & 0b00000111,
+                    vol=vol_filt_reg & 0b00001111,
+                    resonance=filt_ctrl >> 4,
+                    no_sound_v3=(vol_filt_reg & 0b10000000) != 0)
+                chips.append(chip)
+
+                gate_writes = regs[FRAME_GATE_WRITES]
 
                 # Next, capture channel-specific values
-                for chn_num, chn in enumerate(row.chips[chip_num].channels):
-                    prev_chn = prev_row.chips[chip_num].channels[chn_num]
+                chip_chns = []
+                for chn_num in range(3):
+                    prev_chn = prev_chns[chip_num][chn_num]
+                    reg_offset = 7 * chn_num
 
-                    mem_freq = sid_addr + 7 * chn_num
-                    chn.freq = self.cpu_state.get_le_word(mem_freq)
-                    sid_dump.raw_freqs.append(chn.freq)
+                    freq = regs[reg_offset] | (regs[reg_offset + 1] << 8)
+                    if keep_raw_freqs:
+                        sid_dump.raw_freqs.append(freq)
 
                     # 12-bit pulse
                     # According to Leemon's Mapping the Commodore 64
                     #     pulse width = (register value / 40.95)%
-                    chn.pulse_width = \
-                        self.cpu_state.get_le_word(sid_addr + 0x02 + 7 * chn_num) & 0xfff
+                    pulse_width = (regs[reg_offset + 2] | (regs[reg_offset + 3] << 8)) & 0xfff
 
                     # Voice Control Register
                     # Bit 0: Gate Bit: 1=Start attack/decay/sustain, 0=Start release
@@ -1635,70 +2793,68 @@ class SidImport:
                     # Bit 5: Select sawtooth waveform
                     # Bit 6: Select pulse waveform
                     # Bit 7: Select random noise waveform
-                    ctrl_reg = sid_addr + 0x04 + 7 * chn_num
-                    vcr = self.cpu_state.get_mem(ctrl_reg)
-                    chn.gate_on     = vcr & 0b00000001 != 0  # noqa
-                    chn.sync_on     = vcr & 0b00000010 != 0  # noqa
-                    chn.ring_on     = vcr & 0b00000100 != 0  # noqa
-                    chn.oscil_on    = vcr & 0b00001000 == 0  # noqa
-                    chn.waveforms = vcr >> 4
-                    chn.set_waveform_fields()
+                    vcr = regs[reg_offset + 4]
+                    gate_on     = vcr & 0b00000001 != 0  # noqa
+                    sync_on     = vcr & 0b00000010 != 0  # noqa
+                    ring_on     = vcr & 0b00000100 != 0  # noqa
+                    oscil_on    = vcr & 0b00001000 == 0  # noqa
+                    waveforms = vcr >> 4
 
                     # ADSR as four nibbles
-                    chn.adsr = ((self.cpu_state.get_mem(sid_addr + 0x05 + 7 * chn_num) << 8)
-                                | self.cpu_state.get_mem(sid_addr + 0x06 + 7 * chn_num))
-                    chn.set_adsr_fields()
+                    adsr = (regs[reg_offset + 5] << 8) | regs[reg_offset + 6]
+                    release = adsr & 0x000f
 
                     voices_filtered = filt_ctrl & 0b00000111
                     # Determine if this channel is using the filter
-                    chn.filtered = (voices_filtered & (2 ** chn_num)) != 0
+                    filtered = (voices_filtered & (2 ** chn_num)) != 0
 
                     # determine channel's envelope release status
-                    if chn.gate_on or self.play_call_num == 0:
-                        chn.release_milliframe = None  # No release in progress
+                    if gate_on or play_call_num == 0:
+                        release_milliframe = None  # No release in progress
                     else:  # if channel gate is off
                         if prev_chn.gate_on:  # If gate just turned off
                             # start of new release
-                            chn.release_milliframe = row.milliframe_num
+                            release_milliframe = milliframe_num
                         else:
                             # continue with previous value (may be None)
-                            chn.release_milliframe = prev_chn.release_milliframe
+                            release_milliframe = prev_chn.release_milliframe
 
                     # set within_release_window to True if envelope is still releasing
                     within_release_window = False
-                    if chn.release_milliframe is not None:
-                        ms_since_release = int((row.milliframe_num - chn.release_milliframe)
-                                               * (ARCH[self.arch].ms_per_frame / 1000))
+                    if release_milliframe is not None:
+                        ms_since_release = int((milliframe_num - release_milliframe)
+                                               * (ms_per_frame / 1000))
                         within_release_window = \
-                            ms_since_release <= decay_release_time_ms[chn.release]
+                            ms_since_release <= decay_release_time_ms[release]
 
                     # has sound been turned off for the channel?
-                    channel_off = not chn.oscil_on
-                    if (chn_num == 2) and row.chips[chip_num].no_sound_v3:
+                    channel_off = not oscil_on
+                    if (chn_num == 2) and chip.no_sound_v3:
                         channel_off = True
 
                     # True if the last (not necessarily previous) change in gate status was to on
-                    gate_is_on = chn.release_milliframe is None
+                    gate_is_on = release_milliframe is None
                     prev_gate_is_on = prev_chn.release_milliframe is None
 
                     # Is there an active (not released) note playing?
-                    chn.active_note = (
+                    active_note = (
                         not channel_off
-                        and chn.waveforms != 0  # tri, saw, pulse, and/or noise active
+                        and waveforms != 0  # tri, saw, pulse, and/or noise active
                         and gate_is_on)
 
                     # what the note will or would be for the current frequency
-                    chn.note = self.get_note(chn.freq, vibrato_cents_margin, prev_chn.note)
+                    note = self.get_note(freq, vibrato_cents_margin, prev_chn.note, sid_dump.tuning)
 
                     # Normally, we sample the state of the SID chip after a play call.
                     # However, this checks if a gate got breifly (microseconds) changed then
                     # restored in the play loop, but the note frequency was unchanged:
                     # - on->playLoop(off->on) means attack restarted on same note
                     # - off->playLoop(on->off) means restarting a note on its release phase
+                    gate_write = (GATE_SET_OFF if prev_gate_is_on else GATE_SET_ON) << chn_num
                     note_reasserted = (
-                        chn.freq == prev_chn.freq
+                        freq == prev_chn.freq
                         and gate_is_on == prev_gate_is_on  # if gate same before and after play call
-                        and self.gate_was_set_for_voice(ctrl_reg, not prev_gate_is_on))
+                        and gate_writes & gate_write != 0)
 
                     # The following logic asserts a new note when
                     # a) there's an active note (gate on with waveform) and on the previous
@@ -1711,136 +2867,312 @@ class SidImport:
                     # d) the freq is the same as the previous freq, but the voice's gate was
                     #    double toggled in the play routine
                     make_new_note = (
-                        chn.active_note and (
+                        active_note and (
                             not prev_chn.active_note
-                            or chn.note != prev_chn.note
+                            or note != prev_chn.note
                             or note_reasserted
                         ) or (
                             create_gate_off_notes
-                            and (chn.note != prev_chn.note or note_reasserted)
+                            and (note != prev_chn.note or note_reasserted)
                             and within_release_window
                         )
                     )
 
-                    chn.new_note = (self.play_call_num == 0 or make_new_note)
+                    new_note = (play_call_num == 0 or make_new_note)
+                    if new_note and note != 0:
+                        row_has_new_note = True
 
-                    if self.play_call_num > 0:
-                        delta = chn.freq - prev_chn.freq
-                    else:
-                        delta = 0
                     # if not a new note, but there's a change in frequency...
-                    if not chn.new_note:
-                        chn.df = delta
+                    if not new_note and play_call_num > 0:
+                        df = freq - prev_chn.freq
                     else:
-                        chn.df = 0
+                        df = 0
 
-            if sid_dump.first_row_with_note is None:
-                if row.contains_new_note():
-                    sid_dump.first_row_with_note = self.play_call_num
+                    chip_chns.append(ChannelState(
+                        freq, note, df, new_note, active_note, gate_on, release_milliframe, sync_on,
+                        ring_on, oscil_on, waveforms, adsr, pulse_width, filtered))
+                chns.append(chip_chns)
 
-            # Build delta_row (shows differences from previous row)
+            if first_row_with_note is None and row_has_new_note:
+                first_row_with_note = sid_dump.first_row_with_note = play_call_num
 
-            # for each SID chip:
-            for chip_num, chip in enumerate(row.chips):
-                prev_chip = prev_row.chips[chip_num]
-                delta_chip = delta_row.chips[chip_num]
+            # leading rows without notes are dropped
+            if first_row_with_note is not None:
+                yield self.make_delta_row(
+                    play_call_num, milliframe_num, chips, chns, prev_chips, prev_chns,
+                    play_call_num == first_row_with_note,
+                    assert_gate_on_new_note, always_include_freq)
 
-                include = (self.play_call_num == sid_dump.first_row_with_note)
+            # setup chips and channels for next iteration:
+            prev_chips = chips
+            prev_chns = chns
 
-                if include or chip.cutoff != prev_chip.cutoff:
-                    delta_chip.cutoff = chip.cutoff
+    def derive_all_rows(self, sid_dump, vibrato_cents_margin=0, create_gate_off_notes=True,
+                        assert_gate_on_new_note=True, always_include_freq=False, keep_raw_freqs=False):
+        """
+        Derives notes and delta rows from all of a Dump's captured frames at once, with the
+        same results as derive_rows()
 
-                if include or chip.filters != prev_chip.filters:
-                    delta_chip.filters = chip.filters
+        Each register and derived value is computed as a NumPy column over every play call,
+        so notes can be re-derived with different options (or after changing the Dump's
+        tuning) without emulating the SID again.
 
-                if include or chip.vol != prev_chip.vol:
-                    delta_chip.vol = chip.vol
+        :param sid_dump: the Dump with the frames (its arch and tuning are used, and its
+                         first_row_with_note and, if keep_raw_freqs, raw_freqs get set)
+        :type sid_dump: Dump
+        :return: delta rows
+        :rtype: list of Row
 
-                if include or chip.resonance != prev_chip.resonance:
-                    delta_chip.resonance = chip.resonance
+        See stream_sid() for the other parameters
+        """
+        check_vibrato_cents_margin(vibrato_cents_margin)
 
-                if include or chip.no_sound_v3 != prev_chip.no_sound_v3:
-                    delta_chip.no_sound_v3 = chip.no_sound_v3
+        sid_count = sid_dump.sid_file.sid_count
+        num_calls = len(sid_dump.frames) // (FRAME_BYTES_PER_CHIP * sid_count)
+        regs = np.frombuffer(bytes(sid_dump.frames), dtype=np.uint8).astype(np.int64) \
+            .reshape(num_calls, sid_count, FRAME_BYTES_PER_CHIP)
+        call_nums = np.arange(num_calls)
+        milliframe_nums = call_nums * int(sid_dump.multispeed * 1000)
+        is_first_call = (call_nums == 0)[:, None]
+
+        def prev(column, first_value):
+            # column values from the previous play call
+            result = np.empty_like(column)
+            result[0] = first_value
+            result[1:] = column[:-1]
+            return result
 
-                # for each SID chip channel:
-                for chn_num, chn in enumerate(row.chips[chip_num].channels):
-                    prev_chn = prev_chip.channels[chn_num]
-                    delta_chn = delta_chip.channels[chn_num]
+        def changed(column):
+            # True where the value differs from the previous play call (always on the first)
+            return is_first_call | (column != prev(column, 0))
+
+        # chip columns, shape (play calls, chips)
+        cutoff = (regs[:, :, 0x16] << 3) | (regs[:, :, 0x15] & 0b00000111)
+        filt_ctrl = regs[:, :, 0x17]
+        resonance = filt_ctrl >> 4
+        vol = regs[:, :, 0x18] & 0b00001111
+        filters = (regs[:, :, 0x18] >> 4) & 0b00000111
+        no_sound_v3 = (regs[:, :, 0x18] & 0b10000000) != 0
+
+        # channel columns, shape (play calls, chips * 3), in chip then channel order
+        def channel_regs(reg):
+            return regs[:, :, [reg, reg + 7, reg + 14]].reshape(num_calls, sid_count * 3)
+
+        def per_channel(chip_column):
+            return np.repeat(chip_column, 3, axis=1)
+
+        chn_nums = np.tile(np.arange(3), sid_count)
+        freq = channel_regs(0x00) | (channel_regs(0x01) << 8)
+        pulse_width = (channel_regs(0x02) | (channel_regs(0x03) << 8)) & 0xfff
+        vcr = channel_regs(0x04)
+        gate_on = (vcr & 0b00000001) != 0
+        sync_on = (vcr & 0b00000010) != 0
+        ring_on = (vcr & 0b00000100) != 0
+        oscil_on = (vcr & 0b00001000) == 0
+        waveforms = vcr >> 4
+        adsr = (channel_regs(0x05) << 8) | channel_regs(0x06)
+        filtered = ((per_channel(filt_ctrl) >> chn_nums) & 1) != 0
+        gate_writes = per_channel(regs[:, :, FRAME_GATE_WRITES])
+        gate_set_on = (gate_writes & (GATE_SET_ON << chn_nums)) != 0
+        gate_set_off = (gate_writes & (GATE_SET_OFF << chn_nums)) != 0
+
+        if keep_raw_freqs:
+            sid_dump.raw_freqs.extend(freq.ravel().tolist())
+
+        # A release starts when the gate goes off after being on, and lasts until the gate
+        # is turned on again (a gate that's off from the first play call has no release)
+        gate_off_start = ~gate_on & (is_first_call | prev(gate_on, True))
+        last_gate_off_start = np.maximum.accumulate(
+            np.where(gate_off_start, call_nums[:, None], 0), axis=0)
+        releasing = ~gate_on & (last_gate_off_start > 0)
+        release_milliframe = milliframe_nums[last_gate_off_start]
+        ms_since_release = np.trunc((milliframe_nums[:, None] - release_milliframe)
+                                    * (ARCH[sid_dump.arch].ms_per_frame / 1000))
+        within_release_window = releasing & (
+            ms_since_release <= np.array(decay_release_time_ms)[adsr & 0x000f])
+
+        # True if the last (not necessarily previous) change in gate status was to on
+        gate_is_on = ~releasing
+        prev_gate_is_on = prev(gate_is_on, True)
+
+        channel_off = ~oscil_on | ((chn_nums == 2) & per_channel(no_sound_v3))
+        active_note = ~channel_off & (waveforms != 0) & gate_is_on
+
+        # notes (see get_midi_num_and_cents())
+        note_table = get_note_table(sid_dump.arch, sid_dump.tuning)
+        in_range = note_table.midi_nums[freq] >= 0
+        note = np.where(in_range, note_table.midi_nums[freq], 0)
+        cents = np.where(in_range, note_table.cents[freq], -MAX_CENTS_IN_NOTE + 1)
+
+        # snap to the previous note within the vibrato margin (see get_note()); as this
+        # depends on the previous derived note, only possible snaps are visited, in order
+        if vibrato_cents_margin != 0:
+            possible_snaps = (cents != 0) & (
+                (cents >= MAX_CENTS_IN_NOTE - vibrato_cents_margin)
+                | (cents <= vibrato_cents_margin - MAX_CENTS_IN_NOTE))
+            possible_snaps[0] = False
+            for (call_num, chn) in zip(*np.nonzero(possible_snaps)):
+                prev_note = note[call_num - 1, chn]
+                midi_num = note[call_num, chn]
+                if prev_note == midi_num + 1:
+                    if cents[call_num, chn] >= MAX_CENTS_IN_NOTE - vibrato_cents_margin:
+                        note[call_num, chn] = prev_note
+                elif prev_note == midi_num - 1:
+                    if cents[call_num, chn] <= vibrato_cents_margin - MAX_CENTS_IN_NOTE:
+                        note[call_num, chn] = prev_note
+
+        prev_note = prev(note, -1)
+        prev_freq = prev(freq, -1)
+        note_reasserted = ~is_first_call & (freq == prev_freq) & (gate_is_on == prev_gate_is_on) \
+            & np.where(prev_gate_is_on, gate_set_off, gate_set_on)
+
+        # see derive_rows() for the new note rules
+        make_new_note = (
+            active_note & (~prev(active_note, False) | (note != prev_note) | note_reasserted)
+            | (create_gate_off_notes & ((note != prev_note) | note_reasserted) & within_release_window))
+        new_note = is_first_call | make_new_note
+        df = np.where(new_note, 0, freq - prev_freq)
+
+        rows_with_new_notes = np.nonzero((new_note & (note != 0)).any(axis=1))[0]
+        if len(rows_with_new_notes) == 0:
+            return []
+        first_row_with_note = sid_dump.first_row_with_note = int(rows_with_new_notes[0])
+
+        # which values go in the delta rows
+        include = (call_nums == first_row_with_note)[:, None]
+        chip_columns = [
+            (name, column, include | changed(column))
+            for (name, column) in (('cutoff', cutoff), ('filters', filters), ('vol', vol),
+                                   ('resonance', resonance), ('no_sound_v3', no_sound_v3))]
+        if assert_gate_on_new_note:
+            gate_column = np.where(new_note, True, gate_on)
+            gate_set = new_note | changed(gate_on)
+        else:
+            (gate_column, gate_set) = (gate_on, changed(gate_on))
+        chn_columns = [
+            ('freq', freq, always_include_freq | new_note | (df > 0)),
+            ('note', note, new_note),
+            ('df', df, df > 0),
+            ('waveforms', waveforms, changed(waveforms)),
+            ('gate_on', gate_column, gate_set),
+            ('sync_on', sync_on, include | changed(sync_on)),
+            ('ring_on', ring_on, include | changed(ring_on)),
+            ('oscil_on', oscil_on, include | changed(oscil_on)),
+            ('adsr', adsr, changed(adsr)),
+            ('pulse_width', pulse_width, changed(pulse_width)),
+            ('filtered', filtered, include | changed(filtered))]
+
+        rows = []
+        for call_num in range(first_row_with_note, num_calls):
+            delta_row = Row(sid_count)
+            delta_row.null_all()
+            delta_row.play_call_num = call_num
+            delta_row.milliframe_num = int(milliframe_nums[call_num])
+            rows.append(delta_row)
+        chips = [delta_row.chips for delta_row in rows]
+        channels = [[chn for chip in delta_row.chips for chn in chip.channels] for delta_row in rows]
+
+        # only visit the (mostly few) values that are set
+        def set_values(objects, columns):
+            for (name, column, is_set) in columns:
+                (set_calls, set_nums) = np.nonzero(is_set & (call_nums >= first_row_with_note)[:, None])
+                for (call_num, num, value) in zip((set_calls - first_row_with_note).tolist(), set_nums.tolist(),
+                                                  column[set_calls, set_nums].tolist()):
+                    setattr(objects[call_num][num], name, value)
+                if name == 'waveforms':
+                    for (call_num, num) in zip((set_calls - first_row_with_note).tolist(), set_nums.tolist()):
+                        objects[call_num][num].set_waveform_fields()
+                elif name == 'adsr':
+                    for (call_num, num) in zip((set_calls - first_row_with_note).tolist(), set_nums.tolist()):
+                        objects[call_num][num].set_adsr_fields()
+
+        set_values(chips, chip_columns)
+        set_values(channels, chn_columns)
+        return rows
+
+    def make_delta_row(self, play_call_num, milliframe_num, chips, chns, prev_chips, prev_chns,
+                       include, assert_gate_on_new_note, always_include_freq):
+        """
+        Build a delta row for derive_rows(), showing differences from the previous play call
 
-                    if always_include_freq or chn.new_note:
-                        delta_chn.freq = chn.freq
+        :param include: If True, include all chip settings, not just changes
+        :type include: bool
+        :return: delta row
+        :rtype: Row
+        """
+        delta_row = Row(len(chips))
+        delta_row.null_all()
+        delta_row.play_call_num = play_call_num
+        delta_row.milliframe_num = milliframe_num
 
-                    if chn.new_note:
-                        delta_chn.note = chn.note
+        # for each SID chip:
+        for chip_num, chip in enumerate(chips):
+            prev_chip = prev_chips[chip_num]
+            delta_chip = delta_row.chips[chip_num]
 
-                    if chn.df > 0:
-                        delta_chn.freq = chn.freq
-                        delta_chn.df = chn.df
+            if include or chip.cutoff != prev_chip.cutoff:
+                delta_chip.cutoff = chip.cutoff
 
-                    if chn.waveforms != prev_chn.waveforms:
-                        delta_chn.waveforms = chn.waveforms
-                        delta_chn.set_waveform_fields()
+            if include or chip.filters != prev_chip.filters:
+                delta_chip.filters = chip.filters
 
-                    # sid2midi will (always?) fail to create new notes when the gate is simply
-                    # left on (see Pool of Radiance).  This is why we have assert_gate_on_new_note.
-                    if assert_gate_on_new_note and chn.new_note:
-                        delta_chn.gate_on = True  # Used to influence RChirp->Chirp note creation
-                    elif chn.gate_on != prev_chn.gate_on:
-                        delta_chn.gate_on = chn.gate_on
+            if include or chip.vol != prev_chip.vol:
+                delta_chip.vol = chip.vol
 
-                    if include or chn.sync_on != prev_chn.sync_on:
-                        delta_chn.sync_on = chn.sync_on
+            if include or chip.resonance != prev_chip.resonance:
+                delta_chip.resonance = chip.resonance
 
-                    if include or chn.ring_on != prev_chn.ring_on:
-                        delta_chn.ring_on = chn.ring_on
+            if include or chip.no_sound_v3 != prev_chip.no_sound_v3:
+                delta_chip.no_sound_v3 = chip.no_sound_v3
 
-                    if include or chn.oscil_on != prev_chn.oscil_on:
-                        delta_chn.oscil_on = chn.oscil_on
+            # for each SID chip channel:
+            for chn_num, chn in enumerate(chns[chip_num]):
+                prev_chn = prev_chns[chip_num][chn_num]
+                delta_chn = delta_chip.channels[chn_num]
 
-                    if chn.adsr != prev_chn.adsr:
-                        delta_chn.adsr = chn.adsr
-                        delta_chn.set_adsr_fields()
+                if always_include_freq or chn.new_note:
+                    delta_chn.freq = chn.freq
 
-                    if chn.pulse_width != prev_chn.pulse_width:
-                        delta_chn.pulse_width = chn.pulse_width
+                if chn.new_note:
+                    delta_chn.note = chn.note
 
-                    if include or chn.filtered != prev_chn.filtered:
-                        delta_chn.filtered = chn.filtered
+                if chn.df > 0:
+                    delta_chn.freq = chn.freq
+                    delta_chn.df = chn.df
 
-                    # no need to include release_milliframe or new_note
+                if chn.waveforms != prev_chn.waveforms:
+                    delta_chn.waveforms = chn.waveforms
+                    delta_chn.set_waveform_fields()
 
-                    # end of per-channel loop
+                # sid2midi will (always?) fail to create new notes when the gate is simply
+                # left on (see Pool of Radiance).  This is why we have assert_gate_on_new_note.
+                if assert_gate_on_new_note and chn.new_note:
+                    delta_chn.gate_on = True  # Used to influence RChirp->Chirp note creation
+                elif chn.gate_on != prev_chn.gate_on:
+                    delta_chn.gate_on = chn.gate_on
 
-            sid_dump.rows.append(delta_row)
+                if include or chn.sync_on != prev_chn.sync_on:
+                    delta_chn.sync_on = chn.sync_on
 
-            # setup chips and channels for next iteration:
+                if include or chn.ring_on != prev_chn.ring_on:
+                    delta_chn.ring_on = chn.ring_on
 
-            prev_row = copy.deepcopy(row)
-            self.play_call_num += 1
-            millframes_to_next_call = int(sid_dump.multispeed * 1000)
+                if include or chn.oscil_on != prev_chn.oscil_on:
+                    delta_chn.oscil_on = chn.oscil_on
 
-            row = Row(sid_dump.sid_file.sid_count)
-            row.play_call_num = self.play_call_num
-            row.milliframe_num = prev_row.milliframe_num + millframes_to_next_call
+                if chn.adsr != prev_chn.adsr:
+                    delta_chn.adsr = chn.adsr
+                    delta_chn.set_adsr_fields()
 
-            delta_row = Row(sid_dump.sid_file.sid_count)
-            delta_row.null_all()
-            delta_row.play_call_num = self.play_call_num
-            delta_row.milliframe_num = prev_row.milliframe_num + millframes_to_next_call
+                if chn.pulse_width != prev_chn.pulse_width:
+                    delta_chn.pulse_width = chn.pulse_width
 
-            self.cpu_state.set_mem(0x0001, post_call_bank_settings)  # possibly swap I/O back out
+                if include or chn.filtered != prev_chn.filtered:
+                    delta_chn.filtered = chn.filtered
 
-        if verbose:
-            timer_hists.print_results()
-            if len(zero_page_usage) == 0:
-                print("no zero page usage!")
-            else:
-                print("zero page usage: %s" %
-                      ', '.join(str(loc) for loc in sorted(zero_page_usage)))
-        if sid_dump.first_row_with_note > 0:
-            sid_dump.trim_leading_rows(sid_dump.first_row_with_note)
+                # no need to include release_milliframe or new_note
 
-        return sid_dump
+        return delta_row
 
 
 if __name__ == "__main__":
@@ -17,8 +17,112 @@ from chiptunesak import emulator_6502
 CIA_TIMER_NTSC = 17045
 CIA_TIMER_PAL = 16421
 
+# Process-wide ROM image caches.  ROM images are immutable bytes shared by reference
+# between emulator instances; patching an image makes a new one (memoized, so instances
+# that apply the same patches share the results).
+rom_files = {}     # path -> file contents (None if not found), read at most once
+rom_patches = {}   # (image, offset, patch bytes) -> patched image
+MAX_ROM_PATCHES = 256
+
+
+def patched_rom(image, offset, patch):
+    """
+    Get a copy of a ROM image with bytes replaced, sharing the result with any other
+    instance that applied the same patch to the same image
+
+    :param image: ROM image
+    :type image: bytes
+    :param offset: offset of the patch in the image
+    :type offset: int
+    :param patch: replacement bytes
+    :type patch: bytes, bytearray, or list of ints
+    :return: the patched ROM image
+    :rtype: bytes
+    """
+    patch = bytes(patch)
+    key = (image, offset, patch)
+    result = rom_patches.get(key)
+    if result is None:
+        if offset < 0 or offset + len(patch) > len(image):
+            raise ChiptuneSAKValueError("Error: ROM patch outside of the ROM")
+        result = image[:offset] + patch + image[offset + len(patch):]
+        if len(rom_patches) >= MAX_ROM_PATCHES:
+            rom_patches.clear()
+        rom_patches[key] = result
+    return result
+
+
+class CiaTimer:
+    def __init__(self):
+        """
+        A CIA timer that works out its counter from the machine clock when it's needed,
+        rather than counting down every cycle
+
+        Only counting system clock cycles is supported (not CNT pulses or, for timer B,
+        timer A underflows).
+        """
+        self.latch = 0           # value reloaded into the counter on underflow
+        self.counter = 0         # counter value at machine clock cycle synced_at
+        self.synced_at = 0
+        self.running = False
+        self.one_shot = False    # True = stops after underflow, False = continuous
+        self.underflowed = False  # underflow not yet acknowledged through the ICR
+
+    def sync(self, clock):
+        """
+        Bring the counter up to date with the machine clock
+
+        :param clock: machine clock cycle
+        :type clock: int
+        :return: number of underflows since the last sync
+        :rtype: int
+        """
+        elapsed = clock - self.synced_at
+        self.synced_at = clock
+        if not self.running or elapsed <= self.counter:
+            if self.running and elapsed > 0:
+                self.counter -= elapsed
+            return 0
+
+        elapsed -= self.counter + 1  # cycles since the first underflow
+        if self.one_shot:
+            underflows = 1
+            self.counter = self.latch
+            self.running = False
+        else:
+            period = self.latch + 1
+            underflows = 1 + elapsed // period
+            self.counter = self.latch - elapsed % period
+        self.underflowed = True
+        return underflows
+
+    def cycles_to_underflow(self, clock):
+        """
+        Get the number of cycles until the next underflow
+
+        :param clock: machine clock cycle
+        :type clock: int
+        :return: cycles until underflow, or None if the timer isn't running
+        :rtype: int
+        """
+        self.sync(clock)
+        return self.counter + 1 if self.running else None
+
+    def get_state(self):
+        return (self.latch, self.counter, self.synced_at, self.running, self.one_shot, self.underflowed)
+
+    def set_state(self, state):
+        (self.latch, self.counter, self.synced_at, self.running, self.one_shot, self.underflowed) = state
+
 
 class ThinC64Emulator(emulator_6502.Cpu6502Emulator):
+    # ROM images are immutable, so snapshots keep references to them.  Banking flags and
+    # page maps aren't captured, restore() rebuilds them from $0001
+    snapshot_values = emulator_6502.Cpu6502Emulator.snapshot_values + (
+        'has_basic', 'has_kernal', 'has_char', 'is_ntsc', 'rom_kernal', 'rom_basic', 'rom_char',
+        'clock_base', 'cia_state')
+    snapshot_buffers = emulator_6502.Cpu6502Emulator.snapshot_buffers + ('registers_io',)
+
     def __init__(self, arch=constants.DEFAULT_ARCH):
         super().__init__()
 
@@ -27,21 +131,32 @@ class ThinC64Emulator(emulator_6502.Cpu6502Emulator):
         self.has_kernal = False
         self.has_char = False
 
-        self.set_mem_callback = None  # optional callback for processing memory writes
+        self.io_write_hook = None  # optional hook(loc, val) before each I/O register write
 
-        self.rom_kernal = [0] * 8192    # KERNAL ROM 57344-65535 ($E000-$FFFF)
-        self.rom_basic = [0] * 8192     # BASIC ROM 40960-49151 ($A000-$BFFF)
-        self.rom_char = [0] * 4096      # Character set ROM 53248-57343 ($D000-$DFFF)
-        self.registers_io = [0] * 4096  # Pretending I/O ($D000-$DFFF) are all registers
+        # ROM images (immutable, see patched_rom())
+        self.rom_kernal = bytes(8192)        # KERNAL ROM 57344-65535 ($E000-$FFFF)
+        self.rom_basic = bytes(8192)         # BASIC ROM 40960-49151 ($A000-$BFFF)
+        self.rom_char = bytes(4096)          # Character set ROM 53248-57343 ($D000-$DFFF)
+        self.registers_io = bytearray(4096)  # Pretending I/O ($D000-$DFFF) are all registers
 
         self.is_ntsc = arch.startswith("NTSC")  # False if PAL
 
+        # The machine clock (see clock) drives the CIA timers, which are only brought up
+        # to date when their registers are accessed
+        self.clock_base = 0  # machine clock cycle at which cpucycles was last zeroed
+        self.cia_timers = [[CiaTimer(), CiaTimer()], [CiaTimer(), CiaTimer()]]  # [cia 1, cia 2][a, b]
+        self.cia_irq_masks = [0, 0]  # ICR interrupt enable bits for cia 1 and cia 2
+
         self.see_basic = None
         self.see_kernal = None
         self.see_char = None
         self.see_io = None
+        # Per-page ($00xx to $FFxx) memory access handlers, rebuilt on writes to $0001
+        self.page_readers = None
+        self.page_writers = None
+        self.update_banks()  # all RAM until the processor port is written
         # bank in BASIC, KERNAL, and I/O (not char)
-        self.set_mem(0x0001, 0b00110111)  # Sets the above four booleans
+        self.set_mem(0x0001, 0b00110111)  # Sets the above four booleans and the page maps
 
         # SID file specs say setting $02A6 is required
         if self.is_ntsc:
@@ -90,142 +205,314 @@ class ThinC64Emulator(emulator_6502.Cpu6502Emulator):
 
     def get_mem(self, loc):
         self.mem_usage[loc] |= emulator_6502.MEM_USAGE_READ
+        return self.page_readers[loc >> 8](loc)
 
-        if loc < 0xa000 or (0xc000 <= loc <= 0xcfff):
-            return self.memory[loc]
+    def set_mem(self, loc, val):
+        self.mem_usage[loc] |= emulator_6502.MEM_USAGE_WRITE
+        self.page_writers[loc >> 8](loc, val)  # bytearrays raise ValueError if val isn't a byte
 
-        if loc >= 0xe000:
-            if self.see_kernal:
-                return self.rom_kernal[loc - 0xe000]
-            else:
-                return self.memory[loc]
+    def set_io_write_hook(self, hook):
+        """
+        Install (or with None, remove) a hook called with the location and value before
+        each write to the I/O area ($D000-$DFFF) while I/O is banked in
 
-        if 0xa000 <= loc <= 0xbfff:
-            if self.see_basic:
-                return self.rom_basic[loc - 0xa000]
-            else:
-                return self.memory[loc]
+        :param hook: function taking (loc, val), or None
+        :type hook: function
+        """
+        self.io_write_hook = hook
+        self.update_banks()
+
+    def set_zero_page(self, loc, val):
+        self.memory[loc] = val  # Set RAM
+
+        if loc == 1:  # hook writes to loc $0001 to update memory banking
+            self.update_banks()
+
+    def restore(self, snapshot):
+        """
+        Restore machine state captured by snapshot(), including ROM patches and I/O registers
+
+        :param snapshot: the machine state
+        :type snapshot: MachineSnapshot
+        """
+        super().restore(snapshot)
+        self.update_banks()
+
+    def update_banks(self):
+        """
+        Set the see_* flags from the processor port at $0001, and rebuild the per-page
+        read and write handler maps to match
+        """
+        # Assuming that loc $0000 is always xxxxx111
+        self.see_basic = self.see_kernal = self.see_io = self.see_char = False
+
+        # From https://www.c64-wiki.com/wiki/Bank_Switching  (Validated)
+        # Assumming the EXROM and GAME are both 1 (since not emulating cartridges),
+        # here's the banks for the other three PLA latch states:
+
+        # m1:b2   m1:b1   m1:b0   $1000-  $8000-  $A000-  $C000-  $D000-  $E000-
+        # CHAREN  HIRAM   LORAM   $7FFF   $9FFF   $BFFF   $CFFF   $DFFF   $FFFF
+        # 1       1       1       RAM     RAM     BASIC   RAM     I/O     KERNAL
+        # 1       1       0       RAM     RAM     RAM     RAM     I/O     KERNAL
+        # 1       0       1       RAM     RAM     RAM     RAM     I/O     RAM
+        # 1       0       0       RAM     RAM     RAM     RAM     RAM     RAM
+        # 0       1       1       RAM     RAM     BASIC   RAM     CHAR    KERNAL
+        # 0       1       0       RAM     RAM     RAM     RAM     CHAR    KERNAL
+        # 0       0       1       RAM     RAM     RAM     RAM     CHAR    RAM
+        # 0       0       0       RAM     RAM     RAM     RAM     RAM     RAM
+        # (I/O = VIC-II, SID, Color, CIA-1, CIA-2)
 
-        # only $D000 to $DFFF left to process:
+        banks = self.memory[0x0001] & 0b00000111
+        if banks & 0b00000011 == 0b00000011:
+            self.see_basic = True
+        if banks & 0b00000010:
+            self.see_kernal = True
+        if 5 <= banks <= 7:
+            self.see_io = True
+        if 1 <= banks <= 3:
+            self.see_char = True
+
+        self.bank_key = banks
+        if self.block_cache is not None:
+            self.block_cache.generation += 1  # stops a running block that changed banks
+
+        # Reads and writes default to RAM, which is a single indexed lookup.  Writes to ROM
+        # areas always go to the RAM underneath.
+        readers = 256 * [self.memory.__getitem__]
+        writers = 256 * [self.memory.__setitem__]
+        writers[0x00] = self.set_zero_page
+
+        if self.see_basic:
+            readers[0xa0:0xc0] = 32 * [self.get_basic]
+        if self.see_kernal:
+            readers[0xe0:0x100] = 32 * [self.get_kernal]
         if self.see_char:
-            return self.rom_char[loc - 0xd000]
+            readers[0xd0:0xe0] = 16 * [self.get_char]
+        elif self.see_io:
+            readers[0xd0:0xe0] = 16 * [self.get_io]
+            writers[0xd0:0xe0] = 16 * [self.set_io if self.io_write_hook is None else self.set_io_hooked]
+
+        self.page_readers = readers
+        self.page_writers = writers
+
+    def get_basic(self, loc):
+        return self.rom_basic[loc - 0xa000]
+
+    def get_kernal(self, loc):
+        return self.rom_kernal[loc - 0xe000]
+
+    def get_char(self, loc):
+        return self.rom_char[loc - 0xd000]
+
+    # Normally, for a given memory location, you can write to RAM, or read from either RAM
+    # or what's banked in instead.  But it's more complicated in the $D000 to $DFFF range:
+    #
+    # When RAM is banked in:
+    # - $D000-$DFFF: reads and writes go to RAM
+    #
+    # When character ROM banked in:
+    # - $D000-$DFFF: reads from Character ROM, writes go to RAM
+    #
+    # When I/O banked in:
+    # - $D000-$D02E: reads/writes go to VIC-II chip registers
+    # - $D02F-$D03F: In a real C64, always read as $FF, and cannot be altered
+    # - $D040-$D3FF: In a real C64, every 64-byte block here is a "mirror" of VIC-II
+    #                registers at $D000
+    # - $D400-$D418: Write-only SID registers (read value is not SID register or the
+    #                RAM underneath)
+    # - $D419-$D41C: Read-only SID registers
+    # - $D41D-$D41F: In a real C64, always read as $FF, and cannot be altered
+    # - $D420-$D4FF: In a real C64, every 32-bytes block here is a "mirror" of the SID
+    #                registers at $D400
+    # - $D800-$DBFF: reads/writes go to Color RAM
+    # - $DC00-$DC0F: reads/writes go to CIA #1
+    # - $DC10-$DCFF: In a real C64, every 16-bytes block here is a "mirror" of the CIA
+    #                registers at $DC00
+    # - $DD00-$DD0F: reads/writes go to CIA #2
+    # - $DD10-$DDFF: In a real C64, every 16-bytes block here is a "mirror" of the CIA
+    #                registers at $DD00
+    # - $DE00-$DFFF: When no cart present, read/write behavior here is undefined
+
+    def get_io(self, loc):
+        if 0xd02f <= loc <= 0xd03f or 0xd41d <= loc <= 0xd41f:
+            return 0xff
+
+        if 0xd040 <= loc <= 0xd3ff:  # VIC-II mirroring
+            return self.registers_io[((loc - 0xd040) % 64) + 0x040]
+
+        # TODO: This will need to be modified for 2SID and 3SID emulation
+        if 0xd420 <= loc <= 0xd4ff:  # SID mirroring
+            return self.registers_io[((loc - 0xd420) % 32) + 0x420]
+
+        if 0xdc00 <= loc <= 0xddff:  # CIAs, including mirrors
+            return self.get_cia(loc)
+
+        # Note: no special treatment for $D400-$D418
+        #    In this low-fidelity emulator, you can read anything that was stored in a
+        #    write-only SID register, which is used when we sample regs after a play call
+        return self.registers_io[loc - 0xd000]
+
+    def set_io_hooked(self, loc, val):
+        self.io_write_hook(loc, val)
+        self.set_io(loc, val)
+
+    def set_io(self, loc, val):
+        # $D000 and $DFFF have always been written to RAM, even with I/O banked in
+        if loc == 0xd000 or loc == 0xdfff:
+            self.memory[loc] = val
+            return
 
-        # Normally, for a given memory location, you can write to RAM, or read from either RAM
-        # or what's banked in instead.  But it's more complicated in the $D000 to $DFFF range:
-        #
-        # When RAM is banked in:
-        # - $D000-$DFFF: reads and writes go to RAM
-        #
-        # When character ROM banked in:
-        # - $D000-$DFFF: reads from Character ROM, writes go to RAM
-        #
-        # When I/O banked in:
-        # - $D000-$D02E: reads/writes go to VIC-II chip registers
-        # - $D02F-$D03F: In a real C64, always read as $FF, and cannot be altered
-        # - $D040-$D3FF: In a real C64, every 64-byte block here is a "mirror" of VIC-II
-        #                registers at $D000
-        # - $D400-$D418: Write-only SID registers (read value is not SID register or the
-        #                RAM underneath)
-        # - $D419-$D41C: Read-only SID registers
-        # - $D41D-$D41F: In a real C64, always read as $FF, and cannot be altered
-        # - $D420-$D4FF: In a real C64, every 32-bytes block here is a "mirror" of the SID
-        #                registers at $D400
-        # - $D800-$DBFF: reads/writes go to Color RAM
-        # - $DC00-$DC0F: reads/writes go to CIA #1
-        # - $DC10-$DCFF: In a real C64, every 16-bytes block here is a "mirror" of the CIA
-        #                registers at $DC00
-        # - $DD00-$DD0F: reads/writes go to CIA #2
-        # - $DD10-$DDFF: In a real C64, every 16-bytes block here is a "mirror" of the CIA
-        #                registers at $DD00
-        # - $DE00-$DFFF: When no cart present, read/write behavior here is undefined
-
-        if self.see_io:  # If the I/O is banked in
-            if 0xd02f <= loc <= 0xd03f or 0xd41d <= loc <= 0xd41f:
-                return 0xff
-
-            if 0xd040 <= loc <= 0xd3ff:  # VIC-II mirroring
-                return self.registers_io[((loc - 0xd040) % 64) + 0x040]
-
-            # TODO: This will need to be modified for 2SID and 3SID emulation
-            if 0xd420 <= loc <= 0xd4ff:  # SID mirroring
-                return self.registers_io[((loc - 0xd420) % 32) + 0x420]
-
-            if 0xdc10 <= loc <= 0xdcff:  # CIA1 mirroring
-                return self.registers_io[((loc - 0xdc10) % 16) + 0xc10]
-
-            if 0xdd10 <= loc <= 0xddff:  # CIA2 mirroring
-                return self.registers_io[((loc - 0xdd10) % 16) + 0xd10]
-
-            # Note: no special treatment for $D400-$D418
-            #    In this low-fidelity emulator, you can read anything that was stored in a
-            #    write-only SID register, which is used when we sample regs after a play call
-            return self.registers_io[loc - 0xd000]
-
-        return self.memory[loc]
+        if 0xd02f <= loc <= 0xd03f or 0xd41d <= loc <= 0xd41f:
+            return  # unsettable
 
-    def set_mem(self, loc, val):
-        self.mem_usage[loc] |= emulator_6502.MEM_USAGE_WRITE
+        if 0xd040 <= loc <= 0xd3ff:  # VIC-II mirror set
+            self.registers_io[((loc - 0xd040) % 64) + 0x040] = val
+            return
 
-        if not (0 <= val <= 255):
-            exit("Error: POKE(%d),%d out of range" % (loc, val))
+        if 0xd420 <= loc <= 0xd4ff:  # SID mirror set
+            self.registers_io[((loc - 0xd420) % 32) + 0x420] = val
+            return
 
-        if self.set_mem_callback is not None:
-            self.set_mem_callback(loc, val)  # ignore the pylint "not callable" error
+        if 0xdc00 <= loc <= 0xddff:  # CIAs, including mirrors
+            self.set_cia(loc, val)
+            return
 
-        if (0xd000 < loc < 0xdfff) and self.see_io:
-            if 0xd02f <= loc <= 0xd03f or 0xd41d <= loc <= 0xd41f:
-                return  # unsettable
+        self.registers_io[loc - 0xd000] = val
+
+    # CIA registers handled by the timers (others are plain registers):
+    # - $x4-$x7: timer A and B lo/hi.  Writes set the latch (and the counter, if the
+    #            timer is stopped and the hi byte is written), reads give the counter
+    # - $xD: interrupt control register (ICR).  Writes set (bit 7 = 1) or clear (bit 7
+    #        = 0) interrupt enable bits, reads give and acknowledge the underflows
+    # - $xE-$xF: timer A and B control.  Bit 0 = start, bit 3 = one-shot, bit 4 = load
+    #            the latch into the counter
+    # Written values are also kept in registers_io, so get_cia_timer() gives the latch
+
+    def get_cia(self, loc):
+        cia = (loc >> 8) & 1  # 0 = cia 1 ($DCxx), 1 = cia 2 ($DDxx)
+        reg = loc & 0x0f
+        if 0x04 <= reg <= 0x07:
+            timer = self.cia_timers[cia][(reg - 4) >> 1]
+            timer.sync(self.clock)
+            return (timer.counter >> 8) if reg & 1 else (timer.counter & 0xff)
+        if reg == 0x0d:
+            icr = self.get_cia_interrupts(cia)
+            for timer in self.cia_timers[cia]:
+                timer.underflowed = False
+            return icr
+        return self.registers_io[0xc00 + (cia << 8) + reg]
+
+    def set_cia(self, loc, val):
+        cia = (loc >> 8) & 1
+        reg = loc & 0x0f
+        self.registers_io[0xc00 + (cia << 8) + reg] = val
+        if 0x04 <= reg <= 0x07:
+            timer = self.cia_timers[cia][(reg - 4) >> 1]
+            timer.sync(self.clock)
+            if reg & 1:
+                timer.latch = (timer.latch & 0x00ff) | (val << 8)
+                if not timer.running:
+                    timer.counter = timer.latch
+            else:
+                timer.latch = (timer.latch & 0xff00) | val
+        elif reg == 0x0d:
+            if val & 0x80:
+                self.cia_irq_masks[cia] |= val & 0x1f
+            else:
+                self.cia_irq_masks[cia] &= ~val & 0x1f
+        elif reg == 0x0e or reg == 0x0f:
+            timer = self.cia_timers[cia][reg - 0x0e]
+            timer.sync(self.clock)
+            timer.running = bool(val & 0x01)
+            timer.one_shot = bool(val & 0x08)
+            if val & 0x10:
+                timer.counter = timer.latch
+
+    def get_cia_interrupts(self, cia):
+        """
+        Get a CIA's ICR value without acknowledging its interrupts
 
-            if 0xd040 <= loc <= 0xd3ff:  # VIC-II mirror set
-                self.registers_io[((loc - 0xd040) % 64) + 0x040] = val
-                return
+        :param cia: 0 for cia 1, 1 for cia 2
+        :type cia: int
+        :return: bit 0 = timer A underflow, bit 1 = timer B underflow, bit 7 = any of
+                 those with interrupts enabled
+        :rtype: int
+        """
+        clock = self.clock
+        icr = 0
+        for bit, timer in ((0x01, self.cia_timers[cia][0]), (0x02, self.cia_timers[cia][1])):
+            timer.sync(clock)
+            if timer.underflowed:
+                icr |= bit
+        if icr & self.cia_irq_masks[cia]:
+            icr |= 0x80
+        return icr
+
+    def cia_interrupt_pending(self, cia_num=1):
+        """
+        Returns True if a CIA has an unacknowledged timer underflow with interrupts enabled
+        (cia 1 drives the IRQ line, cia 2 the NMI line)
 
-            if 0xd420 <= loc <= 0xd4ff:  # SID mirror set
-                self.registers_io[((loc - 0xd420) % 32) + 0x420] = val
-                return
+        :param cia_num: cia chip number, defaults to 1
+        :type cia_num: int, optional
+        :return: True if an interrupt is pending
+        :rtype: bool
+        """
+        return bool(self.get_cia_interrupts(cia_num - 1) & 0x80)
 
-            if 0xdc10 <= loc <= 0xdcff:  # CIA1 mirror set
-                self.registers_io[((loc - 0xdc10) % 16) + 0xc10] = val
-                return
+    def cycles_until_cia_interrupt(self, cia_num=1):
+        """
+        Get the number of cycles until the next timer underflow with interrupts enabled
 
-            if 0xdd10 <= loc <= 0xddff:  # CIA2 mirror set
-                self.registers_io[((loc - 0xdd10) % 16) + 0xd10] = val
-                return
+        :param cia_num: cia chip number, defaults to 1
+        :type cia_num: int, optional
+        :return: cycles until the interrupt, or None if no enabled timer is running
+        :rtype: int
+        """
+        cia = cia_num - 1
+        clock = self.clock
+        cycles = None
+        for bit, timer in ((0x01, self.cia_timers[cia][0]), (0x02, self.cia_timers[cia][1])):
+            if self.cia_irq_masks[cia] & bit:
+                timer_cycles = timer.cycles_to_underflow(clock)
+                if timer_cycles is not None and (cycles is None or timer_cycles < cycles):
+                    cycles = timer_cycles
+        return cycles
+
+    @property
+    def clock(self):
+        """
+        Machine clock: CPU cycles since power on, plus any advance_clock() time
+        """
+        return self.clock_base + self.cpucycles
 
-            self.registers_io[loc - 0xd000] = val
-            return
+    def advance_clock(self, cycles):
+        """
+        Let time pass without running the CPU (e.g., until the next play call)
 
-        self.memory[loc] = val  # Set RAM
+        :param cycles: number of cycles
+        :type cycles: int
+        """
+        self.clock_base += cycles
 
-        if loc == 1:  # hook writes to loc $0001 to update memory banking
-            # Assuming that loc $0000 is always xxxxx111
-            self.see_basic = self.see_kernal = self.see_io = self.see_char = False
-
-            # From https://www.c64-wiki.com/wiki/Bank_Switching  (Validated)
-            # Assumming the EXROM and GAME are both 1 (since not emulating cartridges),
-            # here's the banks for the other three PLA latch states:
-
-            # m1:b2   m1:b1   m1:b0   $1000-  $8000-  $A000-  $C000-  $D000-  $E000-
-            # CHAREN  HIRAM   LORAM   $7FFF   $9FFF   $BFFF   $CFFF   $DFFF   $FFFF
-            # 1       1       1       RAM     RAM     BASIC   RAM     I/O     KERNAL
-            # 1       1       0       RAM     RAM     RAM     RAM     I/O     KERNAL
-            # 1       0       1       RAM     RAM     RAM     RAM     I/O     RAM
-            # 1       0       0       RAM     RAM     RAM     RAM     RAM     RAM
-            # 0       1       1       RAM     RAM     BASIC   RAM     CHAR    KERNAL
-            # 0       1       0       RAM     RAM     RAM     RAM     CHAR    KERNAL
-            # 0       0       1       RAM     RAM     RAM     RAM     CHAR    RAM
-            # 0       0       0       RAM     RAM     RAM     RAM     RAM     RAM
-            # (I/O = VIC-II, SID, Color, CIA-1, CIA-2)
-
-            banks = self.memory[0x0001] & 0b00000111
-            if banks & 0b00000011 == 0b00000011:
-                self.see_basic = True
-            if banks & 0b00000010:
-                self.see_kernal = True
-            if 5 <= banks <= 7:
-                self.see_io = True
-            if 1 <= banks <= 3:
-                self.see_char = True
+    def init_cpu(self, newpc, newa=0, newx=0, newy=0, flags=emulator_6502.FU):
+        self.clock_base += self.cpucycles  # cpucycles restarts from zero, the clock doesn't
+        super().init_cpu(newpc, newa, newx, newy, flags)
+
+    @property
+    def cia_state(self):
+        """
+        CIA timer and interrupt state, as plain values (for snapshots)
+        """
+        return (tuple(timer.get_state() for cia in self.cia_timers for timer in cia),
+                tuple(self.cia_irq_masks))
+
+    @cia_state.setter
+    def cia_state(self, state):
+        (timer_states, masks) = state
+        for timer, timer_state in zip([timer for cia in self.cia_timers for timer in cia], timer_states):
+            timer.set_state(timer_state)
+        self.cia_irq_masks = list(masks)
 
     def bank_in_IO(self):
         """
@@ -261,10 +548,16 @@ class ThinC64Emulator(emulator_6502.Cpu6502Emulator):
             pass  # I/O already banked in, nothing to change
 
     def load_rom(self, path_and_filename, expected_size):
-        binary = read_binary_file(path_and_filename)
-        if binary is None:
-            print(f"Warning: could not find {path_and_filename}... have you run `python3 res/downdownloadTestResources.py` yet?")
-        elif len(binary) != expected_size:
+        if path_and_filename not in rom_files:
+            binary = read_binary_file(path_and_filename)
+            if binary is None:
+                print(f"Warning: could not find {path_and_filename}... have you run `python3 res/downdownloadTestResources.py` yet?")
+            else:
+                binary = bytes(binary)
+            rom_files[path_and_filename] = binary
+
+        binary = rom_files[path_and_filename]
+        if binary is not None and len(binary) != expected_size:
             raise ChiptuneSAKContentError("Error: %s had unexpected length" % path_and_filename)
 
         return binary
@@ -285,15 +578,18 @@ class ThinC64Emulator(emulator_6502.Cpu6502Emulator):
             self.rom_char = binary
             self.has_char = True
 
+        if self.block_cache is not None:
+            self.block_cache.clear()
+
     def patch_kernal(self, mem_loc, bytes):
-        mem_loc -= 0xe000
-        for i, a_byte in enumerate(bytes):
-            self.rom_kernal[mem_loc + i] = a_byte
+        self.rom_kernal = patched_rom(self.rom_kernal, mem_loc - 0xe000, bytes)
+        if self.block_cache is not None:
+            self.block_cache.clear()
 
     def patch_basic(self, mem_loc, bytes):
-        mem_loc -= 0xa000
-        for i, a_byte in enumerate(bytes):
-            self.rom_basic[mem_loc + i] = a_byte
+        self.rom_basic = patched_rom(self.rom_basic, mem_loc - 0xa000, bytes)
+        if self.block_cache is not None:
+            self.block_cache.clear()
 
     def get_timer_base_loc(self, cia_num, timer):
         """
@@ -1,10 +1,12 @@
 # Tests of 6502 Emulation
 #
 
+import pickle
 import unittest
 from chiptunesak import emulator_6502
 from chiptunesak import thin_c64_emulator
 from chiptunesak.constants import ARCH
+from chiptunesak.errors import ChiptuneSAKNotImplemented, ChiptuneSAKValueError
 
 VERBOSE = False
 
@@ -70,6 +72,342 @@ class Test6502Emulator(unittest.TestCase):
         self.assertTrue(cpuState.runcpu() == 1)
         self.assertTrue(cpuState.sp == 0x01)
 
+    # @unittest.skip("Skipping this test for now")
+    def test_opcode_dispatch(self):
+        cpuState = emulator_6502.Cpu6502Emulator()
+
+        cpuState.inject_bytes(32768, [0xe8, 0xe8, 0xeb, 0x01, 0x00])  # INX, INX, SBC #1 ($EB), BRK
+        cpuState.init_cpu(32768, newa=5, flags=emulator_6502.FU | emulator_6502.FC)
+        while cpuState.runcpu():
+            pass
+        self.assertEqual(cpuState.x, 2)
+        self.assertEqual(cpuState.a, 4)
+        self.assertEqual(cpuState.cpucycles, 2 + 2 + 2 + 7)
+
+        cpuState.inject_bytes(32768, [0x02])  # HALT
+        cpuState.init_cpu(32768)
+        with self.assertRaises(ChiptuneSAKValueError):
+            cpuState.runcpu()
+
+        cpuState.inject_bytes(32768, [0xff])  # INC-SBC abs,X (not implemented)
+        cpuState.init_cpu(32768)
+        with self.assertRaises(ChiptuneSAKNotImplemented):
+            cpuState.runcpu()
+
+    # @unittest.skip("Skipping this test for now")
+    def test_memory_buffers(self):
+        cpuState = emulator_6502.Cpu6502Emulator()
+
+        cpuState.inject_bytes(0xfffe, bytes([0x12, 0x34]))
+        self.assertEqual(cpuState.get_le_word(0xfffe), 0x3412)
+        with self.assertRaises(ChiptuneSAKValueError):
+            cpuState.inject_bytes(0xffff, [0x12, 0x34])
+        self.assertEqual(len(cpuState.memory), 0x10000)
+
+        usage = cpuState.mem_usage
+        usage[0x1000] = emulator_6502.MEM_USAGE_WRITE
+        cpuState.clear_memory_usage()
+        self.assertIs(cpuState.mem_usage, usage)  # cleared in place
+        self.assertFalse(any(cpuState.mem_usage))
+
+    # @unittest.skip("Skipping this test for now")
+    def test_block_cache(self):
+        cpuState = emulator_6502.Cpu6502Emulator()
+        cache = cpuState.enable_block_cache()
+
+        # The STA rewrites the opcode of a later instruction in the same basic block
+        #    8000  A9 E8     LDA #$E8   (INX opcode)
+        #    8002  8D 06 80  STA $8006
+        #    8005  EA        NOP
+        #    8006  EA        NOP        (becomes INX)
+        #    8007  00        BRK
+        program = [0xa9, 0xe8, 0x8d, 0x06, 0x80, 0xea, 0xea, 0x00]
+        for _ in range(2):
+            cpuState.inject_bytes(32768, program)
+            cpuState.init_cpu(32768)
+            while cpuState.run_block():
+                pass
+            self.assertEqual(cpuState.x, 1)
+            self.assertEqual(cpuState.cpucycles, 2 + 4 + 2 + 2 + 7)
+            self.assertEqual(cpuState.last_instruction, 0x00)
+
+        stats = cache.stats()
+        self.assertEqual(stats.invalidations, 3)  # the STA twice, and the 2nd inject_bytes
+        self.assertEqual(stats.hits, 0)
+
+        # an unmodified loop is compiled once
+        #    8000  CA        DEX
+        #    8001  D0 FD     BNE $8000
+        #    8003  00        BRK
+        cpuState.inject_bytes(32768, [0xca, 0xd0, 0xfd, 0x00])
+        cpuState.init_cpu(32768, newx=10)
+        cache.reset_stats()
+        while cpuState.run_block():
+            pass
+        self.assertEqual(cache.stats().misses, 2)
+        self.assertEqual(cache.stats().hits, 9)
+
+        cpuState.disable_block_cache()
+        self.assertIsNone(cpuState.block_cache)
+
+    def test_run_until(self):
+        #    8000  CA        DEX
+        #    8001  D0 FD     BNE $8000
+        #    8003  E8        INX
+        #    8004  60        RTS
+        program = [0xca, 0xd0, 0xfd, 0xe8, 0x60]
+        for use_cache in (False, True):
+            cpuState = emulator_6502.Cpu6502Emulator()
+            cpuState.exit_on_empty_stack = True
+            if use_cache:
+                cpuState.enable_block_cache()
+            cpuState.inject_bytes(32768, program)
+
+            cpuState.init_cpu(32768, newx=10)
+            result = cpuState.run_until()
+            self.assertEqual(result.reason, emulator_6502.EXIT_RETURN)
+            self.assertEqual(result.instructions, 22)
+            self.assertEqual(result.cycles, cpuState.cpucycles)
+
+            cpuState.init_cpu(32768, newx=10)
+            result = cpuState.run_until(stop_ranges=((0x8003, 0x8003),))
+            self.assertEqual(result.reason, emulator_6502.EXIT_STOP_ADDRESS)
+            self.assertEqual(result.pc, 0x8003)
+            self.assertEqual(result.instructions, 20)
+
+            cpuState.init_cpu(32768, newx=10)
+            result = cpuState.run_until(max_instructions=5)
+            self.assertEqual(result.reason, emulator_6502.EXIT_INSTRUCTION_LIMIT)
+            self.assertGreaterEqual(result.instructions, 5)
+
+            cpuState.init_cpu(32768, newx=10)
+            result = cpuState.run_until(max_cycles=12)
+            self.assertEqual(result.reason, emulator_6502.EXIT_CYCLE_LIMIT)
+            self.assertGreaterEqual(result.cycles, 12)
+
+            cpuState.inject_bytes(32768, [0x00])
+            cpuState.init_cpu(32768)
+            self.assertEqual(cpuState.run_until().reason, emulator_6502.EXIT_BRK)
+
+    def test_snapshot(self):
+        cpuState = thin_c64_emulator.ThinC64Emulator()
+        cpuState.enable_block_cache()
+        cpuState.inject_bytes(32768, [0xe6, 0x02, 0x00])  # INC $02, BRK
+        cpuState.patch_kernal(0xe000, [0x42])
+        cpuState.set_mem(0xd418, 0x0f)
+        cpuState.init_cpu(32768)
+        snapshot = cpuState.snapshot()
+
+        for _ in range(2):
+            cpuState.run_until()
+        self.assertEqual(cpuState.memory[0x02], 1)  # 2nd run was from $0000
+
+        cpuState.set_mem(0x0001, 0x30)  # all RAM
+        cpuState.patch_kernal(0xe000, [0x00])
+        cpuState.restore(snapshot)
+        self.assertEqual(cpuState.pc, 32768)
+        self.assertEqual(cpuState.memory[0x02], 0)
+        self.assertEqual(cpuState.get_mem(0xe000), 0x42)
+        self.assertEqual(cpuState.get_mem(0xd418), 0x0f)
+        self.assertTrue(cpuState.see_io)
+        cpuState.run_until()
+        self.assertEqual(cpuState.memory[0x02], 1)
+
+        fork = cpuState.fork()
+        self.assertIsNot(fork.memory, cpuState.memory)
+        self.assertEqual(fork.snapshot(), pickle.loads(pickle.dumps(cpuState.snapshot())))
+
+    def test_shared_roms(self):
+        # Instances share ROM images until one patches its own
+        cpu1 = thin_c64_emulator.ThinC64Emulator()
+        cpu2 = thin_c64_emulator.ThinC64Emulator()
+        self.assertIs(cpu1.rom_kernal, cpu2.rom_kernal)
+        self.assertIs(cpu1.rom_basic, cpu2.rom_basic)
+
+        cpu1.patch_kernal(0xfff0, [0xea])
+        self.assertEqual(cpu1.get_mem(0xfff0), 0xea)
+        self.assertEqual(cpu2.get_mem(0xfff0), 0x00)
+        cpu2.patch_kernal(0xfff0, [0xea])
+        self.assertIs(cpu1.rom_kernal, cpu2.rom_kernal)
+
+        with self.assertRaises(ChiptuneSAKValueError):
+            cpu1.patch_basic(0xbfff, [0x00, 0x00])
+
+    def test_trace_hooks(self):
+        #    8000  A9 05     LDA #$05
+        #    8002  8D 18 D4  STA $D418
+        #    8005  85 02     STA $02
+        #    8007  00        BRK
+        cpuState = thin_c64_emulator.ThinC64Emulator()
+        cpuState.inject_bytes(32768, [0xa9, 0x05, 0x8d, 0x18, 0xd4, 0x85, 0x02, 0x00])
+        self.assertNotIn('runcpu', vars(cpuState))  # no hooks, no wrappers
+        self.assertNotIn('set_mem', vars(cpuState))
+
+        records, writes, io_writes = [], [], []
+        cpuState.trace_to(records.append)
+        cpuState.set_memory_write_hook(lambda loc, val: writes.append((loc, val)))
+        cpuState.set_io_write_hook(lambda loc, val: io_writes.append((loc, val)))
+        cpuState.enable_block_cache()  # traced instructions run outside of blocks
+        cpuState.init_cpu(32768)
+        cpuState.run_until()
+
+        self.assertEqual([r.pc for r in records], [0x8000, 0x8002, 0x8005, 0x8007])
+        self.assertEqual(records[1], emulator_6502.TraceRecord(2, 0x8002, 5, 0, 0, 0xff, emulator_6502.FU))
+        self.assertEqual(emulator_6502.format_trace_record(records[1]),
+                         "00000002,PC=$8002,A=$05,X=$00,Y=$00,SP=$ff,P=%00100000")
+        self.assertEqual(writes[:2], [(0xd418, 5), (0x02, 5)])  # then BRK pushes
+        self.assertEqual(io_writes, [(0xd418, 5)])
+
+        cpuState.trace_to(None)
+        cpuState.set_memory_write_hook(None)
+        cpuState.disable_block_cache()
+        self.assertNotIn('runcpu', vars(cpuState))
+        self.assertNotIn('set_mem', vars(cpuState))
+
+        with self.assertRaises(ValueError):
+            cpuState.set_mem(0x1000, 256)
+
+    def test_profile(self):
+        #    8000  A2 03     LDX #$03
+        #    8002  CA        DEX
+        #    8003  D0 FD     BNE $8002
+        #    8005  00        BRK
+        cpuState = emulator_6502.Cpu6502Emulator()
+        cpuState.inject_bytes(32768, [0xa2, 0x03, 0xca, 0xd0, 0xfd, 0x00])
+        cpuState.init_cpu(32768)
+        cpuState.enable_block_cache()  # profiled instructions run outside of blocks
+        profile = emulator_6502.ExecutionProfile()
+        cpuState.set_profile(profile)
+        cpuState.trace_to([].append)   # profile and hook can be used together
+        result = cpuState.run_until()
+
+        self.assertEqual(profile.instructions, result.instructions)
+        self.assertEqual(profile.cycles, result.cycles)
+        self.assertEqual(profile.pc_rows(), [(0x8000, 1, 2), (0x8002, 3, 6), (0x8003, 3, 8), (0x8005, 1, 7)])
+        self.assertEqual(profile.opcode_rows()[0], (0x00, 1, 7))
+        self.assertIn('$d0 bne', profile.report())
+        self.assertTrue(profile.report(limit=1).endswith('$d0 bne                   3            8  34.78'))
+        self.assertEqual(profile.dump().splitlines()[1], 'pc $8002 3 6')
+
+        cpuState.trace_to(None)
+        cpuState.set_profile(None)
+        self.assertNotIn('runcpu', vars(cpuState))
+
+    def test_lazy_flags(self):
+        cpuState = emulator_6502.Cpu6502Emulator()
+        for flags in range(256):
+            cpuState.flags = flags
+            self.assertEqual(cpuState.flags, flags | emulator_6502.FU)
+
+        # BIT can set N and Z together
+        #    8000  A9 01     LDA #$01
+        #    8002  24 02     BIT $02     ($02 holds $80)
+        #    8004  08        PHP
+        #    8005  00        BRK
+        cpuState.inject_bytes(0x02, [0x80])
+        cpuState.inject_bytes(32768, [0xa9, 0x01, 0x24, 0x02, 0x08, 0x00])
+        cpuState.init_cpu(32768)
+        cpuState.run_until()
+        expected = emulator_6502.FN | emulator_6502.FZ | emulator_6502.FU
+        self.assertEqual(cpuState.memory[0x1ff], expected | emulator_6502.FB)  # PHP
+        self.assertEqual(cpuState.flags, expected | emulator_6502.FI)  # BRK sets I
+
+    def test_adc_sbc_tables(self):
+        FC, FD, FV, FN, FZ = (emulator_6502.FC, emulator_6502.FD, emulator_6502.FV,
+                              emulator_6502.FN, emulator_6502.FZ)
+        cpuState = emulator_6502.Cpu6502Emulator()
+        # (operation, flags in, a, operand, a out, flags out)
+        cases = (('ADC', FC, 0x7f, 0x00, 0x80, FN | FV),
+                 ('ADC', 0, 0xff, 0x01, 0x00, FZ | FC),
+                 ('ADC', FD | FC, 0x58, 0x46, 0x05, FD | FC | FN | FV),  # BCD 58 + 46 + 1 = 105, N and V from $A5
+                 ('ADC', FD, 0x99, 0x01, 0x00, FD | FC | FN),  # Z from the binary sum ($9A)
+                 ('SBC', FC, 0x80, 0x01, 0x7f, FC | FV),
+                 ('SBC', FD | FC, 0x46, 0x12, 0x34, FD | FC),  # BCD 46 - 12 = 34
+                 ('SBC', FD, 0x40, 0x13, 0x26, FD | FC))       # BCD 40 - 13 - 1 = 26
+        for (op, flags_in, a, operand, a_out, flags_out) in cases:
+            cpuState.flags = flags_in
+            cpuState.a = a
+            getattr(cpuState, op)(operand)
+            self.assertEqual(cpuState.a, a_out)
+            self.assertEqual(cpuState.flags, flags_out | emulator_6502.FU)
+
+    def test_cia_timers(self):
+        cpuState = thin_c64_emulator.ThinC64Emulator()
+        cpuState.set_mem(0xdc0d, 0x7f)   # disable all cia 1 interrupts
+        cpuState.set_mem(0xdc04, 0x0f)   # timer A latch $010F
+        cpuState.set_mem(0xdc05, 0x01)
+        cpuState.set_mem(0xdc0e, 0x11)   # load and start, continuous
+        self.assertEqual(cpuState.get_cia_timer(1, 'a'), 0x010f)
+
+        cpuState.advance_clock(0x0f)
+        self.assertEqual(cpuState.get_mem(0xdc04), 0x00)
+        self.assertEqual(cpuState.get_mem(0xdc05), 0x01)
+        self.assertIsNone(cpuState.cycles_until_cia_interrupt())
+
+        # underflow without interrupts enabled is still visible in the ICR
+        cpuState.advance_clock(0x101 + 0x110 * 2)
+        self.assertFalse(cpuState.cia_interrupt_pending())
+        self.assertEqual(cpuState.get_mem(0xdc0d), 0x01)
+        self.assertEqual(cpuState.get_mem(0xdc0d), 0x00)  # reading acknowledges it
+        self.assertEqual(cpuState.get_mem(0xdc04) | (cpuState.get_mem(0xdc05) << 8), 0x010f)
+
+        cpuState.set_mem(0xdc0d, 0x81)   # enable timer A interrupts
+        self.assertEqual(cpuState.cycles_until_cia_interrupt(), 0x0110)
+        cpuState.advance_clock(0x0110)
+        self.assertTrue(cpuState.cia_interrupt_pending())
+        self.assertEqual(cpuState.get_mem(0xdc0d), 0x81)
+
+        # the clock keeps running across init_cpu() calls; cpucycles doesn't
+        cpuState.inject_bytes(0x8000, [0xea, 0xea, 0x00])  # NOP, NOP, BRK
+        cpuState.init_cpu(0x8000)
+        cpuState.runcpu()
+        cpuState.runcpu()
+        self.assertEqual(cpuState.cycles_until_cia_interrupt(), 0x0110 - 4)
+        cpuState.init_cpu(0x8000)
+        self.assertEqual(cpuState.cycles_until_cia_interrupt(), 0x0110 - 4)
+
+        snapshot = cpuState.snapshot()
+        cpuState.set_mem(0xdc0e, 0x00)   # stop timer A
+        self.assertIsNone(cpuState.cycles_until_cia_interrupt())
+        cpuState.restore(snapshot)
+        self.assertEqual(cpuState.cycles_until_cia_interrupt(), 0x0110 - 4)
+
+        # one-shot timers stop after underflowing, reloaded from the latch
+        cpuState.set_mem(0xdd06, 0x10)   # cia 2 timer B latch $0010
+        cpuState.set_mem(0xdd07, 0x00)
+        cpuState.set_mem(0xdd0d, 0x82)
+        cpuState.set_mem(0xdd0f, 0x19)   # load and start, one-shot
+        cpuState.advance_clock(0x100)
+        self.assertTrue(cpuState.cia_interrupt_pending(2))
+        self.assertIsNone(cpuState.cycles_until_cia_interrupt(2))
+        self.assertEqual(cpuState.get_mem(0xdd06), 0x10)
+
+    # @unittest.skip("Skipping this test for now")
+    def test_c64_banking(self):
+        cpuState = thin_c64_emulator.ThinC64Emulator()
+        cpuState.patch_kernal(0xe000, [0x4c])
+
+        # writes under ROM go to RAM, reads see the ROM while it's banked in
+        cpuState.set_mem(0xe000, 0x12)
+        self.assertEqual(cpuState.get_mem(0xe000), 0x4c)
+        cpuState.set_mem(0x0001, 0b00110101)  # KERNAL out, I/O still in
+        self.assertEqual(cpuState.get_mem(0xe000), 0x12)
+
+        # I/O area: SID registers, their mirrors, and unsettable locations
+        cpuState.set_mem(0xd418, 0x77)
+        cpuState.set_mem(0xd438, 0x55)
+        self.assertEqual(cpuState.get_mem(0xd418), 0x77)
+        self.assertEqual(cpuState.get_mem(0xd458), 0x55)
+        cpuState.set_mem(0xd41d, 0x00)
+        self.assertEqual(cpuState.get_mem(0xd41d), 0xff)
+
+        cpuState.set_mem(0x0001, 0b00110100)  # all RAM
+        self.assertEqual(cpuState.get_mem(0xd418), 0x00)
+        cpuState.set_mem(0xd418, 0x33)
+        cpuState.set_mem(0x0001, 0b00110111)
+        self.assertEqual(cpuState.get_mem(0xd418), 0x77)
+        self.assertEqual(cpuState.memory[0xd418], 0x33)
+
     # @unittest.skip("Debugging, so skipping this test for now")
     def test_obfuscated_sig(self):
         # Emulate the ML portion of my lemon64 signature
@@ -0,0 +1,244 @@
+# Emulator throughput benchmark
+#
+# Runs fixed slices of a set of Wolfgang Lorenz test binaries and Klaus Dormann's BCD
+# test, and a few SID imports, and reports wall time, instructions/sec, and cycles/sec
+# per workload as JSON.  Instruction and cycle counts are deterministic, so a change in
+# them means the emulation itself changed, not just its speed.
+#
+# to run:  python benchmark.py                          (prints JSON results)
+#          python benchmark.py --save-baseline base.json
+#          python benchmark.py --baseline base.json      (exit code 1 on a regression)
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from chiptunesak import emulator_6502
+from chiptunesak import thin_c64_emulator
+from chiptunesak import sid
+from chiptunesak.byte_util import read_binary_file
+from chiptunesak.constants import project_to_absolute_path
+from chiptunesak.errors import ChiptuneSAKValueError
+
+# Lorenz tests with a good mix of addressing modes, ALU ops, branches, and the stack
+WL_WORKLOADS = ('adcax', 'andiy', 'aslzx', 'bccr', 'cmpa', 'incax', 'ldaiy', 'rolax',
+                'sbciy', 'tsxn')
+
+# the whole tests take minutes, so each runs for a fixed number of instructions
+WL_MAX_INSTRUCTIONS = 1000000
+BCD_MAX_INSTRUCTIONS = 2000000
+
+# (filename, subtune, seconds)
+SID_WORKLOADS = (
+    ('tests/data/Defender_of_the_Crown.sid', 0, 20),
+    ('tests/data/vibratotest.sid', 0, 10),
+)
+
+DEFAULT_TOLERANCE = 0.10  # allowed fractional drop in instructions/sec vs. the baseline
+
+
+def run_wl(file_name, block_cache):
+    """
+    Runs one Wolfgang Lorenz test binary, until it finishes or WL_MAX_INSTRUCTIONS
+
+    :return: instructions executed, cycles executed
+    :rtype: (int, int)
+    """
+    cpuState = thin_c64_emulator.ThinC64Emulator()
+    if block_cache:
+        cpuState.enable_block_cache()
+
+    # same environment as tests.py, see comments there
+    cpuState.patch_kernal(59953, [0x4c, 0x81, 0xea])  # $EA31 jumps to $EA81 exit
+    for rts_loc in (65490, 65091, 64738, 65095, 65126, 58260, 58235):
+        cpuState.patch_kernal(rts_loc, [0x60])
+    cpuState.patch_kernal(0xffe4, [0xa9, 0x20, 0x60])  # GETIN returns a space
+    cpuState.patch_basic(0xa002, [0x00, 0x80])
+
+    test_prg = read_binary_file(
+        project_to_absolute_path('tests/emulatorTests/wolfgangLorenzTestsBin/' + file_name))
+    cpuState.inject_bytes(2049, test_prg[2:])
+    cpuState.init_cpu(2070)
+    cpuState.exit_on_empty_stack = False
+    cpuState.sp = 0xf6
+
+    # test is done when it tries to load the next one ($E16F)
+    result = cpuState.run_until(stop_ranges=((57711, 57711),), max_instructions=WL_MAX_INSTRUCTIONS)
+    return result.instructions, result.cycles
+
+
+def run_bcd(block_cache):
+    cpuState = emulator_6502.Cpu6502Emulator()
+    if block_cache:
+        cpuState.enable_block_cache()
+    cpuState.exit_on_empty_stack = True
+    test_prg = read_binary_file(project_to_absolute_path(
+        'tests/emulatorTests/klausDormannTestsBin/6502_decimal_test.bin'))
+    cpuState.inject_bytes(0, test_prg)
+    cpuState.init_cpu(0x200)
+    result = cpuState.run_until(max_instructions=BCD_MAX_INSTRUCTIONS)
+    return result.instructions, result.cycles
+
+
+def run_sid(filename, subtune, seconds, block_cache):
+    importer = sid.SidImport(block_cache=block_cache)
+    cpuState = importer.cpu_state
+    totals = [0, 0]
+    run_until = cpuState.run_until
+
+    def counting_run_until(*args, **kwargs):
+        result = run_until(*args, **kwargs)
+        totals[0] += result.instructions
+        totals[1] += result.cycles
+        return result
+
+    cpuState.run_until = counting_run_until
+    importer.import_sid(project_to_absolute_path(filename), subtune=subtune, seconds=seconds,
+                        verbose=False)
+    return totals[0], totals[1]
+
+
+def get_workloads():
+    """
+    Get the benchmark workloads
+
+    :return: (name, callable taking block_cache and returning (instructions, cycles)) pairs
+    :rtype: list of tuples
+    """
+    workloads = [('wl_' + name, lambda block_cache, name=name: run_wl(name, block_cache))
+                 for name in WL_WORKLOADS]
+    workloads.append(('bcd', run_bcd))
+    for (filename, subtune, seconds) in SID_WORKLOADS:
+        name = 'sid_%s_%d' % (filename.split('/')[-1].rsplit('.', 1)[0], subtune)
+        workloads.append(
+            (name, lambda block_cache, f=filename, st=subtune, s=seconds: run_sid(f, st, s, block_cache)))
+    return workloads
+
+
+def run_benchmark(repeat=3, block_cache=False, only=None):
+    """
+    Runs the benchmark workloads, keeping the fastest of repeated runs
+
+    :param repeat: runs per workload
+    :type repeat: int
+    :param block_cache: if True, run with the emulator's block cache enabled
+    :type block_cache: bool
+    :param only: workload names to run, defaults to None (all of them)
+    :type only: list of str, optional
+    :return: benchmark results, ready for json
+    :rtype: dict
+    """
+    thin_c64_emulator.ThinC64Emulator()  # load the shared ROMs and ALU tables before timing
+
+    results = {}
+    for name, workload in get_workloads():
+        if only and name not in only:
+            continue
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            instructions, cycles = workload(block_cache)
+            seconds = time.perf_counter() - start
+            if best is None or seconds < best:
+                best = seconds
+        results[name] = {
+            'instructions': instructions,
+            'cycles': cycles,
+            'wall_seconds': round(best, 4),
+            'instructions_per_sec': round(instructions / best),
+            'cycles_per_sec': round(cycles / best),
+        }
+    return {
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'block_cache': block_cache,
+        'repeat': repeat,
+        'workloads': results,
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares benchmark results to a baseline
+
+    :param results: results from run_benchmark()
+    :type results: dict
+    :param baseline: earlier results from run_benchmark()
+    :type baseline: dict
+    :param tolerance: allowed fractional drop in instructions/sec
+    :type tolerance: float
+    :return: descriptions of regressions (empty if none)
+    :rtype: list of str
+    :raises ChiptuneSAKValueError: if the results and baseline were run with different
+                                   block_cache settings
+    """
+    # The block cache runs whole blocks, overshooting instruction budgets, so its counts and
+    # throughput aren't comparable to the interpreter's
+    if results['block_cache'] != baseline.get('block_cache', False):
+        raise ChiptuneSAKValueError("block_cache is %s, but the baseline was run with block_cache %s"
+                                    % (results['block_cache'], baseline.get('block_cache', False)))
+
+    regressions = []
+    for name, result in results['workloads'].items():
+        base = baseline['workloads'].get(name)
+        if base is None:
+            continue
+        if (result['instructions'], result['cycles']) != (base['instructions'], base['cycles']):
+            regressions.append("%s: executed %d instructions / %d cycles, baseline %d / %d"
+                               % (name, result['instructions'], result['cycles'],
+                                  base['instructions'], base['cycles']))
+        ratio = result['instructions_per_sec'] / base['instructions_per_sec']
+        result['vs_baseline'] = round(ratio, 3)
+        if ratio < 1 - tolerance:
+            regressions.append("%s: %d instructions/sec, %.1f%% slower than baseline %d"
+                               % (name, result['instructions_per_sec'], (1 - ratio) * 100,
+                                  base['instructions_per_sec']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark 6502/C64 emulator throughput.")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per workload, fastest kept (default = 3)')
+    parser.add_argument('-c', '--block-cache', action='store_true', help='enable the block cache')
+    parser.add_argument('-w', '--workload', action='append', help='run only this workload (repeatable)')
+    parser.add_argument('-b', '--baseline', help='baseline JSON file to check for regressions')
+    parser.add_argument('-t', '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed fractional slowdown vs. baseline (default = %.2f)' % DEFAULT_TOLERANCE)
+    parser.add_argument('-s', '--save-baseline', help='write results to this baseline JSON file')
+    parser.add_argument('-l', '--list', action='store_true', help='list the workloads and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(name for name, _ in get_workloads()))
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('block_cache', False) != args.block_cache:  # checked before the long run
+            print("error: can't compare to %s, it was run with block_cache %s"
+                  % (args.baseline, baseline.get('block_cache', False)), file=sys.stderr)
+            return 2
+
+    results = run_benchmark(args.repeat, args.block_cache, args.workload)
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        results['regressions'] = regressions
+
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    for regression in regressions:
+        print("REGRESSION: " + regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,7 @@
 # Also runs Klaus Dormann's ADC/SBC BCD tests (public domain)
 #
 # to run: python -m unittest -v tests
+# (for emulator speed rather than correctness, see benchmark.py)
 
 import unittest
 import string
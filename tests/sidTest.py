@@ -1,7 +1,16 @@
 import unittest
+import zlib
 import chiptunesak
-from chiptunesak.sid import SID, SidImport
-from chiptunesak.constants import project_to_absolute_path, CONCERT_A, freq_arch_to_midi_num
+from chiptunesak.sid import SID, SidImport, IoWriteLog, CaptureCache, FRAME_BYTES_PER_CHIP, MAX_INSTR, MAX_CYCLES, \
+    get_note_table
+from chiptunesak.constants import project_to_absolute_path, CONCERT_A, freq_arch_to_midi_num, freq_arch_to_freq
+from chiptunesak.errors import ChiptuneSAKContentError
+
+
+def row_values(rows):
+    # everything in the rows, for comparing rows derived different ways
+    return [(row.play_call_num, row.milliframe_num, [vars(chip) for chip in row.chips],
+             [vars(chn) for chip in row.chips for chn in chip.channels]) for row in rows]
 
 
 class sidTests(unittest.TestCase):
@@ -124,6 +133,17 @@ class sidTests(unittest.TestCase):
         return len(unique_notes) == 1
 
     # @unittest.skip("Skipping this test for now")
+    def test_note_table(self):
+        for arch in ('NTSC-C64', 'PAL-C64'):
+            for tuning in (CONCERT_A, 448.973):
+                note_table = get_note_table(arch, tuning)
+                self.assertIs(note_table, get_note_table(arch, tuning))
+                self.assertEqual(note_table.midi_nums[0], -1)
+                for freq_arch in range(1, 0x10000, 7):
+                    self.assertEqual((note_table.midi_nums[freq_arch], note_table.cents[freq_arch]),
+                                     freq_arch_to_midi_num(freq_arch, arch, tuning))
+                    self.assertEqual(note_table.freqs[freq_arch], freq_arch_to_freq(freq_arch, arch))
+
     def test_vibrato_handling(self):
         # test vibrato handling on notes with increasingly higher amplitudes
 
@@ -259,6 +279,251 @@ class sidTests(unittest.TestCase):
             self.assertTrue(
                 milliframe_indexed_rows[exp_note[0]][exp_note[1]].note_num == exp_note[2])
 
+    def test_convert_from_frames(self):
+        # Converting without a capture() keeps just the frames, for later conversions, and
+        # gives the same results as converting a capture
+        def rchirp_values(rchirp_song):
+            return [[(r.row_num, r.milliframe_num, r.note_num, r.gate) for r in voice.sorted_rows]
+                    for voice in rchirp_song.voices]
+
+        for gcf_row_reduce in (True, False):
+            captured = SID()
+            captured.set_options(sid_in_filename=self.sid_filename, subtune=2, seconds=2,
+                                 gcf_row_reduce=gcf_row_reduce, verbose=False)
+            captured.capture()
+            expected_csv = project_to_absolute_path('tests/temp/framesTestCaptured.csv')
+            captured.to_csv_file(expected_csv)
+
+            sid = SID()
+            rchirp_song = sid.to_rchirp(self.sid_filename, subtune=2, seconds=2,
+                                        gcf_row_reduce=gcf_row_reduce, verbose=False)
+            self.assertEqual(rchirp_values(rchirp_song), rchirp_values(captured.to_rchirp(self.sid_filename)))
+            self.assertEqual(sid.sid_dump.rows, [])
+            self.assertEqual(len(sid.sid_dump.frames), FRAME_BYTES_PER_CHIP * len(sid.sid_dump.play_cycles))
+
+            frames_csv = project_to_absolute_path('tests/temp/framesTest.csv')
+            sid.to_csv_file(frames_csv)  # from the kept frames
+            with open(frames_csv) as f, open(expected_csv) as expected_f:
+                self.assertEqual(f.read(), expected_f.read())
+
+    # @unittest.skip("Skipping this test for now")
+    def test_block_cache_capture(self):
+        # Capturing through the basic-block cache must match the interpreter
+        dumps = []
+        for block_cache in (False, True):
+            importer = SidImport(block_cache=block_cache)
+            dumps.append(importer.import_sid(self.sid_filename, subtune=2, seconds=2, verbose=False))
+
+        self.assertEqual(row_values(dumps[0].rows), row_values(dumps[1].rows))
+        self.assertEqual(dumps[0].raw_freqs, dumps[1].raw_freqs)
+        self.assertGreater(importer.block_cache.stats().hits, 0)
+
+    # @unittest.skip("Skipping this test for now")
+    def test_subtune_reimport(self):
+        # Reusing an importer for other subtunes of the same file must match a fresh import
+        reused = SidImport()
+        for subtune in (2, 0, 2):
+            fresh_dump = SidImport().import_sid(self.sid_filename, subtune=subtune, seconds=2, verbose=False)
+            reused_dump = reused.import_sid(self.sid_filename, subtune=subtune, seconds=2, verbose=False)
+            self.assertEqual(reused_dump.raw_freqs, fresh_dump.raw_freqs)
+            self.assertEqual(reused_dump.play_cycles, fresh_dump.play_cycles)
+        self.assertEqual(reused.loaded_sid.filename, self.sid_filename)
+
+    # @unittest.skip("Skipping this test for now")
+    def test_call_budgets(self):
+        # One cycle count per play call, all within a frame's worth of cycles
+        importer = SidImport()
+        sid_dump = importer.import_sid(self.sid_filename, seconds=1, verbose=False)
+        self.assertGreater(sid_dump.init_cycles, 0)
+        self.assertEqual(len(sid_dump.play_cycles), importer.play_call_num)
+        self.assertTrue(all(0 < cycles < 20000 for cycles in sid_dump.play_cycles))
+
+        for kwargs in (dict(max_instructions=100), dict(max_cycles=1000)):
+            importer = SidImport(**kwargs)
+            with self.assertRaises(ChiptuneSAKContentError):
+                importer.import_sid(self.sid_filename, seconds=1, verbose=False)
+
+    def test_stream_sid(self):
+        # Streamed rows must match imported rows, without being kept in the dump
+        imported_dump = SidImport().import_sid(self.sid_filename, subtune=2, seconds=2, verbose=False)
+        (streamed_dump, rows) = SidImport().stream_sid(self.sid_filename, subtune=2, seconds=2, verbose=False)
+        self.assertEqual(streamed_dump.play_cycles, [])  # nothing played yet
+        self.assertEqual(row_values(rows), row_values(imported_dump.rows))
+        self.assertEqual(streamed_dump.rows, [])
+        self.assertEqual(streamed_dump.raw_freqs, [])
+        self.assertEqual(streamed_dump.play_cycles, imported_dump.play_cycles)
+
+    def test_register_frames(self):
+        # Rows derived again from the captured register frames must match the imported rows
+        importer = SidImport()
+        sid_dump = importer.import_sid(self.sid_filename, subtune=2, seconds=2, verbose=False)
+        self.assertEqual(len(sid_dump.frames), FRAME_BYTES_PER_CHIP * len(sid_dump.play_cycles))
+
+        rows = list(importer.derive_rows(sid_dump, sid_dump.iter_frames()))
+        self.assertEqual(row_values(rows), row_values(sid_dump.rows))
+        self.assertEqual(len(sid_dump.raw_freqs), 3 * len(sid_dump.play_cycles))
+
+    def test_derive_all_rows(self):
+        # Vectorized derivation must match row-by-row derivation for every option
+        importer = SidImport()
+        filename = project_to_absolute_path('tests/data/vibratotest.sid')
+        sid_dump = importer.import_sid(filename, seconds=4, verbose=False)
+        options = ((0, True, True, False), (40, True, True, False), (89, False, False, True),
+                   (20, True, False, False))
+        for (margin, gate_off_notes, assert_gate, always_freq) in options:
+            rows = importer.derive_all_rows(sid_dump, margin, gate_off_notes, assert_gate, always_freq)
+            expected = importer.derive_rows(sid_dump, sid_dump.iter_frames(), margin, gate_off_notes,
+                                            assert_gate, always_freq)
+            self.assertEqual(row_values(rows), row_values(expected))
+
+    def test_io_write_log(self):
+        io_writes = IoWriteLog()
+        for (loc, val, cycle) in ((0xd404, 0x41, 10), (0xdc0e, 0x01, 14), (0xd404, 0x40, 20),
+                                  (0xd40b, 0x21, 26), (0xdc04, 0x25, 30)):
+            io_writes.record(loc, val, cycle)
+
+        self.assertEqual(len(io_writes), 5)
+        self.assertEqual(list(io_writes)[:2], [(0xd404, 0x41), (0xdc0e, 0x01)])
+        self.assertEqual(io_writes.values_written(0xd404), [0x41, 0x40])
+        self.assertEqual(io_writes.values_written(0xd412), [])
+        self.assertEqual(io_writes.writes_to((0xdc04, 0xdc0e)), [(0xdc0e, 0x01, 14), (0xdc04, 0x25, 30)])
+        # gate toggled on then off on voice 1, only on for voice 2, not written for voice 3
+        self.assertTrue(io_writes.bit_was_written(0xd404, 0b00000001, True))
+        self.assertTrue(io_writes.bit_was_written(0xd404, 0b00000001, False))
+        self.assertTrue(io_writes.bit_was_written(0xd40b, 0b00000001, True))
+        self.assertFalse(io_writes.bit_was_written(0xd40b, 0b00000001, False))
+        self.assertFalse(io_writes.bit_was_written(0xd412, 0b00000001, True))
+        self.assertFalse(io_writes.bit_was_written(0xd412, 0b00000001, False))
+
+        io_writes.clear()
+        self.assertEqual((len(io_writes), io_writes.values_written(0xd404)), (0, []))
+
+    def test_auto_seconds(self):
+        # A PSID whose play routine gates voice 1 on and off in an 8 play call cycle, forever
+        init = bytes([0xa9, 0x0f, 0x8d, 0x18, 0xd4, 0xa9, 0x00, 0x85, 0xf0, 0x8d, 0x05, 0xd4, 0xa9, 0xf0,
+                      0x8d, 0x06, 0xd4, 0xa9, 0x1c, 0x8d, 0x01, 0xd4, 0x60])
+        play = bytes([0xa6, 0xf0, 0xe8, 0x8a, 0x29, 0x07, 0x85, 0xf0, 0xd0, 0x05, 0xa9, 0x11, 0x8d, 0x04,
+                      0xd4, 0xa5, 0xf0, 0xc9, 0x04, 0xd0, 0x05, 0xa9, 0x10, 0x8d, 0x04, 0xd4, 0x60])
+        header = bytearray(0x7c)
+        header[0:18] = b'PSID' + bytes([0, 2, 0, 0x7c, 0x10, 0x00, 0x10, 0x00, 0x10, 0x20, 0, 1, 0, 1])
+        loop_filename = project_to_absolute_path('tests/temp/autoLoopTest.sid')
+        with open(loop_filename, 'wb') as f:
+            f.write(bytes(header) + init.ljust(0x20, b'\0') + play)
+
+        importer = SidImport()
+        sid_dump = importer.import_sid(loop_filename, seconds='auto', verbose=False)
+        self.assertEqual(sid_dump.end_reason, 'loop')
+        self.assertEqual(len(sid_dump.play_cycles) - sid_dump.loop_play_call, 8)
+
+        # the vibrato test ends, and the silence after it isn't captured
+        sid_dump = importer.import_sid(
+            project_to_absolute_path('tests/data/vibratotest.sid'), seconds='auto', verbose=False)
+        self.assertEqual(sid_dump.end_reason, 'silence')
+        self.assertIsNone(sid_dump.loop_play_call)
+        self.assertEqual(len(sid_dump.frames), FRAME_BYTES_PER_CHIP * len(sid_dump.play_cycles))
+        self.assertLess(len(sid_dump.play_cycles), 10 * 60)
+
+        sid_dump = importer.import_sid(loop_filename, seconds=1, verbose=False)
+        self.assertEqual(sid_dump.end_reason, 'seconds')
+        self.assertGreater(len(sid_dump.play_cycles), 12)
+
+    def test_auto_seconds_loop(self):
+        # Defender of the Crown's subtune 10 loops back, and a longer capture repeats from there
+        importer = SidImport()
+        sid_dump = importer.import_sid(self.sid_filename, subtune=10, seconds='auto', verbose=False)
+        self.assertEqual(sid_dump.end_reason, 'loop')
+        (loop_start, loop_end) = (sid_dump.loop_play_call, len(sid_dump.play_cycles))
+        self.assertEqual((loop_start, loop_end), (125, 221))
+
+        longer_dump = importer.import_sid(self.sid_filename, subtune=10, seconds=7, verbose=False)
+        frames = longer_dump.frames
+        self.assertGreater(len(longer_dump.play_cycles), 2 * loop_end - loop_start)
+        self.assertEqual(frames[:loop_end * FRAME_BYTES_PER_CHIP], sid_dump.frames)
+        self.assertEqual(frames[loop_end * FRAME_BYTES_PER_CHIP:(2 * loop_end - loop_start) * FRAME_BYTES_PER_CHIP],
+                         frames[loop_start * FRAME_BYTES_PER_CHIP:loop_end * FRAME_BYTES_PER_CHIP])
+
+    def test_capture_subtunes(self):
+        sid = SID()
+        sid.set_options(sid_in_filename=self.sid_filename, seconds=1, verbose=False)
+        results = sid.capture_subtunes([2, 1], processes=2, to_rchirp=True)
+        self.assertEqual([result.subtune for result in results], [2, 1])
+        for result in results:
+            self.assertIsNone(result.error)
+            sid_dump = SidImport().import_sid(self.sid_filename, subtune=result.subtune, seconds=1, verbose=False)
+            self.assertEqual(result.sid_dump.frames, sid_dump.frames)
+            self.assertEqual(len(result.rchirp_song.voices), 3)
+
+        # a failed capture doesn't stop the others
+        sid.set_options(max_cycles=1000)
+        results = sid.capture_subtunes([0, 1], processes=1)
+        self.assertTrue(all(isinstance(result.error, ChiptuneSAKContentError) for result in results))
+        self.assertIsNone(results[0].sid_dump)
+
+    def test_capture_cache(self):
+        cache = CaptureCache(project_to_absolute_path('tests/temp/captureCache'))
+        cache.clear()
+        sid_dump = SidImport(capture_cache=cache).import_sid(self.sid_filename, subtune=2, seconds=2, verbose=False)
+        self.assertEqual((cache.stats().entries, cache.misses, cache.stores), (1, 1, 1))
+
+        # a cached capture gives the same rows, with other derivation settings too
+        cached_dump = SidImport(capture_cache=cache).import_sid(self.sid_filename, subtune=2, seconds=2,
+                                                                verbose=False)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cached_dump.frames, sid_dump.frames)
+        self.assertEqual(cached_dump.play_cycles, sid_dump.play_cycles)
+        self.assertEqual(row_values(cached_dump.rows), row_values(sid_dump.rows))
+        (_, rows) = SidImport(capture_cache=cache).stream_sid(self.sid_filename, subtune=2, seconds=2,
+                                                              vibrato_cents_margin=40, verbose=False)
+        expected = SidImport().import_sid(self.sid_filename, subtune=2, seconds=2, vibrato_cents_margin=40,
+                                          verbose=False)
+        self.assertEqual(row_values(rows), row_values(expected.rows))
+        self.assertEqual(cache.hits, 2)
+
+        # an entry that can't be unpickled (here, naming a module that doesn't exist) is a miss
+        key = cache.make_key(SidImport().load_sid(self.sid_filename).digest, 2, 2, None, MAX_INSTR, MAX_CYCLES)
+        with open(cache.entry_filename(key), 'wb') as f:
+            f.write(zlib.compress(b'\x80\x04cno_such_module\nDump\n.'))
+        SidImport(capture_cache=cache).import_sid(self.sid_filename, subtune=2, seconds=2, verbose=False)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        # other capture settings miss, and the least recently used entries get evicted
+        SidImport(capture_cache=cache).import_sid(self.sid_filename, subtune=2, seconds=1, verbose=False)
+        self.assertEqual((cache.misses, cache.stats().entries), (3, 2))
+        cache.max_bytes = cache.stats().size_bytes - 1
+        SidImport(capture_cache=cache).import_sid(self.sid_filename, subtune=1, seconds=1, verbose=False)
+        stats = cache.stats()
+        self.assertLessEqual(stats.size_bytes, cache.max_bytes)
+        self.assertGreater(stats.evictions, 0)
+        cache.clear()
+        self.assertEqual(cache.stats().entries, 0)
+
+    def test_profile(self):
+        importer = SidImport(profile=True)
+        sid_dump = importer.import_sid(self.sid_filename, seconds=1, verbose=False)
+        self.assertEqual(sid_dump.profile.cycles, sid_dump.init_cycles + sum(sid_dump.play_cycles))
+        self.assertIsNone(SidImport().import_sid(self.sid_filename, seconds=1, verbose=False).profile)
+
+    def test_auto_tuning(self):
+        # One pass with tuning='auto' must match measuring the tuning, then importing with it
+        importer = SidImport(tuning='auto')
+        sid_dump = importer.import_sid(self.sid_filename, seconds=4, vibrato_cents_margin=10, verbose=False)
+        (tuning, min_cents, max_cents) = self.sid_dump.get_tuning()
+        self.assertEqual(sid_dump.tuning, tuning)
+        self.assertEqual(importer.tuning, CONCERT_A)  # each import gets its own estimate
+        self.assertEqual(sid_dump.tuning_histogram.cents_range(), (min_cents, max_cents))
+        expected = SidImport(tuning=tuning).import_sid(self.sid_filename, seconds=4, vibrato_cents_margin=10,
+                                                       verbose=False)
+        self.assertEqual(row_values(sid_dump.rows), row_values(expected.rows))
+
+        (streamed_dump, rows) = SidImport(tuning='auto').stream_sid(self.sid_filename, seconds=4,
+                                                                    vibrato_cents_margin=10, verbose=False)
+        self.assertEqual(streamed_dump.tuning, tuning)
+        self.assertEqual(row_values(rows), row_values(expected.rows))
+
+        sid = SID()
+        sid.set_options(sid_in_filename=self.sid_filename, seconds=4, tuning='auto', verbose=False)
+        self.assertAlmostEqual(sid.capture().tuning, tuning)
+
     # @unittest.skip("Skipping this test for now")
     def test_tuning(self):
         # Measure tunings from a set of notes, then using that tuning, measure that the
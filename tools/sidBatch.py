@@ -0,0 +1,365 @@
+# Batch convert every SID in an HVSC zip file (or a directory tree) to midi and/or csv files
+#
+# Each SID's headers are parsed, and its default subtune (or all of them) captured and
+# converted, across a pool of worker processes.  A SID that takes longer than the timeout
+# has its worker killed and replaced.  Every finished file is recorded in a SQLite job
+# ledger, so running the same command again resumes an interrupted batch where it stopped.
+#
+# e.g.:  python sidBatch.py ../res/HVSC72.zip -o hvsc_out -f mid -f csv -j 8
+#        python sidBatch.py ../res/HVSC72.zip -o hvsc_out --report    (just the ledger's stats)
+#        python sidBatch.py ../res/HVSC72.zip -o hvsc_csv -f csv -C capture_cache   (reuses captures)
+
+import argparse
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import sqlite3
+import time
+import zipfile
+
+from chiptunesak import sid
+from chiptunesak import midi
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'    # at least one subtune (or the file itself) failed
+STATUS_TIMEOUT = 'timeout'  # worker killed after the per-file timeout
+
+POLL_SECONDS = 0.5
+WORKER_READY = 'ready'  # sent by a worker process once it's set up, before its first job
+
+
+class SidSource:
+    """
+    The SID files in an HVSC zip file or a directory tree, by relative path
+    """
+    def __init__(self, source):
+        self.source = source
+        self.zip_file = zipfile.ZipFile(source, 'r') if zipfile.is_zipfile(source) else None
+
+    def paths(self):
+        if self.zip_file is not None:
+            return sorted(fn for fn in self.zip_file.namelist() if fn.lower().endswith('.sid'))
+        paths = []
+        for (dir_path, _, filenames) in os.walk(self.source):
+            paths.extend(os.path.relpath(os.path.join(dir_path, fn), self.source).replace(os.sep, '/')
+                         for fn in filenames if fn.lower().endswith('.sid'))
+        return sorted(paths)
+
+    def read(self, path):
+        if self.zip_file is not None:
+            return self.zip_file.read(path)
+        with open(os.path.join(self.source, path), 'rb') as f:
+            return f.read()
+
+    def close(self):
+        if self.zip_file is not None:
+            self.zip_file.close()
+
+
+class JobLedger:
+    """
+    SQLite record of each SID file's conversion status
+    """
+    def __init__(self, filename):
+        self.db = sqlite3.connect(filename)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " path TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " subtunes INTEGER,"      # subtunes captured
+            " play_calls INTEGER,"    # play calls emulated, across those subtunes
+            " seconds REAL,"          # wall time
+            " error TEXT,"
+            " finished_at REAL)")
+        self.db.commit()
+
+    def add_jobs(self, paths):
+        self.db.executemany("INSERT OR IGNORE INTO jobs (path, status) VALUES (?, ?)",
+                            ((path, STATUS_PENDING) for path in paths))
+        self.db.commit()
+
+    def pending(self, retry_failed=False):
+        statuses = (STATUS_PENDING, STATUS_FAILED, STATUS_TIMEOUT) if retry_failed else (STATUS_PENDING,)
+        return [row[0] for row in self.db.execute(
+            "SELECT path FROM jobs WHERE status IN (%s) ORDER BY path" % ','.join('?' * len(statuses)),
+            statuses)]
+
+    def record(self, result):
+        self.db.execute(
+            "UPDATE jobs SET status = ?, subtunes = ?, play_calls = ?, seconds = ?, error = ?, finished_at = ?"
+            " WHERE path = ?",
+            (result['status'], result['subtunes'], result['play_calls'], result['seconds'],
+             result['error'], time.time(), result['path']))
+        self.db.commit()  # committed per file, so an interrupted batch loses nothing finished
+
+    def status_counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def totals(self):
+        return self.db.execute(
+            "SELECT COALESCE(SUM(play_calls), 0), COALESCE(SUM(seconds), 0) FROM jobs WHERE status != ?",
+            (STATUS_PENDING,)).fetchone()
+
+    def common_errors(self, limit=10):
+        # one count per error line, without its subtune prefix
+        errors = collections.Counter()
+        for (error,) in self.db.execute("SELECT error FROM jobs WHERE error IS NOT NULL"):
+            for line in error.split('\n'):
+                if line.startswith('subtune '):
+                    line = line.split(': ', 1)[-1]
+                errors[line] += 1
+        return errors.most_common(limit)
+
+    def close(self):
+        self.db.close()
+
+
+def convert_sid(sid_in, importer, path, sid_binary, options):
+    """
+    Capture and convert one SID file's subtunes (runs in a worker process)
+
+    :return: the job result, for JobLedger.record()
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    result = dict(path=path, status=STATUS_DONE, subtunes=0, play_calls=0, error=None)
+    errors = []
+    try:
+        sid_file = importer.load_sid(path, sid_binary).sid_file
+        if options['all_subtunes']:
+            subtunes = range(sid_file.num_subtunes)
+        else:
+            subtunes = [sid_file.start_song - 1]
+    except Exception as error:
+        errors.append('%s: %s' % (type(error).__name__, error))
+        subtunes = []
+
+    out_filename_base = os.path.join(options['out_dir'], os.path.splitext(path)[0])
+    for subtune in subtunes:
+        try:
+            sid_dump = importer.import_sid(path, subtune=subtune, seconds=options['seconds'],
+                                           vibrato_cents_margin=options['vibrato_cents_margin'], verbose=False)
+            out_filename_no_ext = '%s_%d' % (out_filename_base, subtune)
+            os.makedirs(os.path.dirname(out_filename_no_ext) or '.', exist_ok=True)
+            sid_in.set_options(sid_in_filename=path)
+            sid_in.sid_dump = sid_dump
+            if 'mid' in options['formats']:
+                chirp_song = sid_in.to_rchirp(path).to_chirp()
+                midi.MIDI().to_file(chirp_song, out_filename_no_ext + '.mid')
+            if 'csv' in options['formats']:
+                sid_in.to_csv_file(out_filename_no_ext + '.csv')
+            result['subtunes'] += 1
+            result['play_calls'] += len(sid_dump.play_cycles)
+        except Exception as error:
+            errors.append('subtune %d: %s: %s' % (subtune, type(error).__name__, error))
+        finally:
+            sid_in.sid_dump = None
+
+    if errors:
+        result['status'] = STATUS_FAILED
+        result['error'] = '\n'.join(errors)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_worker(conn, options):
+    """
+    Worker process loop: sends WORKER_READY, then receives (path, sid_binary) jobs and sends
+    back results, stopping on None
+    """
+    sid_in = sid.SID()
+    capture_cache = None
+    if options['cache_dir'] is not None:
+        capture_cache = sid.CaptureCache(options['cache_dir'], options['cache_mb'] * 1024 * 1024)
+    sid_in.set_options(verbose=False, block_cache=options['block_cache'], tuning=options['tuning'],
+                       auto_max_seconds=options['auto_max_seconds'], capture_cache=capture_cache)
+    importer = sid_in.new_importer()
+    conn.send(WORKER_READY)
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        (path, sid_binary) = job
+        conn.send(convert_sid(sid_in, importer, path, sid_binary, options))
+
+
+class Worker:
+    def __init__(self, options):
+        (self.conn, child_conn) = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_worker, args=(child_conn, options), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False  # True once set up, so its startup isn't timed as part of a job
+        self.path = None  # job in progress
+        self.started = None
+
+    def send(self, path, sid_binary):
+        self.path = path
+        self.started = time.perf_counter()
+        self.conn.send((path, sid_binary))
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class BatchStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statuses = collections.Counter()
+        self.play_calls = 0
+        self.last_report = self.start
+
+    def update(self, result):
+        self.statuses[result['status']] += 1
+        self.play_calls += result['play_calls']
+
+    def report(self, remaining, force=False, report_seconds=10):
+        now = time.perf_counter()
+        if not force and now - self.last_report < report_seconds:
+            return
+        self.last_report = now
+        elapsed = now - self.start
+        files = sum(self.statuses.values())
+        print("%d files in %.0fs (%.2f files/s, %.0f play calls/s), %d remaining: %s"
+              % (files, elapsed, files / elapsed, self.play_calls / elapsed, remaining,
+                 ', '.join('%s %d' % item for item in sorted(self.statuses.items()))))
+
+
+def run_batch(source, ledger, options, processes, timeout, retry_failed=False, limit=None):
+    """
+    Convert the ledger's pending SID files, recording each result as it finishes
+    """
+    paths = ledger.pending(retry_failed)[:limit]
+    paths.reverse()  # pop() from the end, in path order
+    stats = BatchStats()
+    workers = [Worker(options) for _ in range(min(processes, len(paths)))]
+    busy = []
+
+    def finish(worker, result):
+        ledger.record(result)
+        stats.update(result)
+        busy.remove(worker)
+        worker.path = None
+
+    try:
+        while paths or busy:
+            for worker in workers:
+                if worker.ready and worker.path is None and paths:
+                    path = paths.pop()
+                    worker.send(path, source.read(path))
+                    busy.append(worker)
+
+            waiting = [worker for worker in workers if worker in busy or not worker.ready]
+            ready = multiprocessing.connection.wait([worker.conn for worker in waiting], POLL_SECONDS)
+            for worker in [worker for worker in waiting if worker.conn in ready]:
+                try:
+                    message = worker.conn.recv()
+                    if worker.ready:
+                        finish(worker, message)
+                    else:
+                        worker.ready = message == WORKER_READY
+                except EOFError:  # the worker process died
+                    if worker.path is None:
+                        raise RuntimeError("worker process exited while starting up, with code %s"
+                                           % worker.process.exitcode)
+                    result = dict(path=worker.path, status=STATUS_FAILED, subtunes=0, play_calls=0,
+                                  seconds=time.perf_counter() - worker.started,
+                                  error='worker exited with code %s' % worker.process.exitcode)
+                    finish(worker, result)
+                    worker.kill()
+                    workers[workers.index(worker)] = Worker(options)
+
+            for worker in list(busy):
+                elapsed = time.perf_counter() - worker.started
+                if elapsed > timeout:
+                    worker.kill()
+                    finish(worker, dict(path=worker.path, status=STATUS_TIMEOUT, subtunes=0, play_calls=0,
+                                        seconds=elapsed, error='timed out after %gs' % timeout))
+                    workers[workers.index(worker)] = Worker(options)
+
+            stats.report(len(paths) + len(busy))
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    stats.report(0, force=True)
+
+
+def print_ledger_report(ledger):
+    counts = ledger.status_counts()
+    (play_calls, seconds) = ledger.totals()
+    print("\nLedger: %s" % ', '.join('%s %d' % item for item in sorted(counts.items())))
+    if seconds:
+        print("%d play calls emulated in %.0f worker seconds (%.0f play calls/s per worker)"
+              % (play_calls, seconds, play_calls / seconds))
+    common_errors = ledger.common_errors()
+    if common_errors:
+        print("\nMost common errors:")
+        for (error, count) in common_errors:
+            print("  %6d  %s" % (count, error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch convert the SIDs in an HVSC zip file or directory.")
+    parser.add_argument('source', help='HVSC zip file, or directory of SID files')
+    parser.add_argument('-o', '--out_dir', default='sid_batch_out', help='output directory (default: sid_batch_out)')
+    parser.add_argument('-l', '--ledger', help='job ledger SQLite file (default: OUT_DIR/sidBatch.sqlite)')
+    parser.add_argument('-f', '--format', action='append', choices=['mid', 'csv'],
+                        help='output format, repeatable (default: none, just capture)')
+    parser.add_argument('-a', '--all_subtunes', action='store_true', help='convert every subtune, not just the default one')
+    parser.add_argument('-t', '--seconds', default=sid.AUTO_SECONDS,
+                        type=lambda arg: arg if arg == sid.AUTO_SECONDS else float(arg),
+                        help="seconds to capture, or 'auto' to stop when the song loops or ends (default: auto)")
+    parser.add_argument('-m', '--auto_max_seconds', type=float, default=sid.AUTO_MAX_SECONDS,
+                        help="most seconds to capture with 'auto' (default: %d)" % sid.AUTO_MAX_SECONDS)
+    parser.add_argument('-u', '--tuning', default=sid.AUTO_TUNING,
+                        type=lambda arg: arg if arg == sid.AUTO_TUNING else float(arg),
+                        help="tuning, or 'auto' to estimate each capture's tuning (default: auto)")
+    parser.add_argument('-v', '--vibrato_cents_margin', type=int, default=0,
+                        help='cents margin for snapping to the previous note (default: 0)')
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('-T', '--timeout', type=float, default=600, help='per-file timeout in seconds (default: 600)')
+    parser.add_argument('-n', '--limit', type=int, help='convert at most this many files this run')
+    parser.add_argument('-r', '--retry_failed', action='store_true', help='also retry failed and timed out files')
+    parser.add_argument('-c', '--block_cache', action='store_true', help='emulate with the block cache')
+    parser.add_argument('-C', '--cache_dir', help='capture cache directory, to skip emulating captures done before')
+    parser.add_argument('--cache_mb', type=int, default=sid.CAPTURE_CACHE_MAX_BYTES // (1024 * 1024),
+                        help='capture cache size bound in MB (default: %d)' % (sid.CAPTURE_CACHE_MAX_BYTES // (1024 * 1024)))
+    parser.add_argument('--report', action='store_true', help="print the ledger's stats and exit")
+
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    ledger = JobLedger(args.ledger or os.path.join(args.out_dir, 'sidBatch.sqlite'))
+    if not args.report:
+        source = SidSource(args.source)
+        try:
+            ledger.add_jobs(source.paths())
+            options = dict(out_dir=args.out_dir, formats=args.format or [], all_subtunes=args.all_subtunes,
+                           seconds=args.seconds, tuning=args.tuning, vibrato_cents_margin=args.vibrato_cents_margin,
+                           auto_max_seconds=args.auto_max_seconds,
+                           block_cache=args.block_cache, cache_dir=args.cache_dir, cache_mb=args.cache_mb)
+            run_batch(source, ledger, options, args.processes, args.timeout, args.retry_failed, args.limit)
+        finally:
+            source.close()
+
+    print_ledger_report(ledger)
+    ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Capture all (or some) subtunes of a SID file in parallel, writing a midi and/or csv file
+# for each
+#
+# e.g.:  python sidSubtunes.py Soundtrack.sid -s 0,3-5 -f mid -f csv -o out
+
+import argparse
+import os
+import sys
+
+from chiptunesak import sid
+from chiptunesak import midi
+
+
+def parse_subtunes(subtunes_arg):
+    """
+    Parse a subtune list like '0,3-5' (zero-indexed)
+
+    :return: subtune numbers
+    :rtype: list of int
+    """
+    subtunes = []
+    for part in subtunes_arg.split(','):
+        if '-' in part:
+            (first, last) = part.split('-')
+            subtunes.extend(range(int(first), int(last) + 1))
+        else:
+            subtunes.append(int(part))
+    return subtunes
+
+
+def parse_seconds(seconds_arg):
+    return seconds_arg if seconds_arg == sid.AUTO_SECONDS else float(seconds_arg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture the subtunes of a SID file in parallel.")
+    parser.add_argument('sid_in_file', help='sid filename to import')
+    parser.add_argument('-s', '--subtunes', type=parse_subtunes,
+                        help='zero-indexed subtunes, e.g. 0,3-5 (default: all)')
+    parser.add_argument('-t', '--seconds', type=parse_seconds, default=sid.AUTO_SECONDS,
+                        help="seconds to capture, or 'auto' to stop when the song loops or ends (default: auto)")
+    parser.add_argument('-j', '--processes', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('-f', '--format', action='append', choices=['mid', 'csv'],
+                        help='output format, repeatable (default: mid)')
+    parser.add_argument('-o', '--out_dir', default='.', help='output directory (default: .)')
+    parser.add_argument('-c', '--block_cache', action='store_true', help='emulate with the block cache')
+
+    args = parser.parse_args()
+    formats = args.format or ['mid']
+
+    sid_in = sid.SID()
+    sid_in.set_options(sid_in_filename=args.sid_in_file, seconds=args.seconds,
+                       block_cache=args.block_cache, verbose=False)
+    results = sid_in.capture_subtunes(args.subtunes, args.processes, to_rchirp='mid' in formats)
+
+    base_name = os.path.splitext(os.path.basename(args.sid_in_file))[0]
+    failures = 0
+    for result in results:
+        if result.error is not None:
+            failures += 1
+            print("subtune %d failed: %s" % (result.subtune, result.error))
+            continue
+
+        out_filename_no_ext = os.path.join(args.out_dir, '%s_%d' % (base_name, result.subtune))
+        if 'mid' in formats:
+            midi.MIDI().to_file(result.rchirp_song.to_chirp(), out_filename_no_ext + '.mid')
+        if 'csv' in formats:
+            sid_out = sid.SID()
+            sid_out.set_options(sid_in_filename=args.sid_in_file)
+            sid_out.sid_dump = result.sid_dump
+            sid_out.to_csv_file(out_filename_no_ext + '.csv')
+        print("subtune %d: %d play calls (ended by %s)"
+              % (result.subtune, len(result.sid_dump.play_cycles), result.sid_dump.end_reason))
+
+    print("\ndone, %d of %d subtunes captured" % (len(results) - failures, len(results)))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())